@@ -1,11 +1,31 @@
-from selenium import webdriver
 import unittest
-import time
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.common.keys import Keys
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from driver_pool import pool
+import trs_session
+from browser_profile import profile
+from urllib.parse import urlencode
+from sites import WSS, TRS_TEST
+from catalog import catalog, generate_tests
+from page_snapshot import PageSnapshot
+from assert_batch import AssertionBatch
+import locators
+from locators import ElementFinder
+from timing import Tracer, TracedDriver, TracedElement
+import resource_monitor
+import results_sink
+from run_history import fail_fast
+from pagination import PAGE_COUNT_SCRIPT, cookies_from, crawl, crawl_async, crawl_all, depth_for
+from http_checks import ENABLED as HTTP_MODE, Check, SORT_ORDERS, http_fast_path, run_checks, sorted_url
+import cdp_backend
+from cdp_backend import ENABLED as CDP_MODE, cdp_fast_path
+from tab_fanout import TABS as SEARCH_TABS, fan_out
+import url_contracts
+import scenarios
+from fingerprints import incremental
+from scenarios import run_scenarios
+from url_contracts import ENABLED as URL_CONTRACTS, Contract
+import autosuggest_profiler
+from autosuggest_profiler import ENABLED as AUTOSUGGEST_PROFILE, PREFIXES as AUTOSUGGEST_PREFIXES
+from waits import AdaptiveWait, wait_for, url_is, url_changed_from, document_ready, document_interactive, plp_ready, autosuggest_populated, autosuggest_contains, autosuggest_texts, text_on_page, retry_not_found, retry_not_found_async
 '''
 This is an automated front end smoke test for Catalog. Because this is only a smoke test, none of the tests assert very complicated things. Mostly they are just checking to see if the page loaded without error,
 there are items displayed, filters displayed, etc. This should only be used to quickly determine that there are no major errors in the build, then some manual testing should still be done.
@@ -22,583 +42,541 @@ Coverage (All of the tests are perfromed on both WSS and TRS where applicable):
 . Search Within
 . Auto Suggest
 
+The pages and search terms that get checked are listed in catalog.tsv.
+
 '''
-#Tests for ensuring searching is functional, has pagination and returns items/filters/categories.
-class Searching(unittest.TestCase):
+#TRS makes you select a store before browsing the site. Every pooled browser gets the store cookies before its first page.
+pool.add_session_hook(trs_session.inject)
+
+#Pages with a URL are covered by HttpFastPath when SMOKE_HTTP=1, pagination included (it's crawled over HTTP either way).
+def http_covered(entry, test):
+    return cdp_fast_path(http_fast_path(test)) if entry.url else test
+
+#With SMOKE_INCREMENTAL=1 these pages only get the browser check when they changed since they last passed (see fingerprints.py).
+def incremental_covered(entry, test):
+    return http_covered(entry, incremental(entry, test))
+
+#Every test borrows a warm browser from the shared pool instead of starting Chrome itself. See driver_pool.py.
+class SmokeTestCase(unittest.TestCase):
+    #Tests that interact with the page's scripts wait for the full page load even when the browser profile loads pages eagerly.
+    full_page_load = False
 
+    #self.driver is traced (see timing.py): navigations, clicks, submits and assertions are timed as steps and checked against
+    #the page type budgets. self.browser is the pooled driver underneath.
     def setUp(self):
-        self.driver = webdriver.Chrome()
+        self.tracer = Tracer(self.id())
+        with self.tracer.step('acquire', 'browser'):
+            self.browser = pool.acquire()
+        self.page_loaded = document_ready if self.full_page_load or not profile.eager else document_interactive
+        after_load = (lambda driver: wait_for(driver, document_ready)) if self.full_page_load and profile.eager else None
+        self.driver = TracedDriver(self.browser, self.tracer, after_load, resource_monitor.monitor)
+        self.page = PageSnapshot(self.browser)
+        self.finder = ElementFinder(self.browser)
 
     def tearDown(self):
-        self.driver.close()
+        pool.release(self.browser)
+
+    #Catalog entries for this test. Skips the test when the run's SMOKE_TAGS leave nothing to check.
+    def entries(self, *tags, **selection):
+        entries = catalog.select(*tags, **selection)
+        if not entries:
+            self.skipTest("no catalog entries selected")
+        return entries
+
+    #Same check as assertIn(marker, driver.page_source), answered from the page snapshot instead of the full HTML.
+    def assertMarker(self, marker, msg=None):
+        with self.tracer.step('assert', marker) as record:
+            found = self.page.has(marker)
+            record['url'] = self.page.state[0]
+            if not found:
+                self.fail(self._formatMessage(msg, '%r not found on %s' % (marker, record['url'])))
+
+    #The element a named locator (see locators.py) resolves to on the current page, e.g. self.find('sort_option', 'price_desc').
+    def find(self, name, *args):
+        return TracedElement(self.finder.find(name, *args), self.driver)
+
+    #Checks for the page the browser is on, evaluated together in one round trip by assertBatch (see assert_batch.py).
+    def batch(self):
+        return AssertionBatch(self.browser)
+
+    def assertBatch(self, batch, msg=None):
+        with self.tracer.step('assert', 'batch of %d' % len(batch.checks)):
+            result = batch.run()
+            if not result.passed:
+                self.fail(self._formatMessage(msg, result.message()))
+
+    #Waits (bounded) for the browser to land on the expected URL before comparing, so a slow redirect isn't a failure.
+    def assertUrl(self, expected, msg=None):
+        with self.tracer.step('assert', 'url', expected):
+            wait_for(self.browser, url_is(expected))
+            self.assertEqual(expected, self.browser.current_url, msg)
+
+    #Runs an action that navigates (a submit or a click) and waits for the next page instead of assuming it already loaded.
+    #Fails when the browser stays on the old page, rather than going on to check it.
+    def navigate_by(self, action):
+        old_url = self.driver.current_url
+        action()
+        self.assertTrue(wait_for(self.driver, url_changed_from(old_url)), "Still on %s after navigating" % old_url)
+        self.assertTrue(wait_for(self.driver, self.page_loaded), "%s didn't finish loading" % self.browser.current_url)
+
+    #TRS category and item pages need a selected store. Fails with the real cause when the store cookies didn't take (see
+    #trs_session.py) instead of on the first missing marker.
+    def assertStoreSelected(self):
+        with self.tracer.step('assert', 'store selected', self.browser.current_url):
+            if text_on_page(trs_session.INTERSTITIAL_TEXT)(self.browser):
+                self.fail("Store-selection interstitial shown on %s; cookie injection failed" % self.browser.current_url)
+
+    #Waits (bounded) for a listing to render all of its markers, then asserts each one, so a slow product grid isn't a failure
+    #and a missing marker is still reported by name.
+    def assertPlp(self, markers):
+        with self.tracer.step('wait', 'plp_ready', self.browser.current_url):
+            wait_for(self.browser, plp_ready(*markers))
+        for marker in markers:
+            self.assertMarker(marker)
+
+    #Checks pages 2..depth of the listing the browser is on. Instead of clicking through the pagination, the page count is read
+    #off the open page and the other pages are fetched concurrently over HTTP with the browser's cookies (see pagination.py).
+    #When pagination isn't required, a listing with fewer pages than the entry's depth is fine.
+    def check_pagination(self, entry, markers=None, pagination_required=True):
+        depth = depth_for(entry.depth)
+        if depth < 2:
+            return
+        url = self.browser.current_url
+        with self.tracer.step('crawl', url, url):
+            result = crawl(url, markers or entry.markers, depth, self.browser.execute_script(PAGE_COUNT_SCRIPT),
+                           cookies_from(self.browser), self.print_page)
+        if pagination_required:
+            self.assertGreaterEqual(result.page_count, depth, "%s has only %d pages" % (url, result.page_count))
+        self.assertTrue(result.passed, '; '.join(result.problems))
+
+    def print_page(self, page, result):
+        print("  page %d: %s (%.2fs)" % (page, 'ok' if result.passed else '; '.join(result.problems), result.elapsed))
+
+    #Types a catalog search term into the site's search box and submits it.
+    def search(self, entry):
+        inputElement = self.find('search_box', entry.site)
+        inputElement.clear()
+        inputElement.send_keys(entry.target)
+        self.navigate_by(inputElement.submit)
+
+    #Runs `script` for every catalog entry in tabs of this test's browser (SMOKE_SEARCH_TABS, see tab_fanout.py), then asserts
+    #on each entry's result separately.
+    def fan_out(self, entries, script):
+        with self.tracer.step('fan_out', '%d entries in %d tabs' % (len(entries), SEARCH_TABS), self.browser.current_url):
+            results = fan_out(self.browser, entries, script, on_result=self.print_tab_result)
+        for result in results:
+            with self.subTest(entry=result.item.name):
+                self.assertTrue(result.passed, '; '.join(result.problems))
+
+    def print_tab_result(self, result):
+        print("  %s: %s (%.2fs)" % (result.item.name, 'ok' if result.passed else '; '.join(result.problems), result.elapsed))
+
+    #Checks where each step of a sort/filter contract leads without clicking (SMOKE_URL_CONTRACTS, see url_contracts.py), then
+    #clicks SMOKE_CLICK_SAMPLE of the steps for real.
+    def check_contract(self, contract, markers=("productBox1",)):
+        with self.tracer.step('contract', '%d steps' % len(contract.steps), contract.start):
+            problems = url_contracts.verify(self.driver, contract, markers)
+        self.assertFalse(problems, '; '.join(problems))
+        for source, locator, expected in url_contracts.sample(contract):
+            self.driver.get(source)
+            self.find(*locator).click()
+            self.assertUrl(expected)
+
+    #Loads a PLP, checks its markers and then checks the same markers on the first entry.depth pages of its pagination.
+    def check_plp(self, entry, pagination_required=True):
+        self.driver.get(entry.url)
+        self.assertPlp(entry.markers)
+        self.check_pagination(entry, pagination_required=pagination_required)
+
+#Per-entry scripts for the tab fan-out (SMOKE_SEARCH_TABS): the same steps as the one-tab loops below, on a cdp_backend.Page.
+#Each returns the entry's problems. A tab stays on the last results page, and the next term is searched from there.
+async def submit_search(page, text, name, *args):
+    inputElement = await page.find(name, *args)
+    await inputElement.clear()
+    await inputElement.send_keys(text)
+    page.expect_navigation()
+    await inputElement.submit()
+    await page.wait_for_load()
+
+
+async def marker_problems(page, markers, batch=None):
+    batch = batch or AssertionBatch(page)
+    for marker in markers:
+        batch.marker(marker)
+    return [outcome.message() for outcome in (await batch.run_async()).failures]
+
+
+def search_term(home, pagination_markers):
+    async def script(page, entry, client):
+        if page.current_url == 'about:blank':
+            await page.get(home)
+        await submit_search(page, entry.target, 'search_box', entry.site)
+        problems = await marker_problems(page, entry.markers)
+        depth = depth_for(entry.depth)
+        if depth > 1:
+            listing = await crawl_async(client, page.current_url, pagination_markers, depth,
+                                        await page.execute_script(PAGE_COUNT_SCRIPT))
+            if listing.page_count < depth:
+                problems.append("%s has only %d pages" % (listing.url, listing.page_count))
+            problems += listing.problems
+        return problems
+    return script
+
+
+async def fsr_term(page, entry, client):
+    if page.current_url == 'about:blank':
+        await page.get(WSS + "/food-service-resources.html")
+        if not await retry_not_found_async(page):
+            return ["FSR kept returning 404"]
+    await submit_search(page, entry.target, 'fsr_search_box')
+    if not await retry_not_found_async(page):
+        return ["FSR search kept returning 404 for " + entry.target]
+    return await marker_problems(page, [], AssertionBatch(page)
+                                 .visible(locator=locators.get('fsr_first_result'))
+                                 .visible(locator=locators.get('fsr_sidebar_category')))
+
+
+async def search_within_term(page, entry, client):
+    await page.get(entry.base if entry.is_term else entry.url)
+    if entry.is_term:
+        await submit_search(page, entry.target, 'search_box', entry.site)
+    await submit_search(page, entry.params['within'], 'search_within_box')
+    return await marker_problems(page, ["productBox1"], AssertionBatch(page).url_is(
+        entry.url + ('&' if '?' in entry.url else '?') + urlencode({'withinval': entry.params['within']})))
+
+
+#Tests for ensuring searching is functional, has pagination and returns items/filters/categories.
+class Searching(SmokeTestCase):
 
     #Search the top 10 search terms on WSS. Verify items, category tiles and filters display. Check pagination is functioning.
     def test_top_10_searches_wss(self):
-        terms = ['napkins', 'freezer', 'plates', 'cutting board', 'plastic cups', 'ice maker', 'ice machine', 'refrigerator', 'stainless steel table', 'gloves']
         driver = self.driver
-        driver.get("https://www.webstaurantstore.com")
-        driver.maximize_window()
-        for term in terms:
-            print("Searching for " + term + " on WSS...")
-            inputElement = driver.find_element_by_name("searchval")
-            inputElement.clear()
-            inputElement.send_keys(term)
-            inputElement.submit()
-            self.assertIn('category-grid', driver.page_source) #Check if Category Tiles exist on the page. If there are none, this class does not appear in the HTML.
-            self.assertIn("productBox1", driver.page_source) # This checks that an arbitrary product box exists, which indicates that there are items displaying on the page
-            self.assertIn('class="filter-list__content"', driver.page_source) # This checks that the Filters List on the side is present.
-            inputElement = driver.find_element_by_class_name("icon-right-open") 
-            inputElement.click() #Clicks button to go to next page
-            self.assertIn('?page=2', driver.current_url)
-            self.assertIn("productBox1", driver.page_source)
-            self.assertIn('class="filter-list__content"', driver.page_source)
+        if SEARCH_TABS:
+            return self.fan_out(self.entries('top10', site='wss', page_type='search'),
+                                search_term(WSS, ["productBox1", 'class="filter-list__content"']))
+        driver.get(WSS)
+        for entry in self.entries('top10', site='wss', page_type='search'):
+            print("Searching for " + entry.target + " on WSS...")
+            self.search(entry)
+            self.assertPlp(entry.markers) #Category tiles, an arbitrary product box (so items are displaying) and the Filters List on the side.
+            self.check_pagination(entry, ["productBox1", 'class="filter-list__content"'])
 
     #Same thing but for TRS
     def test_top_10_searches_trs(self):
-        terms = ['napkins', 'freezer', 'plates', 'cutting board', 'plastic cups', 'ice maker', 'ice machine', 'refrigerator', 'stainless steel table', 'gloves']
         driver = self.driver
-        driver.get("https://test.therestaurantstore.com/stores/set/1")
-        driver.maximize_window()
-        for term in terms:
-            print("Searching for " + term + " on TRS...")
-            inputElement = driver.find_element_by_name("search_values")
-            inputElement.clear()
-            inputElement.send_keys(term)
-            inputElement.submit()
-            self.assertIn('category-listing-block', driver.page_source)
-            self.assertIn('ag-details-block item', driver.page_source)
-            self.assertIn('class="filters"', driver.page_source)
-            inputElement = driver.find_element_by_xpath('/html/body/div[4]/div[3]/div/div/div[2]/div[3]/ul/li[11]/a')
-            inputElement.click()
-            self.assertIn('ag-details-block item', driver.page_source)
-            self.assertIn('class="filters"', driver.page_source)
+        if SEARCH_TABS:
+            return self.fan_out(self.entries('top10', site='trs_test', page_type='search'),
+                                search_term(TRS_TEST + "/", ['ag-details-block item', 'class="filters"']))
+        driver.get(TRS_TEST + "/")
+        for entry in self.entries('top10', site='trs_test', page_type='search'):
+            print("Searching for " + entry.target + " on TRS...")
+            self.search(entry)
+            self.assertPlp(entry.markers)
+            self.check_pagination(entry, ['ag-details-block item', 'class="filters"'])
     
     #Searching on FSR
     def test_FSR_search(self):
-        terms = ['crepes', 'cutting board', 'bar']
         driver = self.driver
-        driver.get("https://www.webstaurantstore.com/food-service-resources.html")
-        driver.maximize_window()
-        proceed = 0
-        while (proceed == 0): #This is because sometimes Test 404's on FSR. One of the servers must have issues, so It will refresh until it doesn't 404.
-            if ("Sorry, but this page doesn't exist" in driver.page_source):
-                driver.refresh()
-            else:
-                proceed = 1
-
-        for term in terms:
-            print("Searching for " + term + " on Food Service Resources...")
-            inputElement = driver.find_element_by_id("term")
+        if SEARCH_TABS:
+            return self.fan_out(self.entries(site='wss', page_type='fsr'), fsr_term)
+        driver.get(WSS + "/food-service-resources.html")
+        #This is because sometimes Test 404's on FSR. One of the servers must have issues, so It will refresh (with backoff) until it doesn't 404.
+        self.assertTrue(retry_not_found(driver), "FSR kept returning 404")
+
+        for entry in self.entries(site='wss', page_type='fsr'):
+            print("Searching for " + entry.target + " on Food Service Resources...")
+            inputElement = self.find('fsr_search_box')
             inputElement.clear()
-            inputElement.send_keys(term)
-            inputElement.submit()
-
-            proceed = 0
-            while (proceed == 0):
-                if ("Sorry, but this page doesn't exist" in driver.page_source):
-                    driver.refresh()
-                else:
-                    proceed = 1
-
-            inputElement = driver.find_element_by_xpath('//*[@id="page"]/div[1]/div[2]/div/a[1]/span[2]/h2') #Check if results are displayed
-            self.assertTrue(inputElement.is_displayed())
-            inputElement = driver.find_element_by_xpath('//*[@id="page"]/div[3]/ul/li[2]') #Check that the sidebar categories are displayed
-            self.assertTrue(inputElement.is_displayed())
-
-#Testing functionality of various elements on Category pages
-class Categories(unittest.TestCase):
-    def setUp(self):
-        self.driver = webdriver.Chrome()
+            inputElement.send_keys(entry.target)
+            self.navigate_by(inputElement.submit)
 
-    def tearDown(self):
-        self.driver.close()
-
-    def test_10_categories_wss(self):
-        #I just selected 10 categories at random. Feel free to add more/change these.
-        pages = ['https://www.webstaurantstore.com/51211/desks-and-desk-bases.html',
-                'https://www.webstaurantstore.com/261/disposable-gloves.html', 
-                'https://www.webstaurantstore.com/56253/thermocouple-thermometers-and-probes.html',
-                'https://www.webstaurantstore.com/41983/wood-serving-and-display-platters-trays.html',
-                'https://www.webstaurantstore.com/50887/stoneware-bowls.html',
-                'https://www.webstaurantstore.com/2835/chef-knives.html',
-                'https://www.webstaurantstore.com/3337/chef-coats.html',
-                'https://www.webstaurantstore.com/14821/gas-connectors-and-gas-hoses.html',
-                'https://www.webstaurantstore.com/47305/foam-hinged-take-out-containers.html',
-                'https://www.webstaurantstore.com/10397/ramekins-and-sauce-cups.html']
+            self.assertTrue(retry_not_found(driver), "FSR search kept returning 404 for " + entry.target)
 
-        driver = self.driver
-        for page in pages:
-            print("Checking category page: " + page)
-            driver.get(page)
-            # All I'm checking is that items and filters appear on the page.
-            for _ in range(2):
-                self.assertIn("productBox1", driver.page_source)
-                self.assertIn('class="filter-list box"', driver.page_source)
-                if '"icon-right-open"' in driver.page_source:
-                    inputElement = driver.find_element_by_class_name("icon-right-open") 
-                    inputElement.click() #Clicks button to go to next page
-
-    def test_10_categories_trs(self):
-        #I just selected 10 categories at random. Feel free to add more/change these.
-        pages = ['https://www.therestaurantstore.com/categories/51211/desks-and-desk-bases.html',
-                'https://www.therestaurantstore.com/categories/261/disposable-gloves.html', 
-                'https://www.therestaurantstore.com/categories/56253/thermocouple-thermometers-and-probes.html',
-                'https://www.therestaurantstore.com/categories/41983/wood-serving-and-display-platters-trays.html',
-                'https://www.therestaurantstore.com/categories/50887/stoneware-bowls.html',
-                'https://www.therestaurantstore.com/categories/2835/chef-knives.html',
-                'https://www.therestaurantstore.com/categories/3337/chef-coats.html',
-                'https://www.therestaurantstore.com/categories/14821/gas-connectors-and-gas-hoses.html',
-                'https://www.therestaurantstore.com/categories/47305/foam-hinged-take-out-containers.html',
-                'https://www.therestaurantstore.com/categories/10397/ramekins-and-sauce-cups.html']
+            self.assertBatch(self.batch()
+                             .visible(locator=locators.get('fsr_first_result')) #Check if results are displayed
+                             .visible(locator=locators.get('fsr_sidebar_category'))) #Check that the sidebar categories are displayed
 
+#Testing functionality of various elements on Category pages. One test per category in catalog.tsv.
+@generate_tests('check_wss_category', site='wss', page_type='category', decorate=incremental_covered)
+@generate_tests('check_trs_category', site='trs', page_type='category', decorate=incremental)
+class Categories(SmokeTestCase):
+    def check_wss_category(self, entry):
+        print("Checking category page: " + entry.url)
+        # All I'm checking is that items and filters appear on the page.
+        self.check_plp(entry, pagination_required=False)
+
+    def check_trs_category(self, entry):
         driver = self.driver
-        for page in pages:
-            print("Checking category page: " + page)
-            driver.get(page)
-            if ("Before we continue, let's get your store location!" in driver.page_source):
-                inputElement = driver.find_element_by_xpath('/html/body/div[4]/div[2]/div/div[2]/div[2]/div[1]/a[2]')
-                inputElement.click() #TRS makes you select a store before browsing the site
-            else:
-                self.assertIn("ag-details-block item", driver.page_source)
-                self.assertIn('class="filters"', driver.page_source)
-
-class AutoSuggest(unittest.TestCase):
-    def setUp(self):
-        self.driver = webdriver.Chrome()
+        print("Checking category page: " + entry.url)
+        driver.get(entry.url) #The store is already selected (see trs_session.py), so this is the page itself
+        self.assertStoreSelected()
+        self.assertPlp(entry.markers)
 
-    def tearDown(self):
-        self.driver.close()
+class AutoSuggest(SmokeTestCase):
+    full_page_load = True
 
+    #Suggestions are matched by text, not by their position in the list.
     def test_auto_suggest_exists_wss(self):
         print("Checking Auto Suggest is functional...")
         search_param = "ham"
+        expected = ["hamburger press", "Hamburger Presses", "Arm & Hammer"]
         driver = self.driver
-        driver.get("https://www.webstaurantstore.com/")
-        driver.maximize_window()
-        inputElement = driver.find_element_by_name("searchval")
+        driver.get(WSS + "/")
+        inputElement = self.find('search_box', 'wss')
         inputElement.send_keys(search_param)
-        driver.implicitly_wait(20)
-        self.assertIn ("hamburger press", driver.find_element_by_xpath('//*[@id="searchForm"]/div/ul/li[2]/span[2]').text)
-        self.assertIn ("Hamburger Presses", driver.find_element_by_xpath('//*[@id="searchForm"]/div/ul/li[12]/span[2]').text)
-        self.assertIn ('Arm & Hammer', driver.find_element_by_xpath('//*[@id="searchForm"]/div/ul/li[20]/span[2]').text)
+        with self.tracer.step('assert', 'autosuggest'):
+            if not wait_for(driver, autosuggest_populated(len(expected))):
+                self.fail("Fewer than %d suggestions showed up for %r: %s"
+                          % (len(expected), search_param, autosuggest_texts(driver)))
+            if not wait_for(driver, autosuggest_contains(*expected)):
+                self.fail("Suggestions for %r don't include all of %s: %s" % (search_param, expected, autosuggest_texts(driver)))
 
     def test_auto_suggest_links(self):
         print("Checking Auto Suggest links work...")
         search_param = "ham"
         driver = self.driver
-        driver.get("https://www.webstaurantstore.com/")
-        driver.maximize_window()
-        inputElement = driver.find_element_by_name("searchval")
+        driver.get(WSS + "/")
+        inputElement = self.find('search_box', 'wss')
         inputElement.send_keys(search_param)
-        driver.implicitly_wait(20)
-        inputElement = driver.find_element_by_xpath('//*[@id="searchForm"]/div/ul/li[2]/span[2]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/search/hamburger-press.html', driver.current_url)
-
-class TRSProductPage(unittest.TestCase):
-    def setUp(self):
-        self.driver = webdriver.Chrome()
-
-    def tearDown(self):
-        self.driver.close()
-
-    def test_trs_product_page(self):
-        pages = ['https://www.therestaurantstore.com/items/396801',
-                'https://www.therestaurantstore.com/items/449459',
-                'https://www.therestaurantstore.com/items/466919',
-                'https://www.therestaurantstore.com/items/367425',
-                'https://www.therestaurantstore.com/items/23747']
-
+        AdaptiveWait(driver).until(autosuggest_contains("hamburger press"))
+        inputElement = self.find('autosuggest_suggestion', "hamburger press")
+        inputElement.click()
+        self.assertUrl(WSS + '/search/hamburger-press.html')
+
+    #Types each prefix one character at a time and times the suggestion list after every keystroke (see autosuggest_profiler.py).
+    @unittest.skipUnless(AUTOSUGGEST_PROFILE, "autosuggest profiling is off (set SMOKE_AUTOSUGGEST_PROFILE=1)")
+    def test_auto_suggest_latency(self):
+        print("Profiling Auto Suggest keystrokes...")
+        driver = self.browser
+        self.driver.get(WSS + "/")
+        autosuggest_profiler.install(driver)
+        inputElement = self.finder.find('search_box', 'wss')
+        problems = []
+        for prefix in AUTOSUGGEST_PREFIXES:
+            for keystroke in autosuggest_profiler.type_prefix(driver, inputElement, prefix):
+                print("  %-12r %s" % (keystroke['prefix'], keystroke['error'] or '%.0f ms (request %s ms, %d suggestions)' % (
+                    keystroke['total'], '%.0f' % keystroke['request'] if keystroke['request'] is not None else '-',
+                    len(keystroke['suggestions']))))
+                if keystroke['error']:
+                    problems.append('%r: %s' % (keystroke['prefix'], keystroke['error']))
+        self.assertFalse(problems, '; '.join(problems))
+
+@generate_tests('check_product_page', site='trs', page_type='product', decorate=incremental_covered)
+class TRSProductPage(SmokeTestCase):
+    def check_product_page(self, entry):
         driver = self.driver
-        for page in pages:
-            print("Checking TRS Product Page: " + page)
-            driver.get(page)
-            if ("Before we continue, let's get your store location!" in driver.page_source):
-                inputElement = driver.find_element_by_xpath('/html/body/div[4]/div[2]/div/div[2]/div[2]/div[1]/a[2]')
-                inputElement.click() #TRS makes you select a store before browsing the site
-            else:
-                self.assertIn('class="large-visual"', driver.page_source)
-                self.assertIn('class="price "', driver.page_source)
-
-class Specials(unittest.TestCase):
+        print("Checking TRS Product Page: " + entry.url)
+        driver.get(entry.url) #The store is already selected (see trs_session.py), so this is the page itself
+        self.assertStoreSelected()
+        for marker in entry.markers:
+            self.assertMarker(marker)
+
+#Loads and pagination of the specials page, group specials and specialized pages. One test per catalog entry.
+@generate_tests('check_plp', site='wss', page_type='specials', decorate=http_covered)
+class Specials(SmokeTestCase):
     def setUp(self):
-        self.driver = webdriver.Chrome()
+        super().setUp()
         print("Checking specials.cfm...")
 
-    def tearDown(self):
-        self.driver.close()
-
-    def test_specials_loads(self):
-        
-        driver = self.driver
-        driver.get('https://www.webstaurantstore.com/specials.html?forcecacheupdate=1')
-        self.assertIn("productBox1", driver.page_source)
-        self.assertIn('class="filter-list box"', driver.page_source)
-
-    def test_specials_pagination(self):
-        driver = self.driver
-        driver.get('https://www.webstaurantstore.com/specials.html?forcecacheupdate=1')
-        for _ in range(6):
-            self.assertIn("productBox1", driver.page_source)
-            self.assertIn('class="filter-list box"', driver.page_source)
-            inputElement = driver.find_element_by_class_name("icon-right-open") 
-            inputElement.click() #Clicks button to go to next page
-
-class GroupSpecials(unittest.TestCase):
-    def setUp(self):
-        self.driver = webdriver.Chrome()
-        
-
-    def tearDown(self):
-        self.driver.close()
-
-    def test_group_specials_loads(self):
-        pages = ['https://www.webstaurantstore.com/groupspecials.cfm?group_num=12061087',
-                'https://www.webstaurantstore.com/groupspecials.cfm?group_num=2902089',
-                'https://www.webstaurantstore.com/groupspecials.cfm?group_num=9040269']
+@generate_tests('check_group_special', site='wss', page_type='group_special', decorate=incremental_covered)
+class GroupSpecials(SmokeTestCase):
+    def check_group_special(self, entry):
+        print("Checking Group Specials page: " + entry.url)
+        self.check_plp(entry)
 
-        driver = self.driver
-        for page in pages:
-            print("Checking Group Specials page: " + page)
-            driver.get(page)
-            self.assertIn("productBox1", driver.page_source)
-            self.assertIn('class="filter-list box"', driver.page_source)
+@generate_tests('check_specialized', site='wss', page_type='specialized', decorate=incremental_covered)
+class SpecializedPages(SmokeTestCase):
+    def check_specialized(self, entry):
+        print("Checking Specialized Page: " + entry.url)
+        self.check_plp(entry)
 
-    def test_group_specials_pagination(self):
-        pages = ['https://www.webstaurantstore.com/groupspecials.cfm?group_num=12061087',
-                'https://www.webstaurantstore.com/groupspecials.cfm?group_num=2902089',
-                'https://www.webstaurantstore.com/groupspecials.cfm?group_num=9040269']
+#Checks every sort option on each catalog entry tagged "sort". Only checks that sorting links to the correct URL.
+@generate_tests('check_sorting', 'sort', decorate=lambda entry, test: http_fast_path(test))
+class PLPSorting(SmokeTestCase):
+    full_page_load = True
 
-        driver = self.driver
-        for page in pages:
-            print("Checking Group Specials page: " + page)
-            driver.get(page)
-            for _ in range(2):
-                self.assertIn("productBox1", driver.page_source)
-                self.assertIn('class="filter-list box"', driver.page_source)
-                inputElement = driver.find_element_by_class_name("icon-right-open") 
-                inputElement.click() #Clicks button to go to next page
-
-class SpecializedPages(unittest.TestCase):
     def setUp(self):
-        self.driver = webdriver.Chrome()
-       
-
-    def tearDown(self):
-        self.driver.close()
-
-    def test_specialized_loads(self):
-        pages = ['https://www.webstaurantstore.com/specializedpage.cfm?index=14122',
-                'https://www.webstaurantstore.com/specializedpage.cfm?index=1025',
-                'https://www.webstaurantstore.com/specializedpage.cfm?index=1029']
-
-        driver = self.driver
-        for page in pages:
-            print("Checking Specialized Page: " + page)
-            driver.get(page)
-            self.assertIn("productBox1", driver.page_source)
-            self.assertIn('class="filter-list box"', driver.page_source)
-
-    def test_specialized_pagination(self):
-        pages = ['https://www.webstaurantstore.com/specializedpage.cfm?index=14122',
-                'https://www.webstaurantstore.com/specializedpage.cfm?index=1025',
-                'https://www.webstaurantstore.com/specializedpage.cfm?index=1029']
-
-        driver = self.driver
-        for page in pages:
-            print("Checking Specialized Page: " + page)
-            driver.get(page)
-            for _ in range(2):
-                self.assertIn("productBox1", driver.page_source)
-                self.assertIn('class="filter-list box"', driver.page_source)
-                inputElement = driver.find_element_by_class_name("icon-right-open") 
-                inputElement.click() #Clicks button to go to next page
-
-class PLPSorting(unittest.TestCase):
-    def setUp(self):
-        self.driver = webdriver.Chrome()
+        super().setUp()
         print("Checking PLP sorting...")
 
-    def tearDown(self):
-        self.driver.close()
-
-    def test_search_result_sorting(self):
-        terms = ['napkins']
+    def check_sorting(self, entry):
         driver = self.driver
-        driver.get("https://www.webstaurantstore.com")
-        driver.maximize_window()
-        
-        for term in terms:
-            inputElement = driver.find_element_by_name("searchval")
-            inputElement.clear()
-            inputElement.send_keys(term)
-            inputElement.submit()
-            inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[1]/option[1]')
-            inputElement.click()
-            self.assertEqual('https://www.webstaurantstore.com/search/napkins.html?order=price_asc', driver.current_url)
-            inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[1]/option[2]')
+        if URL_CONTRACTS:
+            return self.check_contract(Contract(entry.url, [(('sort_option', order), sorted_url(entry.url, order))
+                                                            for order in SORT_ORDERS]))
+        if entry.is_term:
+            driver.get(entry.base)
+            self.search(entry)
+        else:
+            driver.get(entry.url)
+        self.assertUrl(entry.url)
+        #The first option is already selected on everything but search results, and clicking it wouldn't go anywhere.
+        orders = SORT_ORDERS if entry.type == 'search' else [SORT_ORDERS[1], SORT_ORDERS[0]] + SORT_ORDERS[2:]
+        for order in orders:
+            inputElement = self.find('sort_option', order)
             inputElement.click()
-            self.assertEqual('https://www.webstaurantstore.com/search/napkins.html?order=price_desc', driver.current_url)
-            inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[2]/option[1]')
-            inputElement.click()
-            self.assertEqual('https://www.webstaurantstore.com/search/napkins.html?order=rating_asc', driver.current_url)
-            inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[2]/option[2]')
-            inputElement.click()
-            self.assertEqual('https://www.webstaurantstore.com/search/napkins.html?order=rating_desc', driver.current_url)
-            inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[3]/option[1]')
-            inputElement.click()
-            self.assertEqual('https://www.webstaurantstore.com/search/napkins.html?order=date_desc', driver.current_url)
-            inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[3]/option[2]')
-            inputElement.click()
-            self.assertEqual('https://www.webstaurantstore.com/search/napkins.html?order=date_asc', driver.current_url)
-            self.assertIn("productBox1", driver.page_source)
-
-    def test_category_page_sorting(self):
-        driver = self.driver
-        driver.get('https://www.webstaurantstore.com/51211/desks-and-desk-bases.html')
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[1]/option[2]')
-        inputElement.click()
-
-        self.assertEqual('https://www.webstaurantstore.com/51211/desks-and-desk-bases.html?order=price_desc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[1]/option[1]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/51211/desks-and-desk-bases.html?order=price_asc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[2]/option[1]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/51211/desks-and-desk-bases.html?order=rating_asc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[2]/option[2]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/51211/desks-and-desk-bases.html?order=rating_desc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[3]/option[1]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/51211/desks-and-desk-bases.html?order=date_desc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[3]/option[2]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/51211/desks-and-desk-bases.html?order=date_asc', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
-        
-    def test_specials_sorting(self):
-        driver = self.driver
-        driver.get('https://www.webstaurantstore.com/specials.html')
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[1]/option[2]')
-        inputElement.click()
-
-        self.assertEqual('https://www.webstaurantstore.com/specials.html?order=price_desc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[1]/option[1]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/specials.html?order=price_asc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[2]/option[1]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/specials.html?order=rating_asc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[2]/option[2]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/specials.html?order=rating_desc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[3]/option[1]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/specials.html?order=date_desc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[3]/option[2]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/specials.html?order=date_asc', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
-    def test_group_specials_sorting(self):
-        driver = self.driver
-        driver.get('https://www.webstaurantstore.com/groupspecials.cfm?group_num=12061087')
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[1]/option[2]')
-        inputElement.click()
+            self.assertUrl(sorted_url(entry.url, order))
+        self.assertMarker("productBox1")
 
-        self.assertEqual('https://www.webstaurantstore.com/groupspecials.cfm?group_num=12061087&order=price_desc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[1]/option[1]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/groupspecials.cfm?group_num=12061087&order=price_asc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[2]/option[1]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/groupspecials.cfm?group_num=12061087&order=rating_asc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[2]/option[2]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/groupspecials.cfm?group_num=12061087&order=rating_desc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[3]/option[1]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/groupspecials.cfm?group_num=12061087&order=date_desc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[3]/option[2]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/groupspecials.cfm?group_num=12061087&order=date_asc', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
-    def test_specialized_page_sorting(self):
-        driver = self.driver
-        driver.get('https://www.webstaurantstore.com/specializedpage.cfm?index=14122')
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[1]/option[2]')
-        inputElement.click()
-
-        self.assertEqual('https://www.webstaurantstore.com/specializedpage.cfm?index=14122&order=price_desc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[1]/option[1]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/specializedpage.cfm?index=14122&order=price_asc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[2]/option[1]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/specializedpage.cfm?index=14122&order=rating_asc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[2]/option[2]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/specializedpage.cfm?index=14122&order=rating_desc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[3]/option[1]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/specializedpage.cfm?index=14122&order=date_desc', driver.current_url)
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[3]/option[2]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/specializedpage.cfm?index=14122&order=date_asc', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
-
-    def test_sorting_with_filters(self):
-        driver = self.driver
-        driver.get('https://www.webstaurantstore.com/3337/chef-coats.html?filter=type:unisex-chef-coats&filter=product-line:chef-revival-bronze')
-        inputElement = driver.find_element_by_xpath('//*[@id="sort_options"]/optgroup[1]/option[2]')
-        inputElement.click()
-        self.assertEqual('https://www.webstaurantstore.com/3337/chef-coats.html?filter=type:unisex-chef-coats&filter=product-line:chef-revival-bronze&order=price_desc', driver.current_url)
-
-       
-class SearchWithin(unittest.TestCase):
+#Searches within every catalog entry that has a within=... parameter. With SMOKE_SEARCH_TABS all of them run in one test,
+#spread over tabs, instead of one test each.
+@generate_tests('check_search_within', 'within', decorate=lambda entry, test: unittest.skipIf(SEARCH_TABS, "fanned out over tabs")(test))
+class SearchWithin(SmokeTestCase):
     def setUp(self):
-        self.driver = webdriver.Chrome()
+        super().setUp()
         print("Checking Search Within...")
 
-    def tearDown(self):
-        self.driver.close()
-
-    def test_search_result_search_within(self):
-        terms = ['napkins']
-        driver = self.driver
-        driver.get("https://www.webstaurantstore.com")
-        driver.maximize_window()
-        
-        for term in terms:
-            inputElement = driver.find_element_by_name("searchval")
-            inputElement.clear()
-            inputElement.send_keys(term)
-            inputElement.submit()
-
-            inputElement = driver.find_element_by_name("withinval")
-            inputElement.clear()
-            inputElement.send_keys('cocktail napkin')
-            inputElement.submit()
-
-            self.assertEqual('https://www.webstaurantstore.com/search/napkins.html?withinval=cocktail+napkin', driver.current_url)
-            self.assertIn("productBox1", driver.page_source)
-
-        
-    def test_category_page_search_within(self):
-        driver = self.driver
-        driver.get("https://www.webstaurantstore.com/3337/chef-coats.html")
-        driver.maximize_window()
-
-        inputElement = driver.find_element_by_name("withinval")
-        inputElement.clear()
-        inputElement.send_keys('button strips')
-        inputElement.submit()
-
-        self.assertEqual('https://www.webstaurantstore.com/3337/chef-coats.html?withinval=button+strips', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
+    @unittest.skipUnless(SEARCH_TABS, "tab fan-out is off (set SMOKE_SEARCH_TABS=N)")
+    def test_search_within_tabs(self):
+        self.fan_out(self.entries('within'), search_within_term)
 
-        
-    def test_group_specials_search_within(self):
+    def check_search_within(self, entry):
         driver = self.driver
-        driver.get("https://www.webstaurantstore.com/groupspecials.cfm?group_num=12061087")
-        driver.maximize_window()
+        driver.get(entry.base if entry.is_term else entry.url)
+        if entry.is_term:
+            self.search(entry)
 
-        inputElement = driver.find_element_by_name("withinval")
+        inputElement = self.find('search_within_box')
         inputElement.clear()
-        inputElement.send_keys('japanese')
-        inputElement.submit()
+        inputElement.send_keys(entry.params['within'])
+        self.navigate_by(inputElement.submit)
+
+        self.assertUrl(entry.url + ('&' if '?' in entry.url else '?') + urlencode({'withinval': entry.params['within']}))
+        self.assertMarker("productBox1")
+
+class Filters(SmokeTestCase):
+    full_page_load = True
+
+    #Each filter test starts on a page and clicks through facets; every click has to lead to the given URL and show products.
+    #Clicks are chained: each one is on the page the previous one led to.
+    contracts = {
+        'single_spec': (WSS + "/50889/stoneware-plates.html", [
+            (('spec_filter', 'Shape', 'Oval'), WSS + '/50889/stoneware-plates.html?filter=shape:oval'),
+        ]),
+        'multiple_spec': (WSS + "/2997/refrigerator-freezer-thermometers.html", [
+            (('spec_filter', 'Type', 'Refrigerator / Freezer Thermometers'),
+             WSS + '/2997/refrigerator-freezer-thermometers.html?filter=type:refrigerator-freezer-thermometers'),
+            (('spec_filter', 'Minimum_Temperature', '-40 Degrees F'),
+             WSS + '/2997/refrigerator-freezer-thermometers.html?filter=type:refrigerator-freezer-thermometers&filter=minimum-temperature:-40-degrees-f'),
+        ]),
+        'brand': (WSS + "/14821/gas-connectors-and-gas-hoses.html", [
+            (('spec_filter', 'Vendor', 'T&S Brass and Bronze Works'),
+             WSS + '/14821/gas-connectors-and-gas-hoses.html?vendor=T-S-Brass-and-Bronze-Works'),
+            (('spec_filter', 'T___S_Accessories', 'Swivelink'),
+             WSS + '/14821/gas-connectors-and-gas-hoses.html?filter=t-s-accessories:swivelink&vendor=T-S-Brass-and-Bronze-Works'),
+        ]),
+        'category': (WSS + "/search/plates.html", [
+            (('category_filter', 'Dinner Plates'), WSS + '/search/plates.html?category=3787'),
+            (('category_filter', 'Dinner Plates'), WSS + '/search/plates.html'), #Clicking it again takes the filter off
+            (('category_filter', 'Disposable Plates'), WSS + '/search/plates.html?category=14177'),
+        ]),
+        'price': (WSS + "/specials.html", [
+            (('spec_filter', 'Price', '$100 - $200'), WSS + '/specials.html?price=100,200'),
+        ]),
+    }
 
-        self.assertEqual('https://www.webstaurantstore.com/groupspecials.cfm?group_num=12061087&withinval=japanese', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
-        
-
-class Filters(unittest.TestCase):
     def setUp(self):
-        self.driver = webdriver.Chrome()
+        super().setUp()
         print("Checking filters...")
 
-    def tearDown(self):
-        self.driver.close()
+    def check_filters(self, name):
+        start, steps = self.contracts[name]
+        if URL_CONTRACTS:
+            return self.check_contract(Contract(start, steps, chained=True))
+        self.driver.get(start)
+        for locator, expected in steps:
+            inputElement = self.find(*locator)
+            inputElement.click()
 
-    def test_single_spec_filter(self):
-        driver = self.driver
-        driver.get("https://www.webstaurantstore.com/50889/stoneware-plates.html")
-        driver.maximize_window()
-        
-        inputElement = driver.find_element_by_xpath('//*[@id="collapseShape"]/a[1]/label/label/div')
-        inputElement.click()
+            self.assertUrl(expected)
+            self.assertMarker("productBox1")
 
-        self.assertEqual('https://www.webstaurantstore.com/50889/stoneware-plates.html?filter=shape:oval', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
+    def test_single_spec_filter(self):
+        self.check_filters('single_spec')
 
     def test_multiple_spec_filters(self):
-        driver = self.driver
-        driver.get("https://www.webstaurantstore.com/2997/refrigerator-freezer-thermometers.html")
-        driver.maximize_window()
-        
-        inputElement = driver.find_element_by_xpath('//*[@id="collapseType"]/a[3]/label/label/div')
-        inputElement.click()
-
-        self.assertEqual('https://www.webstaurantstore.com/2997/refrigerator-freezer-thermometers.html?filter=type:refrigerator-freezer-thermometers', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
+        self.check_filters('multiple_spec')
 
-        inputElement = driver.find_element_by_xpath('//*[@id="collapseMinimum_Temperature"]/a[1]/label/label/div')
-        inputElement.click()
-
-        self.assertEqual('https://www.webstaurantstore.com/2997/refrigerator-freezer-thermometers.html?filter=type:refrigerator-freezer-thermometers&filter=minimum-temperature:-40-degrees-f', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
-    
     def test_brand_filter(self):
-        driver = self.driver
-        driver.get("https://www.webstaurantstore.com/14821/gas-connectors-and-gas-hoses.html")
-        driver.maximize_window()
-
-        inputElement = driver.find_element_by_xpath('//*[@id="collapseVendor"]/a[4]/label/label/div')
-        inputElement.click()
-
-        self.assertEqual('https://www.webstaurantstore.com/14821/gas-connectors-and-gas-hoses.html?vendor=T-S-Brass-and-Bronze-Works', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
-
-        inputElement = driver.find_element_by_xpath('//*[@id="collapseT___S_Accessories"]/a[2]/label/label/div')
-        inputElement.click()
-
-        self.assertEqual('https://www.webstaurantstore.com/14821/gas-connectors-and-gas-hoses.html?filter=t-s-accessories:swivelink&vendor=T-S-Brass-and-Bronze-Works', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
+        self.check_filters('brand')
 
     def test_category_filter(self):
-        driver = self.driver
-        driver.get("https://www.webstaurantstore.com/search/plates.html")
-        driver.maximize_window()
+        self.check_filters('category')
 
-        inputElement = driver.find_element_by_xpath('//*[@id="section1"]/a[1]/label/span')
-        inputElement.click()
+    def test_price_filter(self):
+        self.check_filters('price')
+
+#Checks that only need the server's HTML. With SMOKE_HTTP=1 they run here, concurrently and without a browser, and the browser
+#tests they cover (@http_fast_path) are skipped. Everything is fetched once in setUpClass; each test asserts on its share of the results.
+@unittest.skipUnless(HTTP_MODE, "HTTP fast path is off (set SMOKE_HTTP=1)")
+class HttpFastPath(unittest.TestCase):
+    listings = [entry for page_type in ['category', 'specials', 'group_special', 'specialized']
+                for entry in catalog.select(site='wss', page_type=page_type)]
+    checks = {
+        'trs_product': [Check(entry.url, entry.markers) for entry in catalog.select(site='trs', page_type='product')],
+        'sorting': [Check(entry.url, ["productBox1"], SORT_ORDERS) for entry in catalog.select('sort') if entry.url],
+    }
+
+    journeys = scenarios.build()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.results = run_checks(cls.checks, cookies=trs_session.cookie_jar()) #TRS makes you select a store before browsing the site
+        cls.crawls = crawl_all([(entry.url, entry.markers, entry.depth) for entry in cls.listings])
+        cls.scenario_runs = run_scenarios(cls.journeys, cookies=trs_session.cookie_jar())
+
+    def assertChecksPass(self, name):
+        for result in self.results[name]:
+            print("Checking over HTTP: %s (%.2fs)" % (result.url, result.elapsed))
+            with self.subTest(url=result.url):
+                self.assertTrue(result.passed, '; '.join(result.problems))
+
+    #Every page of every listing, up to the entry's depth. Categories may have fewer pages than that.
+    def test_plp_loads(self):
+        for entry, result in zip(self.listings, self.crawls):
+            print("Crawling over HTTP: %s (%d pages, %.2fs)" % (entry.url, len(result.results), result.elapsed))
+            with self.subTest(url=entry.url):
+                self.assertTrue(result.passed, '; '.join(result.problems))
+                if entry.type != 'category':
+                    self.assertGreaterEqual(result.page_count or 0, result.depth, "only %s pages" % result.page_count)
 
-        self.assertEqual('https://www.webstaurantstore.com/search/plates.html?category=3787', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
+    def test_trs_product_page(self):
+        self.assertChecksPass('trs_product')
 
-        inputElement = driver.find_element_by_xpath('//*[@id="section1"]/a[1]/label/span')
-        inputElement.click()
+    def test_plp_sorting(self):
+        self.assertChecksPass('sorting')
 
-        self.assertEqual('https://www.webstaurantstore.com/search/plates.html', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
+    #The user journeys load_test.py replays (search and paginate, category then filter then sort, search within), walked once each.
+    def test_scenarios(self):
+        for run in self.scenario_runs:
+            print("Walking over HTTP: %s (%d steps, %.2fs)" % (run.scenario.name, len(run.results), run.elapsed))
+            with self.subTest(scenario=run.scenario.name):
+                self.assertTrue(run.passed, '; '.join(run.problems))
 
-        inputElement = driver.find_element_by_xpath('//*[@id="section2"]/a[1]/label/span')
-        inputElement.click()
 
-        self.assertEqual('https://www.webstaurantstore.com/search/plates.html?category=14177', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
+#The same pages as HttpFastPath, rendered in Chrome tabs over the DevTools protocol (cdp_backend.py) so scripts run and markers
+#added by JavaScript count. With SMOKE_BACKEND=cdp one browser checks SMOKE_CDP_TABS pages at a time and the browser tests it
+#covers are skipped.
+@unittest.skipUnless(CDP_MODE, "CDP backend is off (set SMOKE_BACKEND=cdp)")
+class CdpFastPath(unittest.TestCase):
+    listings = HttpFastPath.listings + catalog.select(site='trs', page_type='product')
 
-    def test_price_filter(self):
-        driver = self.driver
-        driver.get("https://www.webstaurantstore.com/specials.html")
-        driver.maximize_window()
-        
-        inputElement = driver.find_element_by_xpath('//*[@id="collapsePrice"]/a[2]/label/label/div')
-        inputElement.click()
+    @classmethod
+    def setUpClass(cls):
+        cls.crawls = cdp_backend.check_listings([(entry.url, entry.markers, entry.depth) for entry in cls.listings])
+
+    def test_pages_render(self):
+        for entry, result in zip(self.listings, self.crawls):
+            print("Checking in a CDP tab: %s (%d pages, %.2fs)" % (entry.url, len(result.results), result.elapsed))
+            with self.subTest(url=entry.url):
+                self.assertTrue(result.passed, '; '.join(result.problems))
+                if entry.type not in ('category', 'product'):
+                    self.assertGreaterEqual(result.page_count or 0, result.depth, "only %s pages" % result.page_count)
 
-        self.assertEqual('https://www.webstaurantstore.com/specials.html?price=100,200', driver.current_url)
-        self.assertIn("productBox1", driver.page_source)
 
+#Runs the module's tests most-likely-to-fail first, by the run history (run_history.py), like parallel_runner.py does.
+def load_tests(loader, tests, pattern):
+    return fail_fast(tests)
 
 if __name__ == "__main__":
-    unittest.main()	
+    unittest.main(testRunner=results_sink.runner()) #Streams results to smoke_results.jsonl/.xml as tests finish
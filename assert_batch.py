@@ -0,0 +1,173 @@
+'''
+Batched assertions. Checking a page element by element costs a WebDriver round trip per find_element, per is_displayed() and per
+.text, so a handful of checks on one page turns into a dozen requests to chromedriver. An AssertionBatch collects the checks for
+the page the browser is on and evaluates all of them in one injected script, coming back with a result for every check.
+
+    batch = AssertionBatch(driver)
+    batch.visible(xpath='//*[@id="page"]/div[3]/ul/li[2]')
+    batch.text_contains('hamburger press', css='#searchForm li:nth-of-type(2) span:nth-of-type(2)')
+    batch.url_is(WSS + '/search/plates.html')
+    result = batch.run()
+    assert result.passed, result.message()
+
+Elements are located with exactly one of xpath=, css=, id=, name=, class_name= or locator= (a named locator from locators.py,
+e.g. locator=locators.get('autosuggest_item', 2), whose strategies are tried in order). Text is matched against the element's rendered
+text (innerText), which is what WebElement.text returns.
+
+With the CDP backend (cdp_backend.py) pass a Page instead of the driver and await batch.run_async().
+'''
+from locators import LOCATE_FUNCTION
+
+BATCH_SCRIPT = LOCATE_FUNCTION + '''
+function first(strategies) {
+    for (var i = 0; i < strategies.length; i++) {
+        var found = locate(strategies[i][0], strategies[i][1]);
+        if (found) return found;
+    }
+    return null;
+}
+function visible(el) {
+    if (!el.getClientRects().length) return false;
+    var style = window.getComputedStyle(el);
+    return style.visibility !== 'hidden' && style.display !== 'none' && style.opacity !== '0';
+}
+function marker(m) {
+    var attribute = /^class="(.*)"$/.exec(m);
+    if (attribute) {
+        var nodes = document.querySelectorAll('[class]');
+        for (var i = 0; i < nodes.length; i++) if (nodes[i].getAttribute('class') === attribute[1]) return true;
+    } else if (document.getElementById(m) || document.getElementsByName(m).length ||
+               (m.trim() && document.getElementsByClassName(m).length)) {
+        return true;
+    }
+    return document.documentElement.outerHTML.indexOf(m) >= 0;
+}
+return arguments[0].map(function(check) {
+    try {
+        if (check.kind === 'url_is') return {ok: location.href === check.expected, actual: location.href};
+        if (check.kind === 'marker') return {ok: marker(check.expected), actual: null};
+        var el = first(check.strategies);
+        if (!el) return {ok: check.kind === 'absent', actual: null};
+        if (check.kind === 'present') return {ok: true, actual: null};
+        if (check.kind === 'absent') return {ok: false, actual: null};
+        if (check.kind === 'visible') return {ok: visible(el), actual: visible(el) ? 'visible' : 'hidden'};
+        var text = el.innerText || el.textContent || '';
+        if (check.kind === 'text_contains') return {ok: text.indexOf(check.expected) >= 0, actual: text};
+        if (check.kind === 'text_is') return {ok: text.trim() === check.expected, actual: text};
+        return {ok: false, actual: null, error: 'unknown check ' + check.kind};
+    } catch (e) {
+        return {ok: false, actual: null, error: String(e)};
+    }
+});
+'''
+
+LOCATORS = ['xpath', 'css', 'id', 'name', 'class_name', 'locator']
+
+
+#(description, strategies) for the locator keyword a check was given.
+def locator(kwargs):
+    given = [(by, value) for by, value in kwargs.items() if by in LOCATORS and value is not None]
+    if len(given) != 1 or len(given) != len(kwargs):
+        raise TypeError('give exactly one of %s, got %s' % (', '.join(LOCATORS), ', '.join(kwargs) or 'none'))
+    by, value = given[0]
+    if by == 'locator':
+        return value.name, [list(strategy) for strategy in value.strategies]
+    return '%s=%r' % (by, value), [[by, value]]
+
+
+class CheckOutcome:
+    def __init__(self, check, ok, actual=None, error=None):
+        self.check = check
+        self.ok = ok
+        self.actual = actual
+        self.error = error
+
+    def message(self):
+        check = self.check
+        where = check.get('where', '')
+        if self.error:
+            return '%s %s failed: %s' % (check['kind'], where, self.error)
+        if check['kind'] == 'url_is':
+            return 'URL is %r, expected %r' % (self.actual, check['expected'])
+        if check['kind'] == 'marker':
+            return '%r not found on the page' % check['expected']
+        if check['kind'] in ('visible', 'present') and self.actual is None:
+            return 'no element %s' % where
+        if check['kind'] == 'visible':
+            return 'element %s is not visible' % where
+        if check['kind'] == 'absent':
+            return 'element %s is on the page' % where
+        if self.actual is None:
+            return 'no element %s (expected text %r)' % (where, check['expected'])
+        return 'element %s text %r does not %s %r' % (where, self.actual.strip()[:200],
+                                                      'contain' if check['kind'] == 'text_contains' else 'equal',
+                                                      check['expected'])
+
+
+class BatchResult:
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+
+    @property
+    def failures(self):
+        return [outcome for outcome in self.outcomes if not outcome.ok]
+
+    @property
+    def passed(self):
+        return not self.failures
+
+    def message(self):
+        return '; '.join(outcome.message() for outcome in self.failures)
+
+
+class AssertionBatch:
+    def __init__(self, driver):
+        self.driver = driver
+        self.checks = []
+
+    def add(self, kind, expected=None, **kwargs):
+        check = {'kind': kind, 'expected': expected}
+        if kwargs:
+            check['where'], check['strategies'] = locator(kwargs)
+        self.checks.append(check)
+        return self
+
+    def present(self, **locator):
+        return self.add('present', **locator)
+
+    def absent(self, **locator):
+        return self.add('absent', **locator)
+
+    def visible(self, **locator):
+        return self.add('visible', **locator)
+
+    def text_contains(self, text, **locator):
+        return self.add('text_contains', text, **locator)
+
+    def text_is(self, text, **locator):
+        return self.add('text_is', text, **locator)
+
+    def url_is(self, url):
+        return self.add('url_is', url)
+
+    #A page marker as the smoke tests use them (id, class name, name attribute, class="..." or any text in the HTML).
+    def marker(self, marker):
+        return self.add('marker', marker)
+
+    #Evaluates every check in one execute_script call and clears the batch.
+    def run(self):
+        checks, self.checks = self.checks, []
+        if not checks:
+            return BatchResult([])
+        return self.result(checks, self.driver.execute_script(BATCH_SCRIPT, checks))
+
+    #The same for a cdp_backend.Page, whose execute_script is a coroutine.
+    async def run_async(self):
+        checks, self.checks = self.checks, []
+        if not checks:
+            return BatchResult([])
+        return self.result(checks, await self.driver.execute_script(BATCH_SCRIPT, checks))
+
+    def result(self, checks, answers):
+        return BatchResult([CheckOutcome(check, answer.get('ok'), answer.get('actual'), answer.get('error'))
+                            for check, answer in zip(checks, answers)])
@@ -0,0 +1,185 @@
+'''
+Keystroke-level autosuggest profiling. The AutoSuggest tests only check which suggestions come up for a whole word; this types
+each prefix in SMOKE_AUTOSUGGEST_PREFIXES into the search box one character at a time and measures, for every keystroke, how
+long the suggestion list under #searchForm took to change. A probe injected into the page timestamps everything with the
+browser's own clock (performance.now()), so chromedriver round trips and polling aren't part of the numbers:
+
+    wait      keydown until the suggest request went out (debouncing on the page)
+    request   request sent until its response was in (XHR readyState 4, or fetch() resolving)
+    server    the request's time to first byte, from Resource Timing
+    render    response until the list changed (MutationObserver)
+    total     keydown until the list changed
+
+Suggest requests are the XHR and fetch() calls whose URL contains SMOKE_AUTOSUGGEST_URL. A keystroke that sends no request
+(the page answered from its own cache) only gets a total. At the end of the run p50/p95/p99 of each are printed per prefix
+length: one letter matches far more than three, so they are not comparable.
+
+Settings:
+    SMOKE_AUTOSUGGEST_PROFILE=1          run AutoSuggest.test_auto_suggest_latency
+    SMOKE_AUTOSUGGEST_PREFIXES=ham,pla   what gets typed (default ham)
+    SMOKE_AUTOSUGGEST_URL=autocomplete   part of the suggest request URL (default autocomplete)
+    SMOKE_AUTOSUGGEST_TIMEOUT=s          how long to wait for the list after a keystroke (default 5)
+'''
+import atexit
+import math
+import os
+
+from waits import AdaptiveWait, named
+
+ENABLED = os.environ.get('SMOKE_AUTOSUGGEST_PROFILE', '') not in ('', '0')
+PREFIXES = [prefix for prefix in os.environ.get('SMOKE_AUTOSUGGEST_PREFIXES', 'ham').split(',') if prefix]
+URL_PART = os.environ.get('SMOKE_AUTOSUGGEST_URL', 'autocomplete')
+TIMEOUT = float(os.environ.get('SMOKE_AUTOSUGGEST_TIMEOUT', '5'))
+QUIET_MS = 1000 #After this long without a request or a change to the list, a keystroke isn't going to update it
+
+FORM = '#searchForm'
+SUGGESTIONS = '#searchForm ul li'
+
+PHASES = ['total', 'wait', 'request', 'server', 'render']
+PERCENTILES = [50, 95, 99]
+
+#Installs the probe once per page: keydowns in the form, suggest requests going out and coming back, and changes under the form.
+#Our readystatechange listener is added when the XHR is constructed, so it runs before any handler the page sets.
+PROBE_SCRIPT = '''
+if (window.__suggestProbe) return false;
+var probe = window.__suggestProbe = {keys: [], requests: [], renders: []}, pattern = arguments[1];
+var form = document.querySelector(arguments[0]);
+form.addEventListener('keydown', function() { probe.keys.push(performance.now()); }, true);
+new MutationObserver(function() { probe.renders.push(performance.now()); })
+    .observe(form, {childList: true, subtree: true, characterData: true});
+performance.setResourceTimingBufferSize(1000);
+
+function track(url) {
+    if (String(url).indexOf(pattern) < 0) return null;
+    var request = {url: new URL(url, location.href).href, sent: performance.now(), done: null};
+    probe.requests.push(request);
+    return request;
+}
+function done(request) {
+    if (request && request.done === null) request.done = performance.now();
+}
+
+var Original = window.XMLHttpRequest, open = Original.prototype.open, send = Original.prototype.send;
+window.XMLHttpRequest = function() {
+    var xhr = new Original();
+    xhr.addEventListener('readystatechange', function() { if (xhr.readyState === 4) done(xhr.__suggestRequest); });
+    return xhr;
+};
+window.XMLHttpRequest.prototype = Original.prototype;
+Object.setPrototypeOf(window.XMLHttpRequest, Original);
+Original.prototype.open = function(method, url) {
+    this.__suggestUrl = url;
+    return open.apply(this, arguments);
+};
+Original.prototype.send = function() {
+    if (this.__suggestUrl !== undefined) this.__suggestRequest = track(this.__suggestUrl);
+    return send.apply(this, arguments);
+};
+
+if (window.fetch) {
+    var fetch = window.fetch;
+    window.fetch = function(input) {
+        var request = track(typeof input === 'string' || input instanceof URL ? input : input.url);
+        var response = fetch.apply(this, arguments);
+        if (!request) return response;
+        return response.then(function(result) { done(request); return result; }, function(error) { done(request); throw error; });
+    };
+}
+return true;
+'''
+
+MARK_SCRIPT = 'return window.__suggestProbe ? window.__suggestProbe.keys.length : -1;'
+
+#Measurements for keydown number arguments[0], or null while the list may still change. The list counts as updated by the
+#first change after the last suggest request sent since the keydown came back.
+STATE_SCRIPT = '''
+var probe = window.__suggestProbe, index = arguments[0], quiet = arguments[1];
+if (!probe || probe.keys.length <= index) return null;
+var key = probe.keys[index], now = performance.now();
+var requests = probe.requests.filter(function(request) { return request.sent >= key; });
+if (requests.some(function(request) { return request.done === null; })) return null;
+var last = requests[requests.length - 1], since = last ? last.done : key;
+if (!last && now - key < quiet) return null;
+var rendered = probe.renders.filter(function(time) { return time >= since; })[0];
+if (rendered === undefined && now - since < quiet) return null;
+var server = null;
+if (last) performance.getEntriesByName(last.url).forEach(function(entry) {
+    if (entry.startTime >= last.sent - 1 && entry.requestStart > 0) server = entry.responseStart - entry.requestStart;
+});
+var suggestions = Array.prototype.filter.call(document.querySelectorAll(arguments[2]), function(item) {
+    return item.getClientRects().length;
+}).map(function(item) { return (item.innerText || item.textContent).trim(); });
+return {requests: requests.length, wait: last ? last.sent - key : null, request: last ? last.done - last.sent : null,
+        server: server, render: rendered === undefined ? null : rendered - since,
+        total: rendered === undefined ? null : rendered - key, suggestions: suggestions};
+'''
+
+#Prefix length -> keystrokes measured: {phase: ms}
+samples = {}
+failures = {'timed out': 0, 'list not updated': 0}
+
+
+def install(driver):
+    return driver.execute_script(PROBE_SCRIPT, FORM, URL_PART)
+
+
+def record(prefix, state, error):
+    keystroke = {'prefix': prefix, 'error': error, 'requests': state.get('requests', 0), 'suggestions': state.get('suggestions', [])}
+    for phase in PHASES:
+        keystroke[phase] = round(state[phase], 1) if state.get(phase) is not None else None
+    if error:
+        failures[error] += 1
+    else:
+        samples.setdefault(len(prefix), []).append(keystroke)
+    return keystroke
+
+
+#Clears the search box and types `prefix` one character at a time, waiting for the suggestion list after each keystroke.
+#The probe has to be installed on the page first. Returns one keystroke dict per character, with an 'error' when the list
+#didn't change.
+def type_prefix(driver, box, prefix, timeout=TIMEOUT):
+    from selenium.common.exceptions import TimeoutException #Keeps selenium out of browserless runs
+    box.clear()
+    keystrokes = []
+    for length in range(1, len(prefix) + 1):
+        index = driver.execute_script(MARK_SCRIPT)
+        box.send_keys(prefix[length - 1])
+        updated = named('autosuggest_keystroke', lambda driver: driver.execute_script(STATE_SCRIPT, index, QUIET_MS, SUGGESTIONS))
+        try:
+            state = AdaptiveWait(driver, timeout).until(updated)
+            error = None if state['total'] is not None else 'list not updated'
+        except TimeoutException:
+            state, error = {}, 'timed out'
+        keystrokes.append(record(prefix[:length], state, error))
+    return keystrokes
+
+
+#Nearest rank percentile.
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+
+def summary(phase, keystrokes):
+    values = [keystroke[phase] for keystroke in keystrokes if keystroke[phase] is not None]
+    if not values:
+        return '-'
+    return '/'.join('%.0f' % percentile(values, p) for p in PERCENTILES)
+
+
+def report():
+    lines = ['Autosuggest latency per prefix length, ms p%s:' % '/p'.join(str(p) for p in PERCENTILES),
+             '  %3s %4s  %s' % ('len', 'keys', ''.join('%-16s' % phase for phase in PHASES))]
+    for length, keystrokes in sorted(samples.items()):
+        lines.append('  %3d %4d  %s' % (length, len(keystrokes), ''.join('%-16s' % summary(phase, keystrokes) for phase in PHASES)))
+    if any(failures.values()):
+        lines.append('  failed keystrokes: ' + ', '.join('%d %s' % (count, error) for error, count in failures.items() if count))
+    return '\n'.join(line.rstrip() for line in lines)
+
+
+def print_report():
+    if samples or any(failures.values()):
+        print(report())
+
+
+atexit.register(print_report)
@@ -0,0 +1,223 @@
+'''
+Benchmark suite for the smoke harness. Runs the suite against the local stub site (stub_site.py) once per execution mode and
+measures
+
+    . total wall time of the run, and the time until the first test started (imports, test loading, see startup.py)
+    . time per test class, from the streamed results (results_sink.py): each test is charged the time since the previous test
+      in the same process finished (or the process started running tests), so class fixtures count too (setUpClass, e.g. all
+      of HttpFastPath's fetching)
+    . time per command kind (navigate, click, assert, find, ...) and, for page loads, the harness overhead: how much longer the
+      command took than the browser's own load (Navigation Timing), i.e. what WebDriver and the harness add
+
+Every run is appended to benchmark_history.jsonl (SMOKE_BENCH_HISTORY) with the git commit it ran on, and a Markdown
+comparison table is written to benchmark.md, with each mode's wall time next to the last run of the same mode on an earlier
+commit. Commit the history file to keep the numbers next to the code that produced them.
+
+    python benchmark.py --latency 0.05 --modes browser,http,contracts SmokeTestProd.PLPSorting SmokeTestProd.Filters
+
+Modes are the harness's switches (SMOKE_HTTP, SMOKE_BACKEND, SMOKE_SEARCH_TABS, SMOKE_URL_CONTRACTS, parallel_runner.py).
+The stub's latency is added to every response, so runs are reproducible and independent of the production sites.
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from stub_site import StubSite
+
+HISTORY_FILE = os.environ.get('SMOKE_BENCH_HISTORY', 'benchmark_history.jsonl')
+TABLE_FILE = os.environ.get('SMOKE_BENCH_TABLE', 'benchmark.md')
+
+#mode -> (environment, parallel workers; 0 runs the suite in one process)
+MODES = {
+    'browser': ({}, 0),
+    'http': ({'SMOKE_HTTP': '1'}, 0),
+    'cdp': ({'SMOKE_BACKEND': 'cdp'}, 0),
+    'tabs': ({'SMOKE_SEARCH_TABS': '8'}, 0),
+    'contracts': ({'SMOKE_URL_CONTRACTS': '1'}, 0),
+    'parallel': ({}, 4),
+    'all': ({'SMOKE_HTTP': '1', 'SMOKE_SEARCH_TABS': '8', 'SMOKE_URL_CONTRACTS': '1'}, 4),
+}
+
+PAGE_LOADS = ('navigate', 'refresh', 'click', 'submit')
+
+RUN_SCRIPT = 'import sys, unittest, results_sink; unittest.main(module=None, argv=["smoke"] + sys.argv[1:], testRunner=results_sink.runner())'
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'], stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def read_events(path):
+    events = []
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                events.append(json.loads(line))
+    except OSError:
+        pass
+    return events
+
+
+#Per class: [tests, failed, seconds]. Per command kind: [count, seconds, overhead samples, overhead seconds].
+def summarize(events):
+    classes = {}
+    commands = {}
+    started = {}
+    finished = {} #pid -> when the last test in that process finished
+    for event in events:
+        if event['event'] == 'run':
+            finished[event['pid']] = event['started']
+        elif event['event'] == 'start':
+            started[(event.get('pid'), event['test'])] = event['started']
+        elif event['event'] == 'test':
+            entry = classes.setdefault(event['test'].rsplit('.', 2)[-2], [0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += 1 if event['outcome'] in ('failure', 'error') else 0
+            if 'finished' in event:
+                since = finished.get(event['pid'], started.get((event['pid'], event['test']), event['finished'] - event['seconds']))
+                entry[2] += event['finished'] - since
+                finished[event['pid']] = event['finished']
+            else:
+                entry[2] += event['seconds']
+        elif event['event'] == 'step':
+            entry = commands.setdefault(event['kind'], [0, 0.0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += event['seconds']
+            timing = event.get('timing')
+            if event['kind'] in PAGE_LOADS and timing:
+                loaded = (timing.get('load') or timing.get('dom_content_loaded') or 0) / 1000.0
+                if loaded:
+                    entry[2] += 1
+                    entry[3] += event['seconds'] - loaded
+    return classes, commands
+
+
+#Runs the tests once in `mode` and returns its record for the history file.
+def run_mode(mode, tests, env):
+    mode_env, workers = MODES[mode]
+    handle, results = tempfile.mkstemp(suffix='.jsonl', prefix='smoke_bench_%s_' % mode)
+    os.close(handle)
+    scratch = tempfile.mkdtemp(prefix='smoke_bench_')
+    run_env = dict(env, SMOKE_RESULTS=results, SMOKE_JUNIT='', SMOKE_TRACE='', SMOKE_BUDGETS='off',
+                   SMOKE_HISTORY=os.path.join(scratch, 'history.json'), **mode_env)
+    if workers:
+        command = [sys.executable, 'parallel_runner.py', '--workers', str(workers)] + tests
+    else:
+        command = [sys.executable, '-c', RUN_SCRIPT] + tests
+    launched = time.time()
+    start = time.perf_counter()
+    code = subprocess.call(command, env=run_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wall = time.perf_counter() - start
+    events = read_events(results)
+    classes, commands = summarize(events)
+    os.remove(results)
+    starts = [event['started'] for event in events if event['event'] == 'start']
+    return {'mode': mode, 'wall': round(wall, 3), 'first_test': round(min(starts) - launched, 3) if starts else None, 'exit': code,
+            'classes': classes, 'commands': commands}
+
+
+#The run with the median wall time out of `repeat`, so one noisy run doesn't decide the number.
+def benchmark(modes, tests, latency, repeat=1):
+    records = []
+    with StubSite(latency=latency) as stub:
+        env = dict(os.environ, **stub.env())
+        for mode in modes:
+            runs = sorted((run_mode(mode, tests, env) for n in range(repeat)), key=lambda run: run['wall'])
+            record = runs[len(runs) // 2]
+            record['walls'] = [run['wall'] for run in runs]
+            records.append(record)
+            print('%-10s %7.2fs  (%s)' % (mode, record['wall'], ', '.join('%.2f' % run['wall'] for run in runs)))
+    commit = git_commit()
+    for record in records:
+        record.update(commit=commit, latency=latency, tests=tests, time=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    return records
+
+
+def load_history(path=HISTORY_FILE):
+    return read_events(path)
+
+
+def save_history(records, path=HISTORY_FILE):
+    with open(path, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+#Latest earlier-commit run of the same mode, latency and tests, to compare against.
+def previous(record, history):
+    for old in reversed(history):
+        if (old['mode'], old['latency'], old['tests']) == (record['mode'], record['latency'], record['tests']) \
+                and old['commit'].replace('-dirty', '') != record['commit'].replace('-dirty', ''):
+            return old
+    return None
+
+
+def comparison_table(records, history):
+    lines = ['# Smoke harness benchmark', '',
+             'Commit %s, stub latency %.3fs, tests: %s' % (records[0]['commit'], records[0]['latency'],
+                                                          ' '.join(records[0]['tests']) or 'all'), '',
+             '| mode | tests | failed | first test s | wall s | previous | change |', '|---|---:|---:|---:|---:|---|---:|']
+    for record in records:
+        tests = sum(entry[0] for entry in record['classes'].values())
+        failed = sum(entry[1] for entry in record['classes'].values())
+        old = previous(record, history)
+        change = '%+.0f%%' % (100.0 * (record['wall'] / old['wall'] - 1)) if old and old['wall'] else ''
+        first_test = '%.2f' % record['first_test'] if record.get('first_test') is not None else '-'
+        lines.append('| %s | %d | %d | %s | %.2f | %s | %s |' % (record['mode'], tests, failed, first_test, record['wall'],
+                                                           '%.2f (%s)' % (old['wall'], old['commit']) if old else '-', change))
+    modes = [record['mode'] for record in records]
+    header = '| %s | ' + ' | '.join(modes) + ' |'
+    rule = '|---|' + '---:|' * len(modes)
+
+    lines += ['', '## Seconds per test class', '', header % 'class', rule]
+    for test_class in sorted(set(name for record in records for name in record['classes'])):
+        lines.append('| %s | %s |' % (test_class, ' | '.join(
+            '%.2f' % record['classes'][test_class][2] if test_class in record['classes'] else '-' for record in records)))
+
+    lines += ['', '## Milliseconds per command (harness overhead over the browser\'s own page load)', '', header % 'command', rule]
+    for kind in sorted(set(name for record in records for name in record['commands'])):
+        cells = []
+        for record in records:
+            if kind not in record['commands']:
+                cells.append('-')
+                continue
+            count, seconds, loads, overhead = record['commands'][kind]
+            cells.append('%.1f' % (1000.0 * seconds / count) + (' (+%.1f)' % (1000.0 * overhead / loads) if loads else ''))
+        lines.append('| %s | %s |' % (kind, ' | '.join(cells)))
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the smoke harness against the local stub site, per execution mode.')
+    parser.add_argument('tests', nargs='*', default=[], help='test classes or methods (default: the whole suite)')
+    parser.add_argument('--modes', default='browser,http,parallel', help='comma separated, any of ' + ', '.join(MODES))
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the stub adds to every response')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per mode; the median one is reported')
+    parser.add_argument('--no-save', action='store_true', help="don't append this run to the history file")
+    args = parser.parse_args(argv)
+    modes = args.modes.split(',')
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error('unknown mode %s' % ', '.join(unknown))
+    history = load_history()
+    records = benchmark(modes, args.tests or ['SmokeTestProd'], args.latency, args.repeat)
+    table = comparison_table(records, history)
+    with open(TABLE_FILE, 'w', encoding='utf-8') as f:
+        f.write(table)
+    print(table)
+    if not args.no_save:
+        save_history(records)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+'''
+Browser profiles for the smoke suite. The smoke checks only look at markup, links and a few scripts, so the "fast" profile
+(the default) leaves out everything else a page pulls in:
+
+    . headless Chrome with a fixed 1920x1080 viewport, instead of a window that gets maximized
+    . images, media, fonts, analytics and ad requests blocked by URL pattern (Network.setBlockedURLs)
+    . page load strategy "eager": driver.get() returns at DOMContentLoaded instead of waiting for every subresource.
+      Tests that need the page's scripts to have finished (full_page_load = True on the test class) still wait for
+      document.readyState == 'complete'.
+    . one disk cache shared by every session, so CSS and JS are fetched once per run instead of once per browser
+
+The "default" profile is plain Chrome, as the suite used to start it. Pick one with SMOKE_PROFILE=fast|default.
+
+Other settings:
+    SMOKE_HEADLESS=0        show the browser window
+    SMOKE_BLOCK=a,b         extra URL patterns to block (* wildcards), SMOKE_BLOCK=none blocks nothing
+    SMOKE_CACHE_DIR=path    where the shared disk cache lives (default .smoke_cache/chrome)
+
+Compare profiles per test class (one run per profile, read from the timing trace):
+    python browser_profile.py --stub --latency 0.05 SmokeTestProd.Specials SmokeTestProd.Categories
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+PROFILE = os.environ.get('SMOKE_PROFILE', 'fast')
+HEADLESS = os.environ.get('SMOKE_HEADLESS', '1') != '0'
+CACHE_DIR = os.environ.get('SMOKE_CACHE_DIR', os.path.join('.smoke_cache', 'chrome'))
+WINDOW_SIZE = (1920, 1080)
+
+BLOCKED_URLS = [
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.svg', '*.ico', '*.bmp',
+    '*.mp4', '*.webm', '*.mp3', '*.m4a', '*.ogg',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*google-analytics.com*', '*googletagmanager.com*', '*googleadservices.com*', '*doubleclick.net*',
+    '*facebook.net*', '*facebook.com/tr*', '*bat.bing.com*', '*hotjar.com*', '*criteo.*', '*pinterest.com*',
+    '*quantserve.com*', '*scorecardresearch.com*', '*newrelic.com*', '*nr-data.net*', '*youtube.com*', '*vimeo.com*',
+]
+
+
+def blocked_urls(value=os.environ.get('SMOKE_BLOCK', '')):
+    if value.strip().lower() == 'none':
+        return []
+    return BLOCKED_URLS + [pattern.strip() for pattern in value.split(',') if pattern.strip()]
+
+
+class Profile:
+    def __init__(self, name, headless=HEADLESS, block=(), eager=False, cache_dir=None, images=True):
+        self.name = name
+        self.headless = headless
+        self.block = list(block)
+        self.eager = eager
+        self.cache_dir = cache_dir
+        self.images = images
+
+    def options(self):
+        from selenium import webdriver #Deferred until a browser is started, see startup.py
+        options = webdriver.ChromeOptions()
+        if self.headless:
+            options.add_argument('--headless')
+        options.add_argument('--window-size=%d,%d' % WINDOW_SIZE)
+        if self.cache_dir:
+            options.add_argument('--disk-cache-dir=%s' % os.path.abspath(self.cache_dir))
+        if not self.images:
+            options.add_argument('--blink-settings=imagesEnabled=false')
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        if self.eager:
+            options.set_capability('pageLoadStrategy', 'eager')
+        return options
+
+    #Per-session setup done over CDP once the browser is up. Blocking survives session resets (same tab), so it's set once.
+    def apply(self, driver, cdp):
+        if self.block:
+            cdp(driver, 'Network.enable')
+            cdp(driver, 'Network.setBlockedURLs', {'urls': self.block})
+
+    def __repr__(self):
+        return '<Profile %s>' % self.name
+
+
+PROFILES = {
+    'default': Profile('default'),
+    'fast': Profile('fast', block=blocked_urls(), eager=True, cache_dir=CACHE_DIR, images=False),
+}
+
+if PROFILE not in PROFILES:
+    raise ValueError('SMOKE_PROFILE must be one of %s, not %r' % (', '.join(sorted(PROFILES)), PROFILE))
+profile = PROFILES[PROFILE]
+
+
+#Page steps (navigations, clicks and submits that landed on a page) per test class, from a timing trace.
+def page_latency(trace_file):
+    classes = {}
+    with open(trace_file, encoding='utf-8') as f:
+        for line in f:
+            step = json.loads(line)
+            if step['kind'] not in ('navigate', 'click', 'submit') or not step['ok'] or not step['timing']:
+                continue
+            test_class = step['test'].rsplit('.', 2)[-2]
+            entry = classes.setdefault(test_class, [0, 0.0])
+            entry[0] += 1
+            entry[1] += step['seconds']
+    return classes
+
+
+#Runs the tests once per profile in a fresh interpreter and returns {profile: {class: [pages, seconds]}}.
+def compare(tests, profiles, env=None):
+    latencies = {}
+    for name in profiles:
+        handle, trace = tempfile.mkstemp(suffix='.jsonl', prefix='smoke_trace_%s_' % name)
+        os.close(handle)
+        try:
+            run_env = dict(env or os.environ, SMOKE_PROFILE=name, SMOKE_TRACE=trace, SMOKE_BUDGETS='off')
+            subprocess.call([sys.executable, '-m', 'unittest', '-q'] + list(tests), env=run_env)
+            latencies[name] = page_latency(trace)
+        finally:
+            os.remove(trace)
+    return latencies
+
+
+def comparison_table(latencies, baseline='default'):
+    names = list(latencies)
+    classes = sorted(set(test_class for per_class in latencies.values() for test_class in per_class))
+    lines = ['%-20s' % 'class' + ''.join('%16s' % ('%s s/page' % name) for name in names) + '%10s' % 'gain']
+    for test_class in classes:
+        averages = {}
+        for name in names:
+            pages, seconds = latencies[name].get(test_class, [0, 0.0])
+            averages[name] = seconds / pages if pages else None
+        line = '%-20s' % test_class + ''.join('%16s' % ('-' if averages[name] is None else '%.3f' % averages[name])
+                                              for name in names)
+        others = [averages[name] for name in names if name != baseline and averages[name]]
+        if averages.get(baseline) and others:
+            line += '%9.0f%%' % (100.0 * (1 - min(others) / averages[baseline]))
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare per page latency of the smoke tests under each browser profile.')
+    parser.add_argument('tests', nargs='*', default=['SmokeTestProd'], help='modules, classes or test methods to run')
+    parser.add_argument('--profiles', default='default,fast', help='comma separated profiles to compare')
+    parser.add_argument('--stub', action='store_true', help='run against a local stub site instead of production')
+    parser.add_argument('--latency', type=float, default=0.0, help='latency added by the stub site, in seconds')
+    args = parser.parse_args(argv)
+    env = dict(os.environ)
+    stub = None
+    if args.stub:
+        from stub_site import StubSite
+        stub = StubSite(latency=args.latency).start()
+        env.update(stub.env())
+    try:
+        print(comparison_table(compare(args.tests, args.profiles.split(','), env)))
+    finally:
+        if stub:
+            stub.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
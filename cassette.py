@@ -0,0 +1,287 @@
+'''
+Record/replay cassettes for the smoke suite. In record mode a local proxy per site (WSS, TRS, TRS test) sits between the suite and
+the real site and saves every response it passes on. In replay mode the same local servers answer from the recording alone, out
+of memory, so a run doesn't depend on the network or on how busy production is. That makes it possible to time and tune the
+harness itself (selectors, waits, the pool) against the exact same pages over and over.
+
+    python cassette.py record                          proxies to the sites in sites.py and records
+    python cassette.py replay                          serves the recording
+    python parallel_runner.py --cassette replay -w 4   run the suite against a recording
+
+The recording is a directory (SMOKE_CASSETTE, default .smoke_cassette):
+    index.json           site -> "METHOD /path?query" -> status, headers and the hash of the body
+    objects/ab/abcd...   response bodies, gzipped, stored under the sha256 of their content
+Bodies are content addressed, so a header, footer or script that many pages share is only stored once, and re-recording a page
+that didn't change adds nothing. A request seen twice keeps its latest response.
+
+Responses are stored as the site sent them. Links back to the site (absolute URLs, Location headers, cookie domains) are pointed
+at the local server when a response is served, so the browser never leaves the proxy. Requests to other hosts (CDNs, analytics)
+don't go through the proxy at all.
+'''
+import argparse
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import sites
+
+CASSETTE_DIR = os.environ.get('SMOKE_CASSETTE', '.smoke_cassette')
+TIMEOUT = 60
+
+#Response headers worth keeping. Everything else (dates, caching, tracing ids, lengths) is recomputed or irrelevant on replay.
+KEPT_HEADERS = ['content-type', 'location', 'set-cookie', 'vary', 'etag', 'last-modified']
+#Request headers that aren't passed on to the site.
+DROPPED_REQUEST_HEADERS = ['host', 'accept-encoding', 'connection', 'keep-alive', 'proxy-connection', 'upgrade-insecure-requests',
+                           'if-none-match', 'if-modified-since']
+
+
+class Store:
+    def __init__(self, path=CASSETTE_DIR):
+        self.path = path
+        self.index = {}
+        self.bodies = {}
+        self.lock = threading.Lock()
+        self.stats = {'recorded': 0, 'new_objects': 0, 'replayed': 0, 'misses': 0}
+
+    @property
+    def index_file(self):
+        return os.path.join(self.path, 'index.json')
+
+    def object_file(self, digest):
+        return os.path.join(self.path, 'objects', digest[:2], digest)
+
+    def load(self):
+        try:
+            with open(self.index_file, encoding='utf-8') as f:
+                self.index = json.load(f)
+        except FileNotFoundError:
+            self.index = {}
+        return self
+
+    #Reads every body the index refers to into memory, so replay never touches the disk.
+    def preload(self):
+        for responses in self.index.values():
+            for response in responses.values():
+                self.body(response['body'])
+        return self
+
+    def body(self, digest):
+        if digest not in self.bodies:
+            with gzip.open(self.object_file(digest), 'rb') as f:
+                self.bodies[digest] = f.read()
+        return self.bodies[digest]
+
+    def put_body(self, body):
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.object_file(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = '%s.%d.tmp' % (path, threading.get_ident())
+            with gzip.open(temporary, 'wb') as f:
+                f.write(body)
+            os.replace(temporary, path)
+            self.stats['new_objects'] += 1
+        self.bodies[digest] = body
+        return digest
+
+    def record(self, site, key, response):
+        with self.lock:
+            self.index.setdefault(site, {})[key] = response
+            self.stats['recorded'] += 1
+
+    def lookup(self, site, key):
+        response = self.index.get(site, {}).get(key)
+        with self.lock:
+            self.stats['replayed' if response else 'misses'] += 1
+        return response
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.index, indent=1, sort_keys=True)
+        with open(self.index_file + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(self.index_file + '.tmp', self.index_file)
+
+    def report(self):
+        objects = len(set(response['body'] for responses in self.index.values() for response in responses.values()))
+        responses = sum(len(responses) for responses in self.index.values())
+        return ('Cassette %s: %d responses, %d distinct bodies; this run recorded %d (%d new bodies), replayed %d, missed %d'
+                % (self.path, responses, objects, self.stats['recorded'], self.stats['new_objects'], self.stats['replayed'],
+                   self.stats['misses']))
+
+
+def request_key(method, path):
+    return '%s %s' % (method, path)
+
+
+#Points links to the real site at the local server: absolute and protocol relative URLs in bodies, Location headers and cookie
+#Domain attributes.
+class Rewriter:
+    def __init__(self, upstream, local):
+        parts = urlsplit(upstream)
+        self.local = local
+        self.pattern = re.compile(r'(https?:)?//' + re.escape(parts.netloc) + r'(?=[/"\'?#\s]|$)', re.IGNORECASE)
+        self.pattern_bytes = re.compile(self.pattern.pattern.encode('ascii'), re.IGNORECASE)
+        self.cookie_domain = re.compile(r';\s*domain=[^;]*', re.IGNORECASE)
+        self.secure = re.compile(r';\s*secure(?=;|$)', re.IGNORECASE)
+
+    def body(self, body, content_type):
+        if not re.search(r'text|html|json|javascript|xml', content_type or ''):
+            return body
+        return self.pattern_bytes.sub(self.local.encode('ascii'), body)
+
+    def header(self, name, value):
+        if name == 'location':
+            return self.pattern.sub(self.local, value)
+        if name == 'set-cookie':
+            return self.secure.sub('', self.cookie_domain.sub('', value))
+        return value
+
+
+class CassetteHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    site = 'wss'
+    mode = 'replay'
+    store = None
+    upstream = None
+    rewriter = None
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_HEAD(self):
+        self.handle_request('HEAD')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def handle_request(self, method):
+        key = request_key(method, self.path)
+        if self.mode == 'record':
+            try:
+                response = self.forward(method, key)
+            except (OSError, http.client.HTTPException) as exc:
+                self.send(502, [('content-type', 'text/plain')], ('Upstream error: %r\n' % exc).encode('utf-8'), method)
+                return
+        else:
+            response = self.store.lookup(self.site, key)
+            if response is None and method == 'HEAD':
+                response = self.store.lookup(self.site, request_key('GET', self.path))
+        if response is None:
+            self.send(404, [('content-type', 'text/plain')], ('Not in cassette: %s\n' % key).encode('utf-8'), method)
+            return
+        body = self.store.body(response['body'])
+        headers = response['headers']
+        content_type = ''.join(value for name, value in headers if name == 'content-type')
+        self.send(response['status'], [(name, self.rewriter.header(name, value)) for name, value in headers],
+                  self.rewriter.body(body, content_type), method)
+
+    #Passes the request on to the real site and records the response.
+    def forward(self, method, key):
+        parts = urlsplit(self.upstream)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(parts.netloc, timeout=TIMEOUT)
+        headers = {name: value for name, value in self.headers.items() if name.lower() not in DROPPED_REQUEST_HEADERS}
+        headers['Accept-Encoding'] = 'identity'
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            connection.request(method, self.path, self.rfile.read(length) if length else None, headers)
+            upstream = connection.getresponse()
+            body = upstream.read()
+        finally:
+            connection.close()
+        kept = [(name.lower(), value) for name, value in upstream.getheaders() if name.lower() in KEPT_HEADERS]
+        response = {'status': upstream.status, 'headers': kept, 'body': self.store.put_body(body)}
+        if method != 'HEAD':
+            self.store.record(self.site, key, response)
+        return response
+
+    def send(self, status, headers, body, method):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if method != 'HEAD':
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+#One local server per site, recording from or replaying to it. Same interface as stub_site.StubSite.
+class Cassette:
+    def __init__(self, mode='replay', path=CASSETTE_DIR, host='127.0.0.1', port_base=0):
+        if mode not in ('record', 'replay'):
+            raise ValueError('cassette mode must be record or replay, not %r' % mode)
+        self.mode = mode
+        self.store = Store(path).load()
+        self.host = host
+        self.port_base = port_base
+        self.servers = {}
+
+    def start(self):
+        if self.mode == 'replay':
+            if not self.store.index:
+                raise FileNotFoundError('No recording in %s, run with --cassette record first' % self.store.path)
+            self.store.preload()
+        upstreams = {'wss': sites.WSS, 'trs': sites.TRS, 'trs_test': sites.TRS_TEST}
+        for offset, name in enumerate(['wss', 'trs', 'trs_test']):
+            port = self.port_base + offset + 1 if self.port_base else 0
+            server = ThreadingHTTPServer((self.host, port), CassetteHandler)
+            local = 'http://%s:%d' % (self.host, server.server_address[1])
+            server.RequestHandlerClass = type('CassetteHandler_' + name, (CassetteHandler,), {
+                'site': name, 'mode': self.mode, 'store': self.store, 'upstream': upstreams[name],
+                'rewriter': Rewriter(upstreams[name], local)})
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers[name] = server
+        return self
+
+    def url(self, name):
+        return 'http://%s:%d' % (self.host, self.servers[name].server_address[1])
+
+    #Environment that points the smoke suite (sites.py) at the local servers.
+    def env(self):
+        return {sites.ENV_VARS[name]: self.url(name) for name in self.servers}
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+        self.servers = {}
+        if self.mode == 'record':
+            self.store.save()
+        print(self.store.report())
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record the sites under test through a local proxy, or replay a recording.')
+    parser.add_argument('mode', choices=['record', 'replay'])
+    parser.add_argument('--dir', default=CASSETTE_DIR, help='where the recording lives')
+    parser.add_argument('--port-base', type=int, default=8000, help='WSS gets port-base+1, TRS +2, TRS test +3')
+    args = parser.parse_args()
+    cassette = Cassette(args.mode, args.dir, port_base=args.port_base).start()
+    for name, value in cassette.env().items():
+        print('%s=%s' % (name, value))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        cassette.stop()
+        sys.exit(0)
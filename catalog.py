@@ -0,0 +1,168 @@
+'''
+Page catalog for the smoke suite. Which pages and search terms get checked lives in catalog.tsv instead of lists in each test
+method, so adding a category or a search term doesn't need a code change. Every entry is tagged with its site and page type
+(and optional extra tags), and the catalog keeps an index from tag to entries, so selecting a subset is a set intersection no
+matter how many entries the file has. The file is only read the first time something is selected.
+
+A run can be narrowed down with SMOKE_TAGS, e.g. SMOKE_TAGS=trs,category only generates/uses TRS category entries.
+SMOKE_CATALOG points at a different catalog file.
+
+File format (tab separated, one entry per line, # for comments):
+    site  type  target  [depth]  [markers]  [tags]
+See the header of catalog.tsv for details.
+'''
+import os
+import re
+from collections import namedtuple
+from urllib.parse import unquote_plus
+
+import sites
+
+CATALOG_FILE = os.environ.get('SMOKE_CATALOG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.tsv'))
+RUN_TAGS = [tag for tag in os.environ.get('SMOKE_TAGS', '').split(',') if tag]
+
+SITES = {'wss': sites.WSS, 'trs': sites.TRS, 'trs_test': sites.TRS_TEST}
+TYPES = ['search', 'category', 'specials', 'group_special', 'specialized', 'product', 'fsr']
+
+WSS_PLP = ["productBox1", 'class="filter-list box"']
+TRS_PLP = ["ag-details-block item", 'class="filters"']
+
+#Markers used when an entry doesn't list its own.
+DEFAULT_MARKERS = {
+    ('wss', 'search'): ['category-grid', "productBox1", 'class="filter-list__content"'],
+    ('wss', 'category'): WSS_PLP,
+    ('wss', 'specials'): WSS_PLP,
+    ('wss', 'group_special'): WSS_PLP,
+    ('wss', 'specialized'): WSS_PLP,
+    ('trs', 'search'): ['category-listing-block'] + TRS_PLP,
+    ('trs_test', 'search'): ['category-listing-block'] + TRS_PLP,
+    ('trs', 'category'): TRS_PLP,
+    ('trs', 'product'): ['class="large-visual"', 'class="price "'],
+}
+
+
+def slug(text, separator='-'):
+    return re.sub(r'[^a-z0-9]+', separator, text.lower()).strip(separator)
+
+
+class Entry(namedtuple('Entry', 'site type target depth markers tags params line')):
+    __slots__ = ()
+
+    @property
+    def base(self):
+        return SITES[self.site]
+
+    #Search and FSR entries are terms to type in; everything else is a path on the site.
+    @property
+    def is_term(self):
+        return not self.target.startswith('/')
+
+    #Where the entry's page lives. For WSS searches this is the results page the search box leads to.
+    @property
+    def url(self):
+        if not self.is_term:
+            return self.base + self.target
+        if self.type == 'search' and self.site == 'wss':
+            return self.base + '/search/' + slug(self.target) + '.html'
+        return None
+
+    #Identifier used for generated test names, e.g. wss_category_51211_desks_and_desk_bases.
+    @property
+    def name(self):
+        return '%s_%s_%s' % (self.site, self.type, slug(re.sub(r'\.(html|cfm)\b', '', self.target), '_'))[:120]
+
+
+def parse(line, number, path):
+    fields = line.split('\t') + [''] * 3
+    site, page_type, target, depth, markers, tags = [field.strip() for field in fields[:6]]
+    if site not in SITES:
+        raise ValueError('%s:%d: unknown site %r' % (path, number, site))
+    if page_type not in TYPES:
+        raise ValueError('%s:%d: unknown page type %r' % (path, number, page_type))
+    if not target:
+        raise ValueError('%s:%d: missing target' % (path, number))
+    if markers in ('', '-'):
+        markers = DEFAULT_MARKERS.get((site, page_type), [])
+    else:
+        markers = markers.split('|')
+    params = {}
+    plain_tags = []
+    for tag in tags.split():
+        if '=' in tag:
+            key, _, value = tag.partition('=')
+            params[key] = unquote_plus(value)
+        else:
+            plain_tags.append(tag)
+    return Entry(site, page_type, target, int(depth) if depth not in ('', '-') else 1, tuple(markers),
+                 tuple([site, page_type] + plain_tags), params, number)
+
+
+class Catalog:
+    def __init__(self, path=CATALOG_FILE, run_tags=RUN_TAGS):
+        self.path = path
+        self.run_tags = list(run_tags)
+        self.entries = None
+        self.index = None
+
+    def load(self):
+        if self.entries is not None:
+            return self
+        entries = []
+        index = {}
+        with open(self.path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                line = line.rstrip('\r\n')
+                if not line.strip() or line.lstrip().startswith('#'):
+                    continue
+                entry = parse(line, number, self.path)
+                for tag in entry.tags + tuple(entry.params):
+                    index.setdefault(tag, []).append(len(entries))
+                entries.append(entry)
+        self.entries = entries
+        self.index = {tag: frozenset(positions) for tag, positions in index.items()}
+        return self
+
+    #Entries carrying every given tag (site and page type count as tags, and so do parameter names like "within"), in file
+    #order. The run's SMOKE_TAGS are applied on top unless run_filter is False.
+    def select(self, *tags, site=None, page_type=None, run_filter=True):
+        self.load()
+        wanted = [tag for tag in (site, page_type) + tags if tag]
+        if run_filter:
+            wanted += self.run_tags
+        if not wanted:
+            return list(self.entries)
+        positions = None
+        for tag in wanted:
+            found = self.index.get(tag, frozenset())
+            positions = found if positions is None else positions & found
+        return [self.entries[n] for n in sorted(positions)]
+
+    def __len__(self):
+        return len(self.load().entries)
+
+
+catalog = Catalog()
+
+
+def select(*tags, **selection):
+    return catalog.select(*tags, **selection)
+
+
+#Class decorator that adds one test method per selected catalog entry. `check` names the method on the class that checks a
+#single entry; the generated methods are called test_<entry name>. `decorate`, if given, wraps each generated test
+#(decorate(entry, test) -> test), e.g. to skip some of them.
+def generate_tests(check, *tags, decorate=None, **selection):
+    def add_tests(cls):
+        for entry in catalog.select(*tags, **selection):
+            def test(self, entry=entry):
+                getattr(self, check)(entry)
+            name = 'test_' + entry.name
+            if hasattr(cls, name):
+                name += '_%d' % entry.line
+            test.__name__ = name
+            test.__doc__ = None
+            if decorate:
+                test = decorate(entry, test)
+            setattr(cls, name, test)
+        return cls
+    return add_tests
@@ -0,0 +1,566 @@
+'''
+Asyncio backend that drives Chrome over the DevTools protocol directly, for checks that need a real rendered page but not one
+blocking WebDriver call at a time. One headless Chrome and one websocket carry every tab; each tab is a CDP session, so a single
+Python process can keep 50+ pages loading at once. Load and network idle come from protocol events (Page.loadEventFired,
+Network.* request tracking) instead of polling readyState.
+
+A Page offers the same surface the smoke tests use on a WebDriver: get(), current_url, find() (named locators from locators.py
+or a by/value pair), click(), send_keys(), submit(), text, is_displayed(), execute_script(), page_source and assertion batches
+(assert_batch.py). Everything is a coroutine:
+
+    async with CdpBrowser.launch() as browser:
+        tabs = TabPool(browser, size=50)
+        crawl = await check_listing(tabs, WSS + '/specials.html', ['productBox1'], depth=6)
+
+Tabs get the browser profile's URL blocking (browser_profile.py) and the TRS store cookies (trs_session.py) before their first
+page. Only the standard library is used, including a minimal websocket client.
+
+Settings:
+    SMOKE_BACKEND=cdp      run CdpFastPath in SmokeTestProd (and skip the browser tests it covers)
+    SMOKE_CDP_TABS=N       tabs open at once (default 16)
+    SMOKE_CHROME=path      Chrome/Chromium binary (default: found as in startup.py)
+'''
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import shutil
+import struct
+import tempfile
+import time
+import unittest
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+import startup
+import trs_session
+from assert_batch import AssertionBatch
+from browser_profile import WINDOW_SIZE, profile
+from http_checks import Check, CheckResult
+from locators import LOCATE_FUNCTION, get as get_locator
+from pagination import PAGE_COUNT_SCRIPT, Crawl, depth_for, page_url
+
+ENABLED = os.environ.get('SMOKE_BACKEND') == 'cdp'
+TABS = int(os.environ.get('SMOKE_CDP_TABS', '16'))
+TIMEOUT = float(os.environ.get('SMOKE_WAIT_TIMEOUT', '20'))
+#What get() waits for by default: the eager profiles only need the DOM, like WebDriver's eager page load strategy
+LOAD = 'domcontentloaded' if profile.eager else 'load'
+IDLE_SECONDS = 0.5 #No requests in flight for this long counts as network idle
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+#Marks a browser test that CdpFastPath covers, so it is skipped when the CDP backend is on.
+def cdp_fast_path(test):
+    return unittest.skipIf(ENABLED, 'checked in a CDP tab by CdpFastPath (SMOKE_BACKEND=cdp)')(test)
+
+
+class CdpError(Exception):
+    pass
+
+
+class ElementNotFound(CdpError):
+    pass
+
+
+#XORs data with the 4 byte mask as one big integer, much faster than byte by byte in Python.
+def masked(data, mask):
+    if not data:
+        return data
+    repeated = (mask * (len(data) // 4 + 1))[:len(data)]
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(repeated, 'big')).to_bytes(len(data), 'big')
+
+
+#Just enough of RFC 6455 for the DevTools socket: text frames out (masked), text frames in, ping/pong and close.
+class WebSocket:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, url):
+        parts = urlsplit(url)
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80, limit=2 ** 24)
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        writer.write(('GET %s HTTP/1.1\r\nHost: %s\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                      'Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n\r\n' % (parts.path, parts.netloc, key)).encode('ascii'))
+        await writer.drain()
+        status = await reader.readline()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+        if b' 101 ' not in status or headers.get('sec-websocket-accept') != accept:
+            writer.close()
+            raise CdpError('WebSocket handshake with %s failed: %r' % (url, status))
+        return cls(reader, writer)
+
+    #Builds the whole frame first and writes it in one call, so messages from concurrent tasks can't interleave.
+    async def send(self, text, opcode=0x1):
+        data = text.encode('utf-8') if isinstance(text, str) else text
+        length = len(data)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, 0x80 | length)
+        elif length < 2 ** 16:
+            header = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+        mask = os.urandom(4)
+        self.writer.write(header + mask + masked(data, mask))
+        await self.writer.drain()
+
+    async def recv(self):
+        message = []
+        while True:
+            first, second = await self.reader.readexactly(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', await self.reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', await self.reader.readexactly(8))[0]
+            mask = await self.reader.readexactly(4) if second & 0x80 else None
+            payload = await self.reader.readexactly(length)
+            if mask:
+                payload = masked(payload, mask)
+            if opcode == 0x8:
+                raise ConnectionError('DevTools socket closed')
+            if opcode == 0x9:
+                await self.send(payload, opcode=0xA)
+                continue
+            if opcode == 0xA:
+                continue
+            message.append(payload)
+            if first & 0x80:
+                return b''.join(message).decode('utf-8')
+
+    async def close(self):
+        try:
+            await self.send(b'', opcode=0x8)
+        except (ConnectionError, RuntimeError):
+            pass
+        self.writer.close()
+
+
+#Request/response matching and event dispatch over one DevTools socket. Tab sessions are multiplexed on it (flatten mode).
+class CdpConnection:
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.next_id = 0
+        self.pending = {}
+        self.listeners = {} #(session id, method) -> [callback(params)]
+        self.reader = asyncio.ensure_future(self.read_loop())
+
+    async def send(self, method, params=None, session=None):
+        self.next_id += 1
+        message = {'id': self.next_id, 'method': method, 'params': params or {}}
+        if session:
+            message['sessionId'] = session
+        future = self.pending[self.next_id] = asyncio.get_running_loop().create_future()
+        await self.websocket.send(json.dumps(message))
+        return await future
+
+    def on(self, method, callback, session=None):
+        self.listeners.setdefault((session, method), []).append(callback)
+
+    def forget(self, session):
+        self.listeners = {key: value for key, value in self.listeners.items() if key[0] != session}
+
+    async def read_loop(self):
+        try:
+            while True:
+                message = json.loads(await self.websocket.recv())
+                if 'id' in message:
+                    future = self.pending.pop(message['id'], None)
+                    if future is None or future.done():
+                        continue
+                    if 'error' in message:
+                        future.set_exception(CdpError('%s: %s' % (message['error'].get('message'), message['error'].get('data', ''))))
+                    else:
+                        future.set_result(message.get('result', {}))
+                else:
+                    for callback in self.listeners.get((message.get('sessionId'), message['method']), []):
+                        callback(message.get('params', {}))
+        except (ConnectionError, asyncio.IncompleteReadError) as exc:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(CdpError('DevTools connection lost: %r' % exc))
+            self.pending = {}
+
+    async def close(self):
+        self.reader.cancel()
+        await self.websocket.close()
+
+
+class Element:
+    def __init__(self, page, object_id, description):
+        self.page = page
+        self.object_id = object_id
+        self.description = description
+
+    #Calls `function(...)` with the element as `this`. Arguments and the return value are plain JSON.
+    async def call(self, function, *args):
+        result = await self.page.send('Runtime.callFunctionOn', {
+            'objectId': self.object_id, 'functionDeclaration': function, 'arguments': [{'value': arg} for arg in args],
+            'returnByValue': True, 'awaitPromise': True})
+        if 'exceptionDetails' in result:
+            raise CdpError('%s on %s' % (result['exceptionDetails'].get('text'), self.description))
+        return result['result'].get('value')
+
+    #Selecting an <option> with a mouse click doesn't work headless, so options are selected the way the user's pick would.
+    async def click(self):
+        await self.call('''function() {
+            this.scrollIntoView({block: 'center'});
+            if (this.tagName === 'OPTION') {
+                this.selected = true;
+                this.parentNode.closest('select').dispatchEvent(new Event('change', {bubbles: true}));
+            } else {
+                this.click();
+            }
+        }''')
+
+    async def clear(self):
+        await self.call("function() { this.value = ''; this.dispatchEvent(new Event('input', {bubbles: true})); }")
+
+    #Types character by character with real key events, so keyup handlers (autosuggest) see every keystroke.
+    async def send_keys(self, text):
+        await self.call('function() { this.focus(); }')
+        for char in text:
+            await self.page.send('Input.dispatchKeyEvent', {'type': 'keyDown', 'key': char, 'text': char})
+            await self.page.send('Input.dispatchKeyEvent', {'type': 'keyUp', 'key': char})
+
+    async def submit(self):
+        await self.call('''function() {
+            var form = this.form || this.closest('form');
+            if (form.requestSubmit) form.requestSubmit(); else form.submit();
+        }''')
+
+    async def text(self):
+        return await self.call('function() { return this.innerText; }')
+
+    async def is_displayed(self):
+        return await self.call('''function() {
+            var style = window.getComputedStyle(this);
+            return !!this.getClientRects().length && style.visibility !== 'hidden' && style.display !== 'none';
+        }''')
+
+    def __repr__(self):
+        return '<Element %s>' % self.description
+
+
+class Page:
+    def __init__(self, browser, target_id, session_id, context_id=None):
+        self.browser = browser
+        self.connection = browser.connection
+        self.target_id = target_id
+        self.session_id = session_id
+        self.context_id = context_id
+        self.frame_id = None
+        self.current_url = 'about:blank'
+        self.status = None
+        self.loaded = asyncio.Event()
+        self.dom_loaded = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.inflight = set()
+        self.last_activity = time.monotonic()
+        self.listen('Page.frameNavigated', self.frame_navigated)
+        self.listen('Page.loadEventFired', lambda params: self.loaded.set())
+        self.listen('Page.domContentEventFired', lambda params: self.dom_loaded.set())
+        self.listen('Page.javascriptDialogOpening', self.dismiss_dialog)
+        self.listen('Network.requestWillBeSent', self.request_started)
+        self.listen('Network.loadingFinished', self.request_done)
+        self.listen('Network.loadingFailed', self.request_done)
+        self.listen('Network.responseReceived', self.response_received)
+
+    def listen(self, method, callback):
+        self.connection.on(method, callback, self.session_id)
+
+    async def send(self, method, params=None):
+        return await self.connection.send(method, params, self.session_id)
+
+    async def setup(self):
+        self.frame_id = (await self.send('Page.getFrameTree'))['frameTree']['frame']['id']
+        await self.send('Page.enable')
+        await self.send('Network.enable')
+        await self.send('Emulation.setDeviceMetricsOverride', {'width': WINDOW_SIZE[0], 'height': WINDOW_SIZE[1],
+                                                               'deviceScaleFactor': 1, 'mobile': False})
+        if profile.block:
+            await self.send('Network.setBlockedURLs', {'urls': profile.block})
+        for site in trs_session.TRS_SITES:
+            cookies = await asyncio.get_running_loop().run_in_executor(None, trs_session.store_cookies, site)
+            await self.send('Network.setCookies', {'cookies': [dict(cookie, url=site + '/') for cookie in cookies]})
+        return self
+
+    def frame_navigated(self, params):
+        if not params['frame'].get('parentId'):
+            self.current_url = params['frame']['url']
+
+    def dismiss_dialog(self, params):
+        asyncio.ensure_future(self.send('Page.handleJavaScriptDialog', {'accept': True}))
+
+    def request_started(self, params):
+        self.inflight.add(params['requestId'])
+        self.last_activity = time.monotonic()
+        self.idle.clear()
+
+    def request_done(self, params):
+        self.inflight.discard(params['requestId'])
+        self.last_activity = time.monotonic()
+        if not self.inflight:
+            self.idle.set()
+
+    def response_received(self, params):
+        if params.get('type') == 'Document' and params.get('frameId') == self.frame_id:
+            self.status = params['response']['status']
+
+    #Navigates and waits for `until`: 'load', 'domcontentloaded' (the default is LOAD), or 'networkidle' (load, then no requests
+    #in flight for IDLE_SECONDS).
+    async def get(self, url, until=LOAD, timeout=TIMEOUT):
+        self.expect_navigation()
+        result = await self.send('Page.navigate', {'url': url})
+        if result.get('errorText'):
+            raise CdpError('Navigating to %s failed: %s' % (url, result['errorText']))
+        if result.get('loaderId'):
+            await self.wait_for_load(until, timeout)
+        return self
+
+    #Call before an action that navigates (a click, a submit), then wait_for_load() after it.
+    def expect_navigation(self):
+        self.loaded.clear()
+        self.dom_loaded.clear()
+        self.status = None
+
+    async def wait_for_load(self, until=LOAD, timeout=TIMEOUT):
+        event = self.dom_loaded if until == 'domcontentloaded' else self.loaded
+        await asyncio.wait_for(event.wait(), timeout)
+        if until == 'networkidle':
+            await asyncio.wait_for(self.network_idle(), timeout)
+
+    async def network_idle(self):
+        while True:
+            await self.idle.wait()
+            quiet = time.monotonic() - self.last_activity
+            if quiet >= IDLE_SECONDS:
+                return
+            await asyncio.sleep(IDLE_SECONDS - quiet)
+
+    #Runs a function body, like WebDriver's execute_script: `arguments` are the JSON-able args, `return` gives the result.
+    async def execute_script(self, script, *args):
+        result = await self.send('Runtime.evaluate', {
+            'expression': '(function() {%s\n}).apply(null, %s)' % (script, json.dumps(args)),
+            'returnByValue': True, 'awaitPromise': True})
+        if 'exceptionDetails' in result:
+            details = result['exceptionDetails']
+            raise CdpError('Script failed: %s' % details.get('exception', {}).get('description', details.get('text')))
+        return result['result'].get('value')
+
+    #find('sort_option', 'price_desc') looks up a named locator; find(css='...') or find(xpath='...') takes one strategy directly.
+    async def find(self, name=None, *args, **strategy):
+        if name:
+            locator = get_locator(name, *args)
+            strategies, description = locator.strategies, locator.name
+        else:
+            strategies, description = list(strategy.items()), ', '.join('%s=%r' % item for item in strategy.items())
+        result = await self.send('Runtime.evaluate', {'expression': LOCATE_FUNCTION + '''
+            (function(strategies) {
+                for (var i = 0; i < strategies.length; i++) {
+                    var found = locate(strategies[i][0], strategies[i][1]);
+                    if (found) return found;
+                }
+                return null;
+            })(%s)''' % json.dumps([list(item) for item in strategies])})
+        remote = result.get('result', {})
+        if 'exceptionDetails' in result or remote.get('subtype') == 'null' or not remote.get('objectId'):
+            raise ElementNotFound('%s matched nothing on %s' % (description, self.current_url))
+        return Element(self, remote['objectId'], description)
+
+    async def page_source(self):
+        return await self.execute_script('return document.documentElement.outerHTML')
+
+    async def close(self):
+        self.connection.forget(self.session_id)
+        await self.browser.connection.send('Target.closeTarget', {'targetId': self.target_id})
+        if self.context_id:
+            await self.browser.connection.send('Target.disposeBrowserContext', {'browserContextId': self.context_id})
+
+
+#host:port of the DevTools endpoint of a WebDriver session's browser, or None if the driver doesn't expose one.
+def debugger_address(driver):
+    return (driver.capabilities.get('goog:chromeOptions') or {}).get('debuggerAddress')
+
+
+def chrome_binary():
+    path = startup.chrome_binary()
+    if path:
+        return path
+    raise CdpError('No Chrome found, set SMOKE_CHROME to the browser binary')
+
+
+class CdpBrowser:
+    def __init__(self, process, connection, user_data_dir):
+        self.process = process
+        self.connection = connection
+        self.user_data_dir = user_data_dir
+        self.stderr = None
+
+    #Starts headless Chrome with remote debugging on a free port and connects to it.
+    @classmethod
+    async def launch(cls, binary=None, timeout=30):
+        user_data_dir = tempfile.mkdtemp(prefix='smoke-cdp-')
+        args = [binary or chrome_binary(), '--headless', '--remote-debugging-port=0', '--user-data-dir=' + user_data_dir,
+                '--no-first-run', '--no-default-browser-check', '--window-size=%d,%d' % WINDOW_SIZE]
+        if profile.cache_dir:
+            args.append('--disk-cache-dir=' + os.path.abspath(profile.cache_dir))
+        if not profile.images:
+            args.append('--blink-settings=imagesEnabled=false')
+        process = await asyncio.create_subprocess_exec(*args + ['about:blank'], stdout=asyncio.subprocess.DEVNULL,
+                                                       stderr=asyncio.subprocess.PIPE)
+        deadline = time.monotonic() + timeout
+        while True:
+            line = await asyncio.wait_for(process.stderr.readline(), max(deadline - time.monotonic(), 0.1))
+            if not line:
+                raise CdpError('Chrome exited before DevTools came up')
+            match = re.search(rb'DevTools listening on (ws://\S+)', line)
+            if match:
+                break
+        browser = cls(process, CdpConnection(await WebSocket.connect(match.group(1).decode('ascii'))), user_data_dir)
+        browser.stderr = asyncio.ensure_future(browser.drain_stderr()) #A full pipe would block Chrome
+        return browser
+
+    #Attaches to a Chrome that is already running with remote debugging, e.g. the one chromedriver started (see
+    #debugger_address). close() then only disconnects; the browser keeps running.
+    @classmethod
+    async def connect(cls, address):
+        def version():
+            with urlopen('http://%s/json/version' % address, timeout=10) as response:
+                return json.load(response)
+        url = (await asyncio.get_running_loop().run_in_executor(None, version))['webSocketDebuggerUrl']
+        return cls(None, CdpConnection(await WebSocket.connect(url)), None)
+
+    async def drain_stderr(self):
+        while await self.process.stderr.readline():
+            pass
+
+    #A new tab. Isolated tabs get their own browser context (cookies, storage and cache separate from other tabs).
+    async def new_page(self, isolated=True):
+        context_id = None
+        params = {'url': 'about:blank'}
+        if isolated:
+            context_id = (await self.connection.send('Target.createBrowserContext'))['browserContextId']
+            params['browserContextId'] = context_id
+        target_id = (await self.connection.send('Target.createTarget', params))['targetId']
+        session_id = (await self.connection.send('Target.attachToTarget', {'targetId': target_id, 'flatten': True}))['sessionId']
+        return await Page(self, target_id, session_id, context_id).setup()
+
+    async def close(self):
+        if self.process is None:
+            await self.connection.close()
+            return
+        try:
+            await asyncio.wait_for(self.connection.send('Browser.close'), 5)
+        except (CdpError, asyncio.TimeoutError):
+            pass
+        await self.connection.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), 10)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+        if self.stderr:
+            self.stderr.cancel()
+        shutil.rmtree(self.user_data_dir, ignore_errors=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+#A fixed number of open tabs handed out to concurrent tasks, so pages are checked `size` at a time without opening and closing
+#a tab for each one.
+class TabPool:
+    def __init__(self, browser, size=TABS, isolated=True):
+        self.browser = browser
+        self.size = size
+        self.isolated = isolated
+        self.idle = asyncio.Queue()
+        self.opened = 0
+
+    async def acquire(self):
+        if self.idle.empty() and self.opened < self.size:
+            self.opened += 1
+            try:
+                return await self.browser.new_page(self.isolated)
+            except Exception:
+                self.opened -= 1
+                raise
+        return await self.idle.get()
+
+    def release(self, page):
+        self.idle.put_nowait(page)
+
+    async def close(self):
+        while not self.idle.empty():
+            await self.idle.get_nowait().close()
+
+
+#Loads a page in a pooled tab and checks its markers in one batch. Returns a CheckResult like the HTTP fast path, plus the page
+#count when `count_pages` is set.
+async def check_page(tabs, check, count_pages=False):
+    page = await tabs.acquire()
+    start = time.perf_counter()
+    try:
+        await page.get(check.url)
+        batch = AssertionBatch(page)
+        for marker in check.markers:
+            batch.marker(marker)
+        result = await batch.run_async()
+        problems = ([] if page.status in (None, 200) else ['HTTP %d' % page.status]) + [outcome.message() for outcome in result.failures]
+        pages = await page.execute_script(PAGE_COUNT_SCRIPT) if count_pages else None
+        return CheckResult(check, page.status, time.perf_counter() - start, problems), pages
+    except (CdpError, asyncio.TimeoutError) as exc:
+        return CheckResult(check, page.status, time.perf_counter() - start, ['%s: %s' % (type(exc).__name__, exc)]), None
+    finally:
+        tabs.release(page)
+
+
+#Page 1 of a listing, then pages 2..depth in parallel tabs, checked for the same markers. Returns a pagination.Crawl.
+async def check_listing(tabs, url, markers, depth, on_result=None):
+    listing = Crawl(url, depth_for(depth))
+    start = time.perf_counter()
+
+    def report(page, result):
+        result.elapsed = time.perf_counter() - start #Crawl.elapsed counts from the start of the listing
+        listing.results[page] = result
+        if on_result:
+            on_result(page, result)
+
+    result, listing.page_count = await check_page(tabs, Check(url, markers), count_pages=listing.depth > 1)
+    report(1, result)
+    if listing.depth > 1 and listing.page_count:
+        async def other_page(number):
+            return number, (await check_page(tabs, Check(page_url(url, number), markers)))[0]
+        for next_page in asyncio.as_completed([other_page(number) for number in range(2, min(listing.depth, listing.page_count) + 1)]):
+            report(*await next_page)
+    return listing
+
+
+#Synchronous helper: launches Chrome, checks every (url, markers, depth) listing with `tabs` tabs open at once and returns the
+#Crawls in the same order.
+def check_listings(listings, tabs=TABS):
+    async def run():
+        async with await CdpBrowser.launch() as browser:
+            pool = TabPool(browser, tabs)
+            try:
+                return await asyncio.gather(*[check_listing(pool, url, markers, depth) for url, markers, depth in listings])
+            finally:
+                await pool.close()
+    return asyncio.run(run())
@@ -0,0 +1,232 @@
+'''
+Pool of warm Chrome sessions shared by the smoke tests. Starting Chrome is the slowest part of a smoke run, so instead of a new
+browser per test method the pool keeps sessions alive for the whole run and hands them out per test. Between tests a session is
+reset (cookies, local/session storage, TRS store selection, extra windows, implicit waits) so every test still starts clean.
+Sessions that crash or stop answering are evicted and replaced on the next checkout, and so are sessions retired for using too
+much memory (resource_monitor.py) once their test releases them. Session hooks (add_session_hook) run on every
+new and every freshly reset session, e.g. to put the TRS store cookies back (trs_session.py).
+
+Sessions are started with the browser profile from browser_profile.py (SMOKE_PROFILE, SMOKE_HEADLESS) and the Chrome/chromedriver
+pair resolved and cached by startup.py.
+
+Settings come from the environment:
+    SMOKE_POOL_SIZE=N        max sessions alive at once in this process (default 1)
+    SMOKE_MAX_USES=N         recycle a session after N tests (default 50)
+    SMOKE_HEALTH_TIMEOUT=S   seconds before a session that doesn't answer is considered wedged (default 10)
+'''
+import atexit
+import os
+import threading
+import time
+
+import sites
+import startup
+from browser_profile import profile
+
+POOL_SIZE = int(os.environ.get('SMOKE_POOL_SIZE', '1'))
+MAX_USES = int(os.environ.get('SMOKE_MAX_USES', '50'))
+HEALTH_TIMEOUT = float(os.environ.get('SMOKE_HEALTH_TIMEOUT', '10'))
+
+#Every origin the suite touches. Storage is cleared for each of these between tests. TRS keeps the selected store in a cookie,
+#so clearing cookies also clears the store selection.
+RESET_ORIGINS = sites.ALL
+
+STORAGE_TYPES = 'local_storage,session_storage,indexeddb,websql,service_workers,cache_storage'
+
+
+def new_driver():
+    import selenium #Only runs that start a browser import it
+    from selenium import webdriver
+    chrome, chromedriver = startup.resolve()
+    options = profile.options()
+    if chrome:
+        options.binary_location = chrome
+    if chromedriver and int(selenium.__version__.split('.')[0]) >= 4:
+        from selenium.webdriver.chrome.service import Service
+        driver = webdriver.Chrome(service=Service(chromedriver), options=options)
+    elif chromedriver:
+        driver = webdriver.Chrome(executable_path=chromedriver, options=options) #Selenium 3 has no service argument
+    else:
+        driver = webdriver.Chrome(options=options)
+    profile.apply(driver, cdp)
+    return driver
+
+
+#Runs a Chrome DevTools command. Selenium 4 has execute_cdp_cmd, on Selenium 3 we register chromedriver's endpoint ourselves.
+def cdp(driver, cmd, params=None):
+    if hasattr(driver, 'execute_cdp_cmd'):
+        return driver.execute_cdp_cmd(cmd, params or {})
+    driver.command_executor._commands['executeCdpCommand'] = ('POST', '/session/$sessionId/goog/cdp/execute')
+    return driver.execute('executeCdpCommand', {'cmd': cmd, 'params': params or {}})['value']
+
+
+#Puts a session back into the state of a freshly started browser.
+def reset_session(driver):
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+    driver.implicitly_wait(0)
+    driver.get('about:blank')
+    cdp(driver, 'Network.clearBrowserCookies')
+    for origin in RESET_ORIGINS:
+        cdp(driver, 'Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': STORAGE_TYPES})
+
+
+#Runs fn(driver) on a helper thread so a wedged chromedriver can't hang the run. Returns False on error or timeout.
+def call_with_timeout(fn, driver, timeout=HEALTH_TIMEOUT):
+    outcome = []
+
+    def target():
+        try:
+            fn(driver)
+            outcome.append(True)
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return bool(outcome)
+
+
+def is_alive(driver):
+    return call_with_timeout(lambda d: d.execute_script('return 1'), driver)
+
+
+class DriverPool:
+    def __init__(self, factory=new_driver, size=POOL_SIZE, max_uses=MAX_USES):
+        self.factory = factory
+        self.session_hooks = [] #hook(driver, cdp), run on new and reset sessions
+        self.size = size
+        self.max_uses = max_uses
+        self.lock = threading.Condition()
+        self.idle = []
+        self.sessions = {} #id(driver) -> [driver, number of tests it has run]
+        self.started = 0
+        self.startup_seconds = 0.0
+        self.reuses = 0
+        self.evictions = 0
+        self.retired = set() #ids of sessions to quit instead of reset when they are released
+        self.retirements = 0
+
+    def add_session_hook(self, hook):
+        self.session_hooks.append(hook)
+
+    def prepare(self, driver):
+        for hook in self.session_hooks:
+            hook(driver, cdp)
+
+    def reset(self, driver):
+        reset_session(driver)
+        self.prepare(driver)
+
+    #Hands out a healthy session, starting a new one only when no warm session is available.
+    def acquire(self):
+        while True:
+            with self.lock:
+                while not self.idle and len(self.sessions) >= self.size:
+                    self.lock.wait()
+                if not self.idle:
+                    return self._start()
+                driver = self.idle.pop()
+            if is_alive(driver):
+                with self.lock:
+                    self.reuses += 1
+                return driver
+            self.evict(driver)
+
+    #Marks a session in use to be replaced when it is released. Returns False if it was already marked.
+    def retire(self, driver):
+        with self.lock:
+            if id(driver) not in self.sessions or id(driver) in self.retired:
+                return False
+            self.retired.add(id(driver))
+            self.retirements += 1
+            return True
+
+    #Takes a session back. It is reset right away so the next acquire() doesn't pay for it.
+    def release(self, driver):
+        with self.lock:
+            entry = self.sessions.get(id(driver))
+            if entry is None:
+                return
+            entry[1] += 1
+            worn_out = entry[1] >= self.max_uses or id(driver) in self.retired
+        if worn_out or not call_with_timeout(self.reset, driver):
+            self.evict(driver)
+            return
+        with self.lock:
+            self.idle.append(driver)
+            self.lock.notify()
+
+    #Drops a session that crashed, got wedged or ran too many tests. Quitting happens in the background in case it hangs.
+    def evict(self, driver):
+        with self.lock:
+            self.retired.discard(id(driver))
+            if self.sessions.pop(id(driver), None) is None:
+                return
+            if driver in self.idle:
+                self.idle.remove(driver)
+            self.evictions += 1
+            self.lock.notify()
+        threading.Thread(target=self._quit, args=(driver,), daemon=True).start()
+
+    def close(self, quiet=False):
+        with self.lock:
+            drivers = [entry[0] for entry in self.sessions.values()]
+            self.sessions.clear()
+            self.idle = []
+        for driver in drivers:
+            self._quit(driver)
+        if self.started and not quiet:
+            print(self.report())
+
+    #Startup time saved is estimated as the average cold start times the number of checkouts that reused a warm session.
+    def saved_seconds(self):
+        if not self.started:
+            return 0.0
+        return self.reuses * self.startup_seconds / self.started
+
+    def report(self):
+        average = self.startup_seconds / self.started if self.started else 0.0
+        return ("Driver pool: %d sessions started (avg %.2fs), %d reused, %d evicted (%d for memory), ~%.1fs of browser startup saved"
+                % (self.started, average, self.reuses, self.evictions, self.retirements, self.saved_seconds()))
+
+    #Called with the lock held. The slot is reserved first so other threads don't overshoot the pool size during startup.
+    def _start(self):
+        placeholder = object()
+        self.sessions[id(placeholder)] = [placeholder, 0]
+        self.lock.release()
+        try:
+            start = time.perf_counter()
+            driver = self.factory()
+            elapsed = time.perf_counter() - start
+            try:
+                self.prepare(driver)
+            except Exception:
+                self._quit(driver)
+                raise
+        except Exception:
+            self.lock.acquire()
+            del self.sessions[id(placeholder)]
+            self.lock.notify()
+            raise
+        self.lock.acquire()
+        del self.sessions[id(placeholder)]
+        self.sessions[id(driver)] = [driver, 0]
+        self.started += 1
+        self.startup_seconds += elapsed
+        startup.mark('first_browser')
+        return driver
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+pool = DriverPool()
+atexit.register(pool.close)
@@ -0,0 +1,317 @@
+'''
+Incremental re-checks. A Catalog build usually touches a few templates, yet every run used to load every category, group
+special, specialized page and TRS product page in the browser again. With SMOKE_INCREMENTAL=1 each of those pages is first probed
+over HTTP and only gets the full browser check when it may have changed:
+
+    . the cache (.smoke_cache/fingerprints.json, SMOKE_FINGERPRINTS) keeps, per URL, a structural fingerprint of the page's
+      relevant regions (product grid, filter list, pagination, sort options, TRS product details), which markers were on it, the
+      last check's result and the HTTP validators the server sent (ETag, Last-Modified)
+    . the probe is a conditional GET. A 304 means unchanged; a 200 is fingerprinted and compared. The fingerprint hashes tags,
+      ids, classes and the shape of links in those regions, not their text, so prices and review counts don't count as changes
+    . pages that are new, changed, failed last time or weren't checked for SMOKE_FINGERPRINT_MAX_AGE days (default 7) are
+      checked in full. Of the unchanged ones a sample is still checked (SMOKE_RECHECK_SAMPLE, default 0.1, the ones checked
+      longest ago first), the rest are skipped
+    . the cache keeps at most SMOKE_FINGERPRINT_MAX entries (default 5000); the least recently used are evicted
+
+Only the server's HTML of the first page is fingerprinted; pagination beyond it is re-checked with the page it belongs to.
+
+Decisions and results are kept in memory and saved once when the run ends. In a parallel run (parallel_runner.py) each worker
+only probes the pages of its own shard, and saves its part at the end of the shard, merging it into the file under a lock.
+'''
+import asyncio
+import atexit
+import contextlib
+import functools
+import hashlib
+import json
+import math
+import os
+import re
+import time
+import unittest
+from html.parser import HTMLParser
+
+import trs_session
+from http_client import CONCURRENCY, AsyncHttpClient
+
+ENABLED = os.environ.get('SMOKE_INCREMENTAL') == '1'
+CACHE_FILE = os.environ.get('SMOKE_FINGERPRINTS', os.path.join('.smoke_cache', 'fingerprints.json'))
+MAX_ENTRIES = int(os.environ.get('SMOKE_FINGERPRINT_MAX', '5000'))
+MAX_AGE = float(os.environ.get('SMOKE_FINGERPRINT_MAX_AGE', '7')) * 86400
+SAMPLE = float(os.environ.get('SMOKE_RECHECK_SAMPLE', '0.1'))
+
+#Region -> ids (#) and classes (.) its root element can have. Everything inside a root counts towards the region.
+REGIONS = {
+    'product_grid': ['#product_listing', '.results', '.ag-details-block'],
+    'filters': ['.filter-list', '.filters'],
+    'pagination': ['.pagination'],
+    'sort_options': ['#sort_options'],
+    'product': ['.large-visual', '.price'],
+}
+
+LOCK_STALE_SECONDS = 60 #A lock file older than this was left behind by a process that died holding it
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+
+
+def region_of(attrs):
+    classes = (attrs.get('class') or '').split()
+    for region, roots in REGIONS.items():
+        for root in roots:
+            if (root[0] == '#' and attrs.get('id') == root[1:]) or (root[0] == '.' and root[1:] in classes):
+                return region
+    return None
+
+
+#Tag, id, classes and the shape of link targets (numbers left out) of every element, by region. Elements outside the regions
+#go to 'page', which only counts when the page has none of the regions.
+class StructureParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.open = [] #(tag, region) of the elements we're inside
+        self.regions = {}
+
+    def handle_starttag(self, tag, attrs):
+        self.add(tag, dict(attrs))
+        if tag not in VOID_TAGS:
+            self.open.append((tag, self.region(dict(attrs))))
+
+    def handle_startendtag(self, tag, attrs):
+        self.add(tag, dict(attrs))
+
+    def handle_endtag(self, tag):
+        for n in range(len(self.open) - 1, -1, -1):
+            if self.open[n][0] == tag:
+                del self.open[n:]
+                return
+
+    def region(self, attrs):
+        if self.open and self.open[-1][1] != 'page':
+            return self.open[-1][1]
+        return region_of(attrs) or 'page'
+
+    #Depth is counted within the region, so markup added around it doesn't change it.
+    def add(self, tag, attrs):
+        region = self.region(attrs)
+        depth = sum(1 for name, inside in self.open if inside == region)
+        target = (attrs.get('href') or attrs.get('value')) if tag in ('a', 'option') else None
+        self.regions.setdefault(region, []).append('%d %s#%s.%s %s' % (
+            depth, tag, attrs.get('id') or '', '.'.join(sorted((attrs.get('class') or '').split())),
+            re.sub(r'\d+', '0', target) if target else ''))
+
+
+#Region -> short hash, plus which of `markers` are on the page.
+def fingerprint(html, markers=()):
+    parser = StructureParser()
+    parser.feed(html)
+    regions = {name: tokens for name, tokens in parser.regions.items() if name != 'page'} or parser.regions
+    hashes = {name: hashlib.sha1('\n'.join(tokens).encode('utf-8')).hexdigest()[:16] for name, tokens in regions.items()}
+    hashes['markers'] = hashlib.sha1('\n'.join(marker for marker in markers if marker in html).encode('utf-8')).hexdigest()[:16]
+    return hashes
+
+
+#Cross-process lock: parallel workers merge into the same cache file. A lock file (O_EXCL) works on every platform.
+@contextlib.contextmanager
+def file_lock(path):
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > LOCK_STALE_SECONDS:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(path)
+
+
+class FingerprintCache:
+    def __init__(self, path=CACHE_FILE, max_entries=MAX_ENTRIES, max_age=MAX_AGE, sample=SAMPLE):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.sample = sample
+        self.registered = {} #URL -> markers, for every page a test registered
+        self.pages = self.registered #The pages this run probes, or this shard's in a parallel worker
+        self.entries = None #URL -> cache entry
+        self.decisions = {} #URL -> (check in the browser?, kind, reason)
+        self.probes = {} #URL -> what this run's probe saw: status, fingerprint, validators
+        self.touched = set()
+        self.counts = {}
+        self.evicted = set()
+
+    def register(self, url, markers):
+        self.registered[url] = list(markers)
+
+    #Starts a parallel worker's shard: only its pages are probed, and planned afresh. A spawned worker can run several shards;
+    #the previous one was already saved and handed back (hand_off()).
+    def limit(self, urls):
+        self.pages = {url: markers for url, markers in self.registered.items() if url in urls}
+        self.entries = None
+        self.decisions = {}
+        self.probes = {}
+
+    def read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    #Our own entries win over the file's, the file's other entries are kept (parallel workers share it), and the least
+    #recently used go once there are more than max_entries. The read, merge and write happen under the file lock.
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with file_lock(self.path + '.lock'):
+            saved = self.read()
+            saved.update({url: self.entries[url] for url in self.touched if url in self.entries})
+            kept = sorted(saved.items(), key=lambda item: item[1].get('used', 0))[-self.max_entries:]
+            with open(self.path + '.%d.tmp' % os.getpid(), 'w', encoding='utf-8') as f:
+                json.dump(dict(kept), f, indent=1, sort_keys=True)
+            os.replace(self.path + '.%d.tmp' % os.getpid(), self.path)
+        self.evicted = (self.evicted | set(saved)) - set(url for url, entry in kept)
+        self.entries.update(kept)
+        self.touched = set()
+
+    async def probe(self, client, url):
+        entry = self.entries.get(url) or {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            response = await client.get(url, headers)
+        except Exception as exc:
+            return url, {'error': repr(exc)}
+        if response.status == 304:
+            return url, {'status': 304, 'fingerprint': entry.get('fingerprint')}
+        return url, {'status': response.status, 'fingerprint': fingerprint(response.text, self.pages[url]),
+                     'etag': response.header('etag'), 'last_modified': response.header('last-modified')}
+
+    #Probes every registered page (of this shard) at once the first time a test asks, then decides which ones are checked in full.
+    def plan(self):
+        self.entries = self.read()
+        jar = trs_session.cookie_jar() #Before the loop starts: it may have to select the store, with a loop of its own
+
+        async def run():
+            async with AsyncHttpClient(CONCURRENCY, cookies=jar) as client:
+                return await asyncio.gather(*[self.probe(client, url) for url in self.pages])
+        self.probes = dict(asyncio.run(run()))
+        now = time.time()
+        unchanged = []
+        for url, probe in self.probes.items():
+            entry = self.entries.get(url)
+            if not entry or not entry.get('fingerprint'):
+                self.decisions[url] = (True, 'new', 'new page')
+            elif not entry.get('passed'):
+                self.decisions[url] = (True, 'failed', 'failed last time')
+            elif 'error' in probe or probe['status'] not in (200, 304):
+                self.decisions[url] = (True, 'changed', 'probe failed: %s' % (probe.get('error') or 'HTTP %d' % probe['status']))
+            elif probe['fingerprint'] != entry['fingerprint']:
+                changed = sorted(name for name in set(probe['fingerprint']) | set(entry['fingerprint'])
+                                 if probe['fingerprint'].get(name) != entry['fingerprint'].get(name))
+                self.decisions[url] = (True, 'changed', 'changed: ' + ', '.join(changed))
+            elif now - entry.get('checked', 0) > self.max_age:
+                self.decisions[url] = (True, 'stale', 'not checked for %.0f days' % ((now - entry.get('checked', 0)) / 86400))
+            else:
+                unchanged.append(url)
+        unchanged.sort(key=lambda url: self.entries[url].get('checked', 0))
+        sampled = int(math.ceil(len(unchanged) * self.sample))
+        for n, url in enumerate(unchanged):
+            self.decisions[url] = (True, 'sampled', 'unchanged, sampled') if n < sampled else (False, 'unchanged', 'unchanged')
+
+    #(check in the browser?, reason) for a registered page.
+    def decide(self, url):
+        if self.entries is None:
+            self.plan()
+        check, kind, reason = self.decisions[url]
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        self.entries.setdefault(url, {})['used'] = time.time()
+        self.touched.add(url)
+        return check, reason
+
+    #Stores the outcome of a full check together with what the probe saw of the page.
+    def record(self, url, passed):
+        probe = self.probes.get(url) or {}
+        entry = self.entries.setdefault(url, {})
+        entry.update(passed=passed, checked=time.time(), used=time.time())
+        if probe.get('status') == 200:
+            entry.update(fingerprint=probe['fingerprint'], etag=probe['etag'], last_modified=probe['last_modified'])
+        elif 'error' in probe:
+            entry['fingerprint'] = None
+        self.touched.add(url)
+
+    #Saves what this process decided and checked.
+    def finish(self):
+        if self.touched:
+            self.save()
+
+    #End of a parallel worker's shard: saves, and returns the shard's counts for the parent's report. The worker forgets them,
+    #so they aren't counted again with its next shard or printed at its exit.
+    def hand_off(self):
+        self.finish()
+        counts = {'counts': self.counts, 'evicted': sorted(self.evicted)}
+        self.counts = {}
+        self.evicted = set()
+        return counts
+
+    #Adds a worker's counts (hand_off()) to this process's report.
+    def merge(self, worker):
+        for kind, count in worker['counts'].items():
+            self.counts[kind] = self.counts.get(kind, 0) + count
+        self.evicted.update(worker['evicted'])
+
+    def report(self):
+        return 'Incremental checks: %s%s' % (', '.join('%d %s' % (count, 'unchanged (skipped)' if kind == 'unchanged' else kind)
+                                                       for kind, count in sorted(self.counts.items())),
+                                             ' (%d cache entries evicted)' % len(self.evicted) if self.evicted else '')
+
+    def print_report(self):
+        if self.counts:
+            self.finish()
+            print(self.report())
+
+
+cache = FingerprintCache()
+atexit.register(cache.print_report)
+
+
+#Limits the probes to the pages of `tests` (test cases), so parallel workers don't all probe every page.
+def shard(tests):
+    urls = set()
+    for test in tests:
+        urls.add(getattr(getattr(test, test._testMethodName, None), 'fingerprint_url', None))
+    cache.limit(urls)
+
+
+#Decorator for a catalog entry's test (generate_tests' decorate): with SMOKE_INCREMENTAL=1 the test is skipped when the page
+#is unchanged since it last passed, and its result is remembered otherwise.
+def incremental(entry, test):
+    if not ENABLED or not entry.url:
+        return test
+    cache.register(entry.url, entry.markers)
+
+    @functools.wraps(test)
+    def check(self):
+        full, reason = cache.decide(entry.url)
+        if not full:
+            self.skipTest('page unchanged since it last passed (fingerprint cache)')
+        print("Full check (%s): %s" % (reason, entry.url))
+        try:
+            test(self)
+        except unittest.SkipTest:
+            raise
+        except BaseException:
+            cache.record(entry.url, passed=False)
+            raise
+        cache.record(entry.url, passed=True)
+    check.fingerprint_url = entry.url
+    return check
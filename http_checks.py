@@ -0,0 +1,119 @@
+'''
+HTTP fast path for smoke checks that only look at the HTML the server sends: product boxes and filter lists on PLPs, the sort
+option URLs, TRS product page markers. Those don't need a browser, so with SMOKE_HTTP=1 they are fetched concurrently over
+pooled keep-alive connections (http_client.py) and Chrome is only started for the tests that need JavaScript (autosuggest,
+filter clicks, search forms). The browser versions of these tests are skipped in that mode.
+
+A Check is one URL plus what has to be on it. Markers are matched as substrings of the response body, the same way the browser
+tests used to match them against page_source.
+'''
+import asyncio
+import os
+import unittest
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from http_client import CONCURRENCY, AsyncHttpClient
+from trs_session import INTERSTITIAL_TEXT
+
+ENABLED = os.environ.get('SMOKE_HTTP') == '1'
+
+SORT_ORDERS = ['price_asc', 'price_desc', 'rating_asc', 'rating_desc', 'date_desc', 'date_asc']
+
+
+#Marks a browser test that HttpFastPath covers, so it is skipped when the fast path is on.
+def http_fast_path(test):
+    return unittest.skipIf(ENABLED, 'checked over HTTP by HttpFastPath (SMOKE_HTTP=1)')(test)
+
+
+def sorted_url(url, order):
+    return url + ('&' if '?' in url else '?') + 'order=' + order
+
+
+class Check:
+    def __init__(self, url, markers=(), sort_orders=()):
+        self.url = url
+        self.markers = list(markers)
+        self.sort_urls = [sorted_url(url, order) for order in sort_orders]
+
+
+class CheckResult:
+    def __init__(self, check, status=None, elapsed=0.0, problems=()):
+        self.check = check
+        self.url = check.url
+        self.status = status
+        self.elapsed = elapsed
+        self.problems = list(problems)
+
+    @property
+    def passed(self):
+        return not self.problems
+
+
+#Collects the option values of the sort dropdown (<select id="sort_options">), in page order.
+class SortOptionParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.in_sort = False
+        self.values = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'select':
+            self.in_sort = attrs.get('id') == 'sort_options'
+        elif tag == 'option' and self.in_sort and attrs.get('value'):
+            self.values.append(attrs['value'])
+
+    def handle_endtag(self, tag):
+        if tag == 'select':
+            self.in_sort = False
+
+
+#Absolute URLs the sort dropdown leads to. Options whose value is just an order name ("price_asc") are turned into the URL
+#the page's script would navigate to.
+def sort_urls(html, page_url):
+    parser = SortOptionParser()
+    parser.feed(html)
+    urls = []
+    for value in parser.values:
+        if '/' in value or '?' in value or '=' in value:
+            urls.append(urljoin(page_url, value))
+        else:
+            urls.append(sorted_url(page_url, value))
+    return urls
+
+
+def evaluate(check, response):
+    if isinstance(response, Exception):
+        return CheckResult(check, problems=['request failed: %r' % response])
+    problems = []
+    if response.status != 200:
+        problems.append('HTTP %d' % response.status)
+    html = response.text
+    if INTERSTITIAL_TEXT in html:
+        problems.append('store-selection interstitial shown; cookie injection failed')
+    problems += ['%r not found' % marker for marker in check.markers if marker not in html]
+    if check.sort_urls:
+        found = set(sort_urls(html, response.url))
+        problems += ['no sort option for %s' % url for url in check.sort_urls if url not in found]
+    return CheckResult(check, response.status, response.elapsed, problems)
+
+
+async def run_checks_async(checks, client, warmup=()):
+    for url in warmup:
+        await client.get(url)
+    flat = [(name, check) for name, group in checks.items() for check in group]
+    responses = await client.get_all([check.url for name, check in flat])
+    results = {name: [] for name in checks}
+    for (name, check), response in zip(flat, responses):
+        results[name].append(evaluate(check, response))
+    return results
+
+
+#Runs every check concurrently with one pooled client. `checks` maps a group name to a list of Checks; the result maps the same
+#names to lists of CheckResults. `warmup` URLs are fetched first, in order; `cookies` is a CookieJar to start from.
+def run_checks(checks, concurrency=CONCURRENCY, warmup=(), cookies=None):
+    async def run():
+        async with AsyncHttpClient(concurrency, cookies=cookies) as client:
+            return await run_checks_async(checks, client, warmup)
+    return asyncio.run(run())
@@ -0,0 +1,224 @@
+'''
+Small asyncio HTTP/1.1 client used by the browserless parts of the smoke suite. It keeps connections alive and pools them per
+host, caps the number of requests in flight, follows redirects, asks for gzip and keeps a cookie jar (TRS needs the store
+cookie). It only does what the smoke checks need: GET and HEAD requests for HTML pages.
+
+    async with AsyncHttpClient(concurrency=16) as client:
+        responses = await client.get_all(urls)
+
+fetch_all(urls) does the same from synchronous code.
+'''
+import asyncio
+import gzip
+import os
+import ssl
+import time
+import zlib
+from urllib.parse import urljoin, urlsplit
+
+CONCURRENCY = int(os.environ.get('SMOKE_HTTP_CONCURRENCY', '16'))
+TIMEOUT = float(os.environ.get('SMOKE_HTTP_TIMEOUT', '30'))
+MAX_REDIRECTS = 5
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0 Safari/537.36 CatalogSmoke'
+
+
+class HttpError(Exception):
+    pass
+
+
+class Response:
+    def __init__(self, url, status, reason, headers, body, elapsed, history=()):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers #lower-cased name -> list of values
+        self.body = body
+        self.elapsed = elapsed
+        self.history = list(history)
+
+    def header(self, name, default=None):
+        values = self.headers.get(name.lower())
+        return values[-1] if values else default
+
+    @property
+    def text(self):
+        return self.body.decode('utf-8', 'replace')
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+    def __repr__(self):
+        return '<Response %d %s>' % (self.status, self.url)
+
+
+#Minimal cookie jar: name=value pairs per domain, honouring the Domain attribute but not Path or expiry.
+class CookieJar:
+    def __init__(self):
+        self.domains = {}
+
+    def store(self, host, header):
+        pair, _, attributes = header.partition(';')
+        name, _, value = pair.strip().partition('=')
+        domain = host
+        for attribute in attributes.split(';'):
+            key, _, val = attribute.strip().partition('=')
+            if key.lower() == 'domain' and val:
+                domain = val.lstrip('.').lower()
+        self.domains.setdefault(domain, {})[name] = value
+
+    def set(self, domain, name, value):
+        self.domains.setdefault(domain.lstrip('.').lower(), {})[name] = value
+
+    def header_for(self, host):
+        cookies = {}
+        for domain, values in self.domains.items():
+            if host == domain or host.endswith('.' + domain):
+                cookies.update(values)
+        return '; '.join('%s=%s' % item for item in cookies.items())
+
+
+class AsyncHttpClient:
+    def __init__(self, concurrency=CONCURRENCY, timeout=TIMEOUT, headers=None, cookies=None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self.cookies = cookies or CookieJar()
+        self.idle = {} #(scheme, host, port) -> [(reader, writer)]
+        self.semaphore = None
+        self.stats = {'requests': 0, 'connections': 0, 'bytes': 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def get(self, url, headers=None, follow_redirects=True):
+        return await self.request('GET', url, headers, follow_redirects)
+
+    async def head(self, url, headers=None, follow_redirects=True):
+        return await self.request('HEAD', url, headers, follow_redirects)
+
+    #Fetches all urls concurrently (bounded by the client's concurrency). Failed requests come back as exceptions.
+    async def get_all(self, urls, headers=None):
+        return await asyncio.gather(*[self.get(url, headers) for url in urls], return_exceptions=True)
+
+    async def request(self, method, url, headers=None, follow_redirects=True):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        history = []
+        start = time.perf_counter()
+        async with self.semaphore:
+            for _ in range(MAX_REDIRECTS + 1):
+                status, reason, response_headers, body = await asyncio.wait_for(
+                    self.send(method, url, headers or {}), self.timeout)
+                response = Response(url, status, reason, response_headers, body, time.perf_counter() - start, history)
+                location = response.header('location')
+                if not (follow_redirects and location and status in (301, 302, 303, 307, 308)):
+                    return response
+                history.append(response)
+                url = urljoin(url, location)
+                if status == 303:
+                    method = 'GET'
+        raise HttpError('Too many redirects for %s' % url)
+
+    #One request/response on a pooled connection. A pooled connection the server already closed is retried once on a new one.
+    async def send(self, method, url, headers):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        lines = ['%s %s HTTP/1.1' % (method, path), 'Host: %s' % parts.netloc, 'User-Agent: %s' % USER_AGENT,
+                 'Accept: text/html,*/*', 'Accept-Encoding: gzip, deflate', 'Connection: keep-alive']
+        cookie = self.cookies.header_for(parts.hostname)
+        if cookie:
+            lines.append('Cookie: %s' % cookie)
+        for name, value in list(self.headers.items()) + list(headers.items()):
+            lines.append('%s: %s' % (name, value))
+        data = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        for attempt in range(2):
+            reused = bool(self.idle.get(key))
+            reader, writer = self.idle[key].pop() if reused else await self.connect(key)
+            try:
+                writer.write(data)
+                await writer.drain()
+                status, reason, response_headers, body, keep_alive = await self.read_response(reader, method)
+            except (ConnectionError, asyncio.IncompleteReadError, HttpError):
+                writer.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            if keep_alive:
+                self.idle.setdefault(key, []).append((reader, writer))
+            else:
+                writer.close()
+            for value in response_headers.get('set-cookie', []):
+                self.cookies.store(parts.hostname, value)
+            self.stats['requests'] += 1
+            self.stats['bytes'] += len(body)
+            return status, reason, response_headers, self.decode(body, response_headers)
+
+    async def connect(self, key):
+        scheme, host, port = key
+        context = ssl.create_default_context() if scheme == 'https' else None
+        self.stats['connections'] += 1
+        return await asyncio.open_connection(host, port, ssl=context, server_hostname=host if context else None)
+
+    async def read_response(self, reader, method):
+        status_line = await reader.readline()
+        if not status_line:
+            raise HttpError('Connection closed before a response')
+        version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers.setdefault(name.strip().lower(), []).append(value.strip())
+        status = int(status)
+        connection = ','.join(headers.get('connection', [])).lower()
+        keep_alive = 'close' not in connection and version != 'HTTP/1.0'
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif 'chunked' in ','.join(headers.get('transfer-encoding', [])).lower():
+            body = await self.read_chunked(reader)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length'][-1]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return status, reason, headers, body, keep_alive
+
+    async def read_chunked(self, reader):
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+            if size == 0:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+
+    def decode(self, body, headers):
+        encoding = ','.join(headers.get('content-encoding', [])).lower()
+        if 'gzip' in encoding:
+            return gzip.decompress(body)
+        if 'deflate' in encoding:
+            return zlib.decompress(body)
+        return body
+
+    async def close(self):
+        for connections in self.idle.values():
+            for reader, writer in connections:
+                writer.close()
+        self.idle = {}
+
+
+#Synchronous helper: fetches every url with one pooled client and returns responses (or exceptions) in the same order.
+def fetch_all(urls, concurrency=CONCURRENCY, cookies=None):
+    async def run():
+        async with AsyncHttpClient(concurrency, cookies=cookies) as client:
+            return await client.get_all(urls)
+    return asyncio.run(run())
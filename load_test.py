@@ -0,0 +1,280 @@
+'''
+Load generator built from the smoke suite's journeys (scenarios.py). The same search, pagination, filter, sort and search-within
+flows the smoke checks walk once are replayed here by many lightweight virtual users over HTTP: each user picks a scenario at
+random and walks it with its own cookie jar and connection, like a visitor's browser minus the rendering.
+
+    python load_test.py --stub --latency 0.05 --rate 50 --duration 30       against a local stub_site.py
+    python load_test.py --rate 5 --duration 300 --processes 4 --flows search_paginate,search_within
+
+Point it at a staging stand-in the same way as the smoke suite, through the site variables in sites.py (SMOKE_WSS_URL, ...).
+
+Users arrive at random (a Poisson process) at --rate per second for --duration seconds, whether or not earlier users are done,
+so a slow server shows up as longer latencies and more users in flight, not as a lower arrival rate. At most --concurrency users
+are in flight; arrivals beyond that are dropped and counted. The work is split over --processes worker processes, each running
+its share of the rate and concurrency on its own asyncio loop.
+
+Every step is reported per flow: requests, throughput, error rate, the most common errors and a latency histogram with
+p50/p95/p99. The full histograms are written to load_report.json (SMOKE_LOAD_REPORT). With --max-errors P the run exits with 1
+when more than P percent of the requests failed.
+'''
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import scenarios
+import trs_session
+from http_client import AsyncHttpClient, CookieJar
+
+REPORT_FILE = os.environ.get('SMOKE_LOAD_REPORT', 'load_report.json')
+
+#Histogram buckets grow by 5%, so a percentile read off them is within 5% of the real value.
+GROWTH = 1.05
+#Ranges of the printed histogram, upper bounds in ms
+DISPLAY_BUCKETS = [10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+PERCENTILES = [50, 95, 99]
+
+
+#Latency histogram in milliseconds with logarithmic buckets. Histograms from the workers are merged by adding counts.
+class Histogram:
+    def __init__(self, counts=None):
+        self.counts = dict(counts or {}) #bucket -> requests; bucket n holds latencies up to GROWTH ** (n + 1) ms
+
+    @property
+    def count(self):
+        return sum(self.counts.values())
+
+    def add(self, seconds):
+        bucket = int(math.floor(math.log(max(seconds * 1000.0, 1.0), GROWTH)))
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+
+    @staticmethod
+    def upper(bucket):
+        return GROWTH ** (bucket + 1)
+
+    def percentile(self, p):
+        rank = max(1, int(math.ceil(p / 100.0 * self.count)))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return self.upper(bucket)
+        return None
+
+    #Requests per display range, the last one open ended.
+    def ranges(self):
+        counts = [0] * (len(DISPLAY_BUCKETS) + 1)
+        for bucket, count in self.counts.items():
+            upper = self.upper(bucket)
+            counts[next((n for n, limit in enumerate(DISPLAY_BUCKETS) if upper <= limit * GROWTH), len(DISPLAY_BUCKETS))] += count
+        return counts
+
+
+class StepStats:
+    def __init__(self):
+        self.histogram = Histogram()
+        self.errors = 0
+        self.error_kinds = {}
+
+    def add(self, seconds, problems):
+        self.histogram.add(seconds)
+        if problems:
+            self.errors += 1
+            self.error_kinds[problems[0]] = self.error_kinds.get(problems[0], 0) + 1
+
+    def merge(self, other):
+        self.histogram.merge(other.histogram)
+        self.errors += other.errors
+        for kind, count in other.error_kinds.items():
+            self.error_kinds[kind] = self.error_kinds.get(kind, 0) + count
+
+
+#What one worker (or, merged, the whole run) saw: stats per (flow, step), users per flow and arrivals dropped.
+class Load:
+    def __init__(self):
+        self.steps = {}
+        self.flows = {} #flow -> [users, failed]
+        self.dropped = 0
+        self.elapsed = 0.0
+
+    def record(self, scenario, step, result):
+        self.steps.setdefault((scenario.flow, step.name), StepStats()).add(result.elapsed, result.problems)
+
+    def finished(self, flow, passed):
+        entry = self.flows.setdefault(flow, [0, 0])
+        entry[0] += 1
+        entry[1] += 0 if passed else 1
+
+    def merge(self, other):
+        for key, stats in other.steps.items():
+            self.steps.setdefault(key, StepStats()).merge(stats)
+        for flow, (users, failed) in other.flows.items():
+            entry = self.flows.setdefault(flow, [0, 0])
+            entry[0] += users
+            entry[1] += failed
+        self.dropped += other.dropped
+        self.elapsed = max(self.elapsed, other.elapsed)
+
+    @property
+    def requests(self):
+        return sum(stats.histogram.count for stats in self.steps.values())
+
+    @property
+    def errors(self):
+        return sum(stats.errors for stats in self.steps.values())
+
+
+#Every virtual user starts from the same cookies (the TRS store) but keeps its own from there on.
+def copy_jar(jar):
+    copy = CookieJar()
+    copy.domains = {domain: dict(values) for domain, values in jar.domains.items()}
+    return copy
+
+
+async def visit(scenario, jar, load, rng):
+    async with AsyncHttpClient(1, cookies=copy_jar(jar)) as client:
+        run = await scenarios.run_scenario(client, scenario, rng, load.record)
+    load.finished(scenario.flow, run.passed)
+
+
+#Starts users at random arrival times, `rate` a second on average, for `duration` seconds, then waits for the ones in flight.
+async def generate(scenario_list, jar, rate, concurrency, duration, rng):
+    load = Load()
+    users = set()
+    start = time.perf_counter()
+    arrival = start
+    while True:
+        arrival += rng.expovariate(rate)
+        if arrival - start >= duration:
+            break
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        if len(users) >= concurrency:
+            load.dropped += 1
+            continue
+        user = asyncio.ensure_future(visit(rng.choice(scenario_list), jar, load, random.Random(rng.random())))
+        users.add(user)
+        user.add_done_callback(users.discard)
+    if users:
+        await asyncio.wait(users)
+    load.elapsed = time.perf_counter() - start
+    return load
+
+
+def needs_trs(scenario_list):
+    return any(scenario.entry.site != 'wss' for scenario in scenario_list)
+
+
+#Entry point of a worker process.
+def run_worker(flows, rate, concurrency, duration, seed):
+    scenario_list = scenarios.build(flows)
+    jar = trs_session.cookie_jar() if needs_trs(scenario_list) else CookieJar()
+    return asyncio.run(generate(scenario_list, jar, rate, concurrency, duration, random.Random(seed)))
+
+
+#Runs in a worker before the load starts, since only the workers see the site URLs of a --stub run: counts the scenarios and
+#selects the TRS store once, so the workers all reuse its saved cookies.
+def prepare(flows):
+    scenario_list = scenarios.build(flows)
+    if needs_trs(scenario_list):
+        trs_session.cookie_jar()
+    return len(scenario_list)
+
+
+def run(flows, rate, concurrency, duration, processes, seed):
+    processes = max(1, min(processes, concurrency))
+    load = Load()
+    with ProcessPoolExecutor(max_workers=processes, mp_context=get_context('spawn')) as executor:
+        if not executor.submit(prepare, flows).result():
+            raise SystemExit('No scenarios: the catalog has no entries for %s' % ', '.join(flows or scenarios.FLOWS))
+        workers = [executor.submit(run_worker, flows, rate / processes, concurrency // processes + (n < concurrency % processes),
+                                   duration, seed + n) for n in range(processes)]
+        for worker in workers:
+            load.merge(worker.result())
+    return load
+
+
+def ms(value):
+    return '%.0f' % value if value is not None else '-'
+
+
+def report(load, settings):
+    users = sum(entry[0] for entry in load.flows.values())
+    failed = sum(entry[1] for entry in load.flows.values())
+    lines = ['Load: %(rate).1f users/s for %(duration).0fs, up to %(concurrency)d at once, %(processes)d processes' % settings,
+             '%d users in %.1fs (%d failed, %d dropped at the concurrency limit), %d requests, %.1f/s, %.2f%% errors'
+             % (users, load.elapsed, failed, load.dropped, load.requests, load.requests / (load.elapsed or 1),
+                100.0 * load.errors / (load.requests or 1)), '',
+             '%-34s %8s %7s %7s %7s %7s %7s' % ('step', 'requests', 'req/s', 'errors', 'p50 ms', 'p95 ms', 'p99 ms')]
+    for (flow, step), stats in sorted(load.steps.items()):
+        histogram = stats.histogram
+        lines.append('%-34s %8d %7.1f %6.2f%% %7s %7s %7s' % (
+            '%s/%s' % (flow, step), histogram.count, histogram.count / (load.elapsed or 1),
+            100.0 * stats.errors / (histogram.count or 1), *[ms(histogram.percentile(p)) for p in PERCENTILES]))
+        lines.append('    ' + '  '.join('%s:%d' % (label, count) for label, count in zip(
+            ['<%d' % limit for limit in DISPLAY_BUCKETS] + ['>%d' % DISPLAY_BUCKETS[-1]], histogram.ranges()) if count))
+        for kind, count in sorted(stats.error_kinds.items(), key=lambda item: -item[1])[:3]:
+            lines.append('    %dx %s' % (count, kind))
+    return '\n'.join(lines)
+
+
+def save_report(load, settings, path=REPORT_FILE):
+    steps = {}
+    for (flow, step), stats in sorted(load.steps.items()):
+        histogram = stats.histogram
+        steps['%s/%s' % (flow, step)] = {
+            'requests': histogram.count, 'errors': stats.errors, 'error_kinds': stats.error_kinds,
+            'percentiles_ms': {'p%d' % p: histogram.percentile(p) for p in PERCENTILES},
+            'histogram_ms': [[round(Histogram.upper(bucket), 2), count] for bucket, count in sorted(histogram.counts.items())]}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'settings': settings, 'elapsed': load.elapsed, 'dropped': load.dropped, 'flows': load.flows, 'steps': steps},
+                  f, indent=1, sort_keys=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the smoke suite's journeys as HTTP virtual users.")
+    parser.add_argument('--rate', type=float, default=5.0, help='new users per second')
+    parser.add_argument('--duration', type=float, default=60.0, help='seconds to keep users arriving')
+    parser.add_argument('--concurrency', type=int, default=50, help='most users in flight at once')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--flows', help='comma separated, any of ' + ', '.join(scenarios.FLOWS) + ' (default all)')
+    parser.add_argument('--seed', type=int, help='random seed, to repeat a run')
+    parser.add_argument('--report', default=REPORT_FILE, help='JSON report with the full histograms')
+    parser.add_argument('--max-errors', type=float, help='exit with 1 when more than this percentage of requests failed')
+    parser.add_argument('--stub', action='store_true', help='run against a local stub site')
+    parser.add_argument('--latency', type=float, default=0.0, help='latency added by the stub site, in seconds')
+    args = parser.parse_args(argv)
+    flows = args.flows.split(',') if args.flows else None
+    unknown = [flow for flow in flows or [] if flow not in scenarios.FLOWS]
+    if unknown:
+        parser.error('unknown flow %s' % ', '.join(unknown))
+    settings = {'rate': args.rate, 'duration': args.duration, 'concurrency': args.concurrency, 'processes': args.processes,
+                'flows': flows or list(scenarios.FLOWS), 'seed': args.seed if args.seed is not None else int(time.time())}
+    stub = None
+    if args.stub:
+        from stub_site import StubSite
+        stub = StubSite(latency=args.latency).start()
+        os.environ.update(stub.env()) #Workers are spawned, so they pick these up when they import sites.py
+    try:
+        load = run(flows, args.rate, args.concurrency, args.duration, args.processes, settings['seed'])
+    finally:
+        if stub:
+            stub.stop()
+    print(report(load, settings))
+    save_report(load, settings, args.report)
+    if args.max_errors is not None and 100.0 * load.errors / (load.requests or 1) > args.max_errors:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+'''
+Named locators. Tests ask for logical elements ("search_box('wss')", "autosuggest_item(2)", "sort_option('price_desc')") instead of
+spelling out absolute XPaths, so when the markup changes there is one place to fix.
+
+Each name compiles to a list of strategies, fastest first: an id lookup, then CSS, then XPath. Where a locator is only known as
+an XPath, simple child paths like //*[@id="searchForm"]/div/ul/li[2]/span[2] are translated to the equivalent CSS
+(#searchForm > div > ul > li:nth-of-type(2) > span:nth-of-type(2)) and the XPath is kept as the fallback. The strategies are
+tried in order in the page itself, in a single script call.
+
+An ElementFinder caches the element each locator resolved to for the current page state (URL, document id and DOM version
+counter from page_snapshot.py), so asking for the same element again on an unchanged page doesn't search the DOM again.
+
+At the end of the run locators that are slow to resolve, fell back to a later strategy (the preferred one no longer matches the
+markup) or found nothing are reported. SMOKE_SLOW_LOCATOR sets what counts as slow, in seconds (default 0.1).
+'''
+import atexit
+import os
+import re
+import time
+
+from page_snapshot import OBSERVER_SCRIPT
+
+SLOW_SECONDS = float(os.environ.get('SMOKE_SLOW_LOCATOR', '0.1'))
+
+#locate(by, value) in the page. Shared with assert_batch.py.
+LOCATE_FUNCTION = '''
+function locate(by, value) {
+    if (by === 'xpath') return document.evaluate(value, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (by === 'css') return document.querySelector(value);
+    if (by === 'id') return document.getElementById(value);
+    if (by === 'name') return document.getElementsByName(value)[0] || null;
+    if (by === 'class_name') return document.getElementsByClassName(value)[0] || null;
+    throw new Error('unknown locator ' + by);
+}
+'''
+
+#Returns [[url, document id, version], index of the strategy that matched, element]. If the page is still in the state the
+#caller already has an element for, returns [state, -1, null] without searching.
+FIND_SCRIPT = OBSERVER_SCRIPT + LOCATE_FUNCTION + '''
+var state = [location.href, snap.document, snap.version], known = arguments[1];
+if (known && known[0] === state[0] && known[1] === state[1] && known[2] === state[2]) return [state, -1, null];
+var strategies = arguments[0];
+for (var i = 0; i < strategies.length; i++) {
+    var found = locate(strategies[i][0], strategies[i][1]);
+    if (found) return [state, i, found];
+}
+return [state, null, null];
+'''
+
+STEP = re.compile(r'/(\*|[a-zA-Z][\w-]*)(?:\[(\d+)\]|\[@(id|name|class)="([^"]*)"\])?')
+PLAIN_ID = re.compile(r'^[A-Za-z_][\w-]*$')
+
+
+#CSS equivalent of a simple XPath made of child steps (tag, tag[n], *[@id="x"]), or None if it uses anything else.
+#tag[n] in XPath counts siblings with the same tag, which is exactly :nth-of-type(n).
+def xpath_to_css(xpath):
+    path = xpath[1:] if xpath.startswith('//') else xpath
+    parts = []
+    position = 0
+    while position < len(path):
+        match = STEP.match(path, position)
+        if not match:
+            return None
+        tag, index, attribute, value = match.groups()
+        if tag == '*' and index:
+            return None
+        selector = '' if tag == '*' else tag
+        if index:
+            selector += ':nth-of-type(%s)' % index
+        elif attribute == 'id' and PLAIN_ID.match(value):
+            selector += '#' + value
+        elif attribute:
+            selector += '[%s="%s"]' % (attribute, value)
+        parts.append(selector or '*')
+        position = match.end()
+    return ' > '.join(parts) if parts else None
+
+
+#`text` as an XPath string literal. XPath 1.0 has no escapes, so text with both kinds of quote is built with concat().
+def xpath_string(text):
+    if '"' not in text:
+        return '"%s"' % text
+    if "'" not in text:
+        return "'%s'" % text
+    return 'concat(%s)' % ', \'"\', '.join('"%s"' % part for part in text.split('"'))
+
+
+#Strategies for an XPath, fastest first: the id on its own, or the translated CSS with the XPath as fallback.
+def from_xpath(xpath):
+    css = xpath_to_css(xpath)
+    if css and css.startswith('#') and PLAIN_ID.match(css[1:]):
+        return [('id', css[1:])]
+    return ([('css', css)] if css else []) + [('xpath', xpath)]
+
+
+class Locator:
+    def __init__(self, name, strategies):
+        self.name = name
+        self.strategies = list(strategies)
+
+    def __repr__(self):
+        return '<Locator %s: %s>' % (self.name, ', '.join('%s=%r' % strategy for strategy in self.strategies))
+
+
+REGISTRY = {}
+
+
+def register(function):
+    REGISTRY[function.__name__] = function
+    return function
+
+
+@register
+def search_box(site):
+    return [('name', 'searchval' if site == 'wss' else 'search_values')]
+
+
+@register
+def search_within_box():
+    return [('name', 'withinval')]
+
+
+@register
+def autosuggest_item(n):
+    return from_xpath('//*[@id="searchForm"]/div/ul/li[%d]/span[2]' % n)
+
+
+#The suggestion reading exactly `text`, wherever it is in the list.
+@register
+def autosuggest_suggestion(text):
+    return from_xpath('//*[@id="searchForm"]/div/ul/li[span[2][normalize-space()=%s]]/span[2]' % xpath_string(text))
+
+
+#The option of the sort dropdown for `order` (e.g. "price_asc"), by its value: either the order name itself or a URL with
+#order=<order> in it. Doesn't depend on how the options are grouped or in what order they are listed.
+@register
+def sort_option(order):
+    return [('css', ', '.join('#sort_options option[value%s"%s"]' % pair for pair in
+                              [('=', order), ('$=', 'order=' + order), ('*=', 'order=%s&' % order)]))]
+
+
+@register
+def fsr_search_box():
+    return [('id', 'term')]
+
+
+#The heading of the first article in the FSR search results, by what it links to. The old absolute path is the fallback.
+@register
+def fsr_first_result():
+    return ([('css', '#page a[href*="/food-service-resources/articles/"] h2')]
+            + from_xpath('//*[@id="page"]/div[1]/div[2]/div/a[1]/span[2]/h2'))
+
+
+#A category link in the FSR sidebar, i.e. a list item linking back into the FSR section.
+@register
+def fsr_sidebar_category():
+    return ([('xpath', '//*[@id="page"]//ul/li[a[contains(@href, "/food-service-resources/")]]')]
+            + from_xpath('//*[@id="page"]/div[3]/ul/li[2]'))
+
+
+#The checkbox labelled `label` in a facet of the filter sidebar, e.g. spec_filter('Shape', 'Oval'). Facet names are as in
+#the collapse ids.
+@register
+def spec_filter(facet, label):
+    return [('xpath', '//*[@id="collapse%s"]/a/label/label/div[normalize-space()=%s]' % (facet, xpath_string(label)))]
+
+
+#The category labelled `label` in the search results' category filter, whichever section it is in.
+@register
+def category_filter(label):
+    return [('xpath', '//*[starts-with(@id, "section")]/a/label/span[normalize-space()=%s]' % xpath_string(label))]
+
+
+compiled = {}
+
+
+def get(name, *args):
+    key = (name,) + args
+    if key not in compiled:
+        if name not in REGISTRY:
+            raise KeyError('no locator named %r' % name)
+        label = '%s(%s)' % (name, ', '.join(repr(arg) for arg in args)) if args else name
+        compiled[key] = Locator(label, REGISTRY[name](*args))
+    return compiled[key]
+
+
+#Per locator: [lookups, cache hits, seconds, slowest, fallbacks, not found]
+stats = {}
+
+
+class ElementFinder:
+    def __init__(self, driver):
+        self.driver = driver
+        self.cache = {} #locator name -> (page state, element)
+
+    def find(self, name, *args):
+        locator = get(name, *args)
+        cached = self.cache.get(locator.name)
+        start = time.perf_counter()
+        state, used, element = self.driver.execute_script(FIND_SCRIPT, [list(strategy) for strategy in locator.strategies],
+                                                          cached[0] if cached else None)
+        entry = stats.setdefault(locator.name, [0, 0, 0.0, 0.0, 0, 0])
+        seconds = time.perf_counter() - start
+        entry[0] += 1
+        entry[2] += seconds
+        entry[3] = max(entry[3], seconds)
+        if used == -1:
+            entry[1] += 1
+            return cached[1]
+        if used is None:
+            from selenium.common.exceptions import NoSuchElementException #Keeps selenium out of browserless runs
+            entry[5] += 1
+            self.cache.pop(locator.name, None)
+            raise NoSuchElementException('%r matched nothing on %s' % (locator, state[0]))
+        if used > 0:
+            entry[4] += 1
+        self.cache[locator.name] = (state, element)
+        return element
+
+
+def report():
+    lines = []
+    for name, (lookups, hits, seconds, slowest, fallbacks, missing) in sorted(stats.items()):
+        problems = []
+        if seconds / lookups > SLOW_SECONDS:
+            problems.append('slow: avg %.2fs, max %.2fs' % (seconds / lookups, slowest))
+        if fallbacks:
+            problems.append('stale: preferred strategy missed %d of %d times' % (fallbacks, lookups))
+        if missing:
+            problems.append('not found %d of %d times' % (missing, lookups))
+        if problems:
+            lines.append('  %-32s %s' % (name, '; '.join(problems)))
+    hits = sum(entry[1] for entry in stats.values())
+    lookups = sum(entry[0] for entry in stats.values())
+    return '\n'.join(['Locators: %d lookups, %d answered from the element cache' % (lookups, hits)] + lines)
+
+
+def print_report():
+    if stats:
+        print(report())
+
+
+atexit.register(print_report)
@@ -0,0 +1,113 @@
+'''
+Cached view of the page a test is looking at. Checking a marker with `"productBox1" in driver.page_source` pulls the whole serialized
+HTML over the WebDriver wire for every assertion. A PageSnapshot instead asks the browser once per page state for an index of the
+ids, class names and name attributes on the page, then answers every check with a set lookup.
+
+The page state is the URL, a random id of the document and a DOM version counter kept by a MutationObserver that the index
+script installs. A navigation or reload starts a new document with a new id (the counter starts over, so it alone could repeat
+an old state) and any DOM change bumps the counter, so either one makes the next check rebuild the index. Staying current only
+costs a tiny round trip returning [url, document id, version].
+
+If the index doesn't contain a marker, the check falls back to the same substring search of page_source the tests used to do
+(fetched at most once per page state), so a check passes exactly when the old assertIn would have.
+'''
+import atexit
+import json
+import time
+
+#Installs the document id and DOM version counter (once per document) into `snap`. Also used by locators.py.
+OBSERVER_SCRIPT = '''
+var snap = window.__smokeSnapshot;
+if (!snap) {
+    snap = window.__smokeSnapshot = {document: performance.timeOrigin + ':' + Math.random(), version: 0};
+    new MutationObserver(function() { snap.version++; }).observe(document.documentElement,
+        {childList: true, subtree: true, attributes: true, attributeFilter: ['id', 'class', 'name']});
+}
+'''
+
+INDEX_SCRIPT = OBSERVER_SCRIPT + '''
+var ids = {}, classes = {}, classAttrs = {}, names = {};
+var nodes = document.querySelectorAll('[id],[class],[name]');
+for (var i = 0; i < nodes.length; i++) {
+    var node = nodes[i];
+    if (node.id) ids[node.id] = 1;
+    var name = node.getAttribute('name');
+    if (name) names[name] = 1;
+    var cls = node.getAttribute('class');
+    if (cls) {
+        classAttrs[cls] = 1;
+        var tokens = cls.split(/\\s+/);
+        for (var j = 0; j < tokens.length; j++) if (tokens[j]) classes[tokens[j]] = 1;
+    }
+}
+return {url: location.href, document: snap.document, version: snap.version, ids: Object.keys(ids), classes: Object.keys(classes),
+        classAttrs: Object.keys(classAttrs), names: Object.keys(names)};
+'''
+
+STATE_SCRIPT = 'var snap = window.__smokeSnapshot; return snap ? [location.href, snap.document, snap.version] : null;'
+
+#Totals for the whole run, printed when the run ends.
+totals = {'checks': 0, 'indexes': 0, 'sources': 0, 'bytes': 0, 'seconds': 0.0}
+
+
+class PageSnapshot:
+    def __init__(self, driver):
+        self.driver = driver
+        self.state = None
+        self.ids = self.classes = self.class_attrs = self.names = frozenset()
+        self.source = None
+
+    #Makes sure the cached index matches what the browser is showing right now.
+    def refresh(self):
+        if self.state is not None:
+            state = self.driver.execute_script(STATE_SCRIPT)
+            if state is not None and tuple(state) == self.state:
+                return self
+        index = self.driver.execute_script(INDEX_SCRIPT)
+        self.state = (index['url'], index['document'], index['version'])
+        self.ids = frozenset(index['ids'])
+        self.classes = frozenset(index['classes'])
+        self.class_attrs = frozenset(index['classAttrs'])
+        self.names = frozenset(index['names'])
+        self.source = None
+        totals['indexes'] += 1
+        totals['bytes'] += len(json.dumps(index))
+        return self
+
+    #Markers are written the same way the old page_source assertions were: either a bare token like "productBox1" (matched
+    #against ids, class names and name attributes) or an exact class attribute like 'class="filter-list box"'.
+    def has(self, marker):
+        start = time.perf_counter()
+        totals['checks'] += 1
+        self.refresh()
+        if marker.startswith('class="') and marker.endswith('"'):
+            found = marker[7:-1] in self.class_attrs
+        else:
+            found = (marker in self.ids or marker in self.classes or marker in self.names
+                     or any(marker in value for value in self.class_attrs))
+        if not found:
+            found = self.source_contains(marker)
+        totals['seconds'] += time.perf_counter() - start
+        return found
+
+    #Plain substring search of the serialized page, fetched at most once per page state.
+    def source_contains(self, text):
+        if self.source is None:
+            self.source = self.driver.page_source
+            totals['sources'] += 1
+            totals['bytes'] += len(self.source)
+        return text in self.source
+
+
+def report():
+    per_check = totals['seconds'] / totals['checks'] * 1000 if totals['checks'] else 0.0
+    return ('Page snapshots: %d checks against %d page indexes (%d full page sources), %.1f KB transferred, %.2f ms per check'
+            % (totals['checks'], totals['indexes'], totals['sources'], totals['bytes'] / 1024.0, per_check))
+
+
+def print_report():
+    if totals['checks']:
+        print(report())
+
+
+atexit.register(print_report)
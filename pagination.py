@@ -0,0 +1,130 @@
+'''
+Pagination crawler. Walking a PLP by clicking the icon-right-open arrow costs a full page load in the browser per page, one after
+the other. The crawler instead reads the page count off the first page of the listing, builds the ?page=N URLs itself and
+fetches the remaining pages concurrently over HTTP (http_client.py), checking each one for the same markers the browser tests
+use. A 6 page walk costs about one page's latency instead of six.
+
+Every page's result is passed to `on_result(page, result)` as soon as it arrives, so the slowest page doesn't hold up reporting
+on the others.
+
+How many pages are walked comes from each catalog entry's depth. SMOKE_PAGE_DEPTH=N walks N pages of every listing instead.
+'''
+import asyncio
+import os
+import re
+
+from http_client import CONCURRENCY, AsyncHttpClient, CookieJar
+from http_checks import Check, evaluate
+
+DEPTH = int(os.environ.get('SMOKE_PAGE_DEPTH', '0'))
+
+PAGE_LINK = re.compile(r'href="[^"]*?[?&;]page=(\d+)')
+
+#Largest page number the listing's links point at, read in the browser so the page source doesn't have to be transferred.
+PAGE_COUNT_SCRIPT = '''
+var count = 1, links = document.querySelectorAll('a[href*="page="]');
+for (var i = 0; i < links.length; i++) {
+    var match = /[?&]page=(\\d+)/.exec(links[i].getAttribute('href'));
+    if (match) count = Math.max(count, parseInt(match[1], 10));
+}
+return count;
+'''
+
+
+def depth_for(depth):
+    return DEPTH or depth
+
+
+def count_pages(html):
+    return max([1] + [int(n) for n in PAGE_LINK.findall(html)])
+
+
+#The URL of page N of a listing, keeping the listing's other query parameters as they are.
+def page_url(url, page):
+    url = url.partition('#')[0]
+    url = re.sub(r'([?&])page=\d+(&|$)', lambda match: match.group(1) if match.group(2) else '', url).rstrip('?&')
+    return url + ('&' if '?' in url else '?') + 'page=%d' % page
+
+
+#Copies the browser's cookies (e.g. the TRS store) into a jar for the HTTP client.
+def cookies_from(driver):
+    jar = CookieJar()
+    for cookie in driver.get_cookies():
+        jar.set(cookie['domain'], cookie['name'], cookie['value'])
+    return jar
+
+
+#Outcome of walking one listing: a CheckResult per page that was fetched.
+class Crawl:
+    def __init__(self, url, depth):
+        self.url = url
+        self.depth = depth
+        self.page_count = None
+        self.results = {}
+
+    @property
+    def problems(self):
+        return ['page %d: %s' % (page, problem) for page in sorted(self.results) for problem in self.results[page].problems]
+
+    @property
+    def passed(self):
+        return not self.problems
+
+    #Seconds until the last page was in, counted from when the crawl started fetching.
+    @property
+    def elapsed(self):
+        return max([result.elapsed for result in self.results.values()] or [0.0])
+
+
+async def fetch_page(client, page, check):
+    try:
+        response = await client.get(check.url)
+    except Exception as exc:
+        response = exc
+    return page, evaluate(check, response), response
+
+
+#Walks pages 1..depth of the listing at `url`. When the caller already has page 1 (it's open in the browser) it passes the
+#page count and only pages 2..depth are fetched; otherwise page 1 is fetched and checked here first.
+async def crawl_async(client, url, markers, depth, page_count=None, on_result=None):
+    listing = Crawl(url, depth_for(depth))
+
+    def report(page, result, response=None):
+        listing.results[page] = result
+        if on_result:
+            on_result(page, result)
+
+    if page_count is None:
+        page, result, response = await fetch_page(client, 1, Check(url, markers))
+        report(page, result)
+        if result.status != 200:
+            return listing
+        page_count = count_pages(response.text)
+    listing.page_count = page_count
+    pages = [fetch_page(client, page, Check(page_url(url, page), markers))
+             for page in range(2, min(listing.depth, page_count) + 1)]
+    for next_page in asyncio.as_completed(pages):
+        report(*await next_page)
+    return listing
+
+
+#Synchronous helper for a single listing, e.g. from a browser test. `cookies` is a CookieJar (see cookies_from).
+def crawl(url, markers, depth, page_count=None, cookies=None, on_result=None, concurrency=CONCURRENCY):
+    async def run():
+        async with AsyncHttpClient(concurrency, cookies=cookies) as client:
+            return await crawl_async(client, url, markers, depth, page_count, on_result)
+    return asyncio.run(run())
+
+
+#Walks several listings at once with one pooled client. `listings` are (url, markers, depth) tuples; the Crawls come back in
+#the same order. `warmup` URLs are fetched first, in order.
+def crawl_all(listings, concurrency=CONCURRENCY, warmup=(), on_result=None):
+    async def run():
+        async with AsyncHttpClient(concurrency) as client:
+            for url in warmup:
+                await client.get(url)
+            return await asyncio.gather(*[
+                crawl_async(client, url, markers, depth,
+                            on_result=on_result and (lambda page, result, url=url: on_result(url, page, result)))
+                for url, markers, depth in listings])
+    return asyncio.run(run())
@@ -0,0 +1,230 @@
+'''
+Runs the smoke suite in parallel. Test methods are split into one shard per worker process, each worker runs its shard with its own
+browser pool, and the results are merged into a single unittest style report. Shards are balanced with the test durations recorded
+on previous runs (see run_history.py), so the workers finish at about the same time, and each shard runs the tests most likely to
+fail first. Tests of a class with a setUpClass stay together, so the class fixture only runs once.
+
+    python parallel_runner.py -w 4                      full suite, 4 workers
+    python parallel_runner.py -w 4 SmokeTestProd.Specials
+    python parallel_runner.py -w 4 --budget 60          fast smoke: the most telling tests that fit in about 60 seconds
+    python parallel_runner.py -w 4 --stub --latency 0.05  offline, against stub_site.py
+    python parallel_runner.py -w 4 --cassette replay    offline, against a recording (see cassette.py)
+'''
+import argparse
+import heapq
+import os
+import sys
+import threading
+import time
+import traceback
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import results_sink
+from run_history import HISTORY_FILE, RunHistory, flatten, group_tests
+
+
+#Test ids grouped by what has to run in one process (see run_history.group_tests). Returns {group key: [test ids]} in load order.
+def test_groups(names):
+    groups = group_tests(flatten(unittest.defaultTestLoader.loadTestsFromNames(names)))
+    return {key: [test.id() for test in tests] for key, tests in groups.items()}
+
+
+#Longest processing time first: hand the slowest remaining group to the least loaded worker. Each shard then runs its groups
+#in the order given (fail-fast order).
+def shard(groups, order, workers, durations):
+    cost = {key: sum(durations[test_id] for test_id in groups[key]) for key in order}
+    heap = [(0.0, n, []) for n in range(min(workers, len(order)))]
+    for key in sorted(order, key=lambda key: -cost[key]):
+        load, n, keys = heapq.heappop(heap)
+        keys.append(key)
+        heapq.heappush(heap, (load + cost[key], n, keys))
+    rank = {key: n for n, key in enumerate(order)}
+    return [(load, [test_id for key in sorted(keys, key=rank.get) for test_id in groups[key]])
+            for load, n, keys in sorted(heap, key=lambda entry: entry[1])]
+
+
+#Collects plain data about each test so it can be sent back from a worker process. One record per test: failing subtests are
+#folded into it (see results_sink.SubTestFailures).
+class RecordingResult(results_sink.SubTestFailures, unittest.TestResult):
+    def __init__(self):
+        super().__init__()
+        self.buffer = True
+        self.records = []
+        self.started = {}
+
+    def startTest(self, test):
+        super().startTest(test)
+        self.started[test.id()] = time.perf_counter()
+        results_sink.test_started(test.id())
+
+    def record(self, test, outcome, details=''):
+        outcome, details, reason = self.fold_subtests(outcome, details)
+        start = self.started.get(test.id(), time.perf_counter())
+        self.records.append({'id': test.id(), 'description': str(test), 'outcome': outcome, 'details': details,
+                             'duration': time.perf_counter() - start})
+        results_sink.test_finished(test.id(), outcome, self.records[-1]['duration'], details, reason)
+
+    #Captured output already ends up in the failure details, so don't also echo it to the worker's stdout. A test whose only
+    #failures were in subtests gets no addFailure, so it's recorded here. Once the parent has seen too many failures
+    #(SMOKE_MAX_FAILURES) no further tests are started.
+    def stopTest(self, test):
+        if self.subtests_failed:
+            self.record(test, 'failure')
+        self._mirrorOutput = False
+        super().stopTest(test)
+        if results_sink.aborted():
+            self.stop()
+
+    def addSuccess(self, test):
+        super().addSuccess(test)
+        self.record(test, 'success')
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self.record(test, 'failure', self.failures[-1][1])
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self.record(test, 'error', self.errors[-1][1])
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self.record(test, 'skipped', reason)
+
+    def addExpectedFailure(self, test, err):
+        super().addExpectedFailure(test, err)
+        self.record(test, 'success')
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self.record(test, 'failure', 'Unexpected success')
+
+
+#Entry point of a worker process. A pool worker can run several shards and only runs its atexit handlers when the pool shuts
+#down, so the browser pool is closed here and its report goes back to the parent with the shard's records. The same goes for
+#the incremental fingerprint cache (fingerprints.py): the worker probes only the shard's pages and saves them at its end.
+def run_shard(ids):
+    result = RecordingResult()
+    try:
+        suite = unittest.defaultTestLoader.loadTestsFromNames(ids)
+        if 'fingerprints' in sys.modules:
+            sys.modules['fingerprints'].shard(flatten(suite))
+        results_sink.run_started()
+        suite.run(result)
+    except Exception:
+        result.records.append({'id': ids[0] if ids else '?', 'description': 'worker', 'outcome': 'error',
+                               'details': traceback.format_exc(), 'duration': 0.0})
+    report = ''
+    if 'driver_pool' in sys.modules:
+        pool = sys.modules['driver_pool'].pool
+        report = pool.report() if pool.started else ''
+        pool.close(quiet=True)
+    incremental = sys.modules['fingerprints'].cache.hand_off() if 'fingerprints' in sys.modules else None
+    return {'pid': os.getpid(), 'records': result.records, 'pool': report, 'incremental': incremental}
+
+
+#Prints the merged results the same way unittest.TextTestRunner does.
+def print_report(records, elapsed, stream=sys.stderr):
+    counts = {'failure': 0, 'error': 0, 'skipped': 0}
+    for record in records:
+        if record['outcome'] in ('failure', 'error'):
+            stream.write('=' * 70 + '\n%s: %s\n' % (record['outcome'].upper(), record['description']))
+            stream.write('-' * 70 + '\n%s\n' % record['details'])
+        counts[record['outcome']] = counts.get(record['outcome'], 0) + 1
+    stream.write('-' * 70 + '\nRan %d test%s in %.3fs\n\n' % (len(records), '' if len(records) == 1 else 's', elapsed))
+    parts = ['%s=%d' % (name, counts[outcome]) for name, outcome in
+             [('failures', 'failure'), ('errors', 'error'), ('skipped', 'skipped')] if counts[outcome]]
+    if counts['failure'] or counts['error']:
+        stream.write('FAILED (%s)\n' % ', '.join(parts))
+    else:
+        stream.write('OK%s\n' % (' (%s)' % ', '.join(parts) if parts else ''))
+    return not (counts['failure'] or counts['error'])
+
+
+#Writes the events streamed back by the workers (see results_sink.py) and raises the abort flag once the sink says so.
+def write_events(events, abort, sink):
+    while True:
+        event = events.get()
+        if event is None:
+            return
+        sink.write(event)
+        if sink.aborted:
+            abort.set()
+
+
+#Runs the tests in fail-fast order. With a budget (seconds of wall time) only the most telling tests that fit are run.
+def run(names, workers, history_file=HISTORY_FILE, budget=None, stream=sys.stderr):
+    history = RunHistory(history_file).load()
+    groups = test_groups(names)
+    ids = [test_id for group in groups.values() for test_id in group]
+    order = history.order(groups)
+    if budget:
+        order, expected = history.select(groups, budget * max(workers, 1))
+        stream.write('fast smoke: %d of %d tests fit in %.0fs (~%.1fs of test time)\n'
+                     % (sum(len(groups[key]) for key in order), len(ids), budget, expected))
+    shards = shard(groups, order, workers, history.durations(ids))
+    for n, (load, tests) in enumerate(shards):
+        stream.write('worker %d: %d tests, ~%.0fs expected\n' % (n, len(tests), load))
+    start = time.perf_counter()
+    records = []
+    context = get_context('spawn')
+    manager = context.Manager()
+    events, abort = manager.Queue(), manager.Event()
+    sink = results_sink.FileSink(progress=stream)
+    writer = threading.Thread(target=write_events, args=(events, abort, sink), daemon=True)
+    writer.start()
+    try:
+        with ProcessPoolExecutor(max_workers=len(shards) or 1, mp_context=context, initializer=results_sink.connect,
+                                 initargs=(events, abort)) as executor:
+            for outcome in executor.map(run_shard, [tests for load, tests in shards]):
+                records.extend(outcome['records'])
+                if outcome['pool']:
+                    stream.write('[worker %d] %s\n' % (outcome['pid'], outcome['pool']))
+                if outcome['incremental']:
+                    sys.modules['fingerprints'].cache.merge(outcome['incremental']) #Printed with the parent's report at exit
+    finally:
+        events.put(None)
+        writer.join()
+        sink.close()
+        manager.shutdown()
+    elapsed = time.perf_counter() - start
+    if sink.aborted:
+        stream.write('Aborted after %d failures (SMOKE_MAX_FAILURES=%d), %d of %d tests ran\n'
+                     % (sink.failures, sink.max_failures, len(records), sum(len(tests) for load, tests in shards)))
+    position = {test_id: n for n, test_id in enumerate(ids)}
+    records.sort(key=lambda record: position.get(record['id'], len(position)))
+    history.update(records)
+    history.save()
+    return print_report(records, elapsed, stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the smoke suite across several worker processes.')
+    parser.add_argument('tests', nargs='*', default=['SmokeTestProd'], help='modules, classes or test methods to run')
+    parser.add_argument('-w', '--workers', type=int, default=int(os.environ.get('SMOKE_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--history', default=HISTORY_FILE, help='file holding test durations and failure rates from earlier runs')
+    parser.add_argument('--budget', type=float, help='fast smoke: only run the tests most likely to fail that fit in this many seconds')
+    parser.add_argument('--stub', action='store_true', help='run against a local stub site instead of production')
+    parser.add_argument('--latency', type=float, default=0.0, help='latency added by the stub site, in seconds')
+    parser.add_argument('--cassette', choices=['record', 'replay'], help='record the run through a local proxy, or replay a recording')
+    args = parser.parse_args(argv)
+    stub = None
+    if args.stub:
+        from stub_site import StubSite
+        stub = StubSite(latency=args.latency).start()
+    elif args.cassette:
+        from cassette import Cassette
+        stub = Cassette(args.cassette).start()
+    if stub:
+        os.environ.update(stub.env()) #Workers are spawned, so they pick these up when they import sites.py
+    try:
+        return 0 if run(args.tests, args.workers, args.history, args.budget) else 1
+    finally:
+        if stub:
+            stub.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
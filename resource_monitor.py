@@ -0,0 +1,136 @@
+'''
+Browser memory monitoring for long smoke sessions. Pooled sessions load hundreds of pages (category loops, pagination), and
+Chrome's heap, DOM node count and process memory grow with them until the last tests of a run are noticeably slower than the
+first. Every SMOKE_MEMORY_EVERY-th page load of a session the monitor samples
+
+    js_heap_mb    used JS heap of the page (Runtime.getHeapUsage)
+    dom_nodes     DOM nodes alive in the renderer, including detached ones that leaked (Memory.getDOMCounters)
+    rss_mb        resident memory of chromedriver plus every Chrome process under it (psutil if installed, else /proc)
+
+and attaches the sample to the step in the trace (record['memory'], see timing.py). When a session's memory goes over the
+limit (RSS, or the JS heap where RSS can't be read) the pool is told to retire it: the test keeps its browser, and the session
+is quit instead of reset when it is released, so the next test starts on a fresh one.
+
+A sample costs two CDP calls and a walk of /proc (without psutil), so by default only every 20th load is sampled: often enough
+to catch a session growing past the limit, not so often that monitoring slows down the loads it watches. The end-of-run list
+of the heaviest catalog pages only covers the sampled loads; SMOKE_MEMORY_EVERY=1 samples every page when looking for them.
+
+Settings:
+    SMOKE_MEMORY_EVERY=N      sample every Nth page load of a session (default 20, 0 turns monitoring off)
+    SMOKE_MEMORY_LIMIT_MB=M   recycle a session above this much memory (default 1500, 0 never)
+    SMOKE_HEAVY_PAGES=N       pages in the end-of-run report (default 10)
+'''
+import atexit
+import os
+
+from driver_pool import cdp, pool
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+EVERY = int(os.environ.get('SMOKE_MEMORY_EVERY', '20'))
+LIMIT_MB = float(os.environ.get('SMOKE_MEMORY_LIMIT_MB', '1500'))
+HEAVY_PAGES = int(os.environ.get('SMOKE_HEAVY_PAGES', '10'))
+
+MB = 1024.0 * 1024.0
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+#URL -> [samples, peak JS heap MB, peak DOM nodes, peak RSS MB]
+pages = {}
+loads = {} #id(driver) -> page loads seen
+
+
+#Pids of `pid` and everything started under it, read from /proc. Empty where there is no /proc.
+def process_tree(pid):
+    parents = {}
+    try:
+        entries = [entry for entry in os.listdir('/proc') if entry.isdigit()]
+    except OSError:
+        return []
+    for entry in entries:
+        try:
+            with open('/proc/%s/stat' % entry) as f:
+                stat = f.read()
+        except OSError:
+            continue
+        parents.setdefault(int(stat.rpartition(')')[2].split()[1]), []).append(int(entry))
+    tree = [pid]
+    for parent in tree:
+        tree.extend(parents.get(parent, []))
+    return tree
+
+
+#Resident memory of chromedriver and every browser process under it, in MB, or None if it can't be read here.
+def tree_rss_mb(pid):
+    if psutil:
+        try:
+            process = psutil.Process(pid)
+            return sum(member.memory_info().rss for member in [process] + process.children(recursive=True)) / MB
+        except psutil.Error:
+            return None
+    total = 0
+    tree = process_tree(pid)
+    for member in tree:
+        try:
+            with open('/proc/%d/statm' % member) as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, ValueError, IndexError):
+            continue
+    return total / MB if tree else None
+
+
+def driver_pid(driver):
+    service = getattr(driver, 'service', None)
+    process = getattr(service, 'process', None)
+    return getattr(process, 'pid', None)
+
+
+def sample(driver):
+    heap = cdp(driver, 'Runtime.getHeapUsage')
+    counters = cdp(driver, 'Memory.getDOMCounters')
+    pid = driver_pid(driver)
+    rss = tree_rss_mb(pid) if pid else None
+    return {'js_heap_mb': round(heap['usedSize'] / MB, 1), 'dom_nodes': counters['nodes'],
+            'rss_mb': round(rss, 1) if rss is not None else None}
+
+
+#Sampler for TracedDriver: samples every EVERY-th page load, records the page and retires the session once it is over the
+#limit. Returns the sample, or None when this load isn't sampled.
+def monitor(driver, url):
+    if not EVERY:
+        return None
+    key = id(driver)
+    loads[key] = loads.get(key, 0) + 1
+    if loads[key] % EVERY:
+        return None
+    try:
+        memory = sample(driver)
+    except Exception:
+        return None
+    entry = pages.setdefault(url, [0, 0.0, 0, 0.0])
+    entry[0] += 1
+    entry[1] = max(entry[1], memory['js_heap_mb'])
+    entry[2] = max(entry[2], memory['dom_nodes'])
+    entry[3] = max(entry[3], memory['rss_mb'] or 0.0)
+    used = memory['rss_mb'] if memory['rss_mb'] is not None else memory['js_heap_mb']
+    if LIMIT_MB and used > LIMIT_MB and pool.retire(driver):
+        memory['recycle'] = True
+    return memory
+
+
+def report():
+    heaviest = sorted(pages.items(), key=lambda item: (-item[1][1], -item[1][2]))[:HEAVY_PAGES]
+    lines = ['Heaviest pages (peak JS heap, DOM nodes, browser RSS; %d sessions recycled over %.0f MB):' % (pool.retirements, LIMIT_MB)]
+    for url, (samples, heap, nodes, rss) in heaviest:
+        lines.append('  %7.1f MB %8d nodes %8s  %s' % (heap, nodes, '%.0f MB' % rss if rss else '-', url))
+    return '\n'.join(lines)
+
+
+def print_report():
+    if pages:
+        print(report())
+
+
+atexit.register(print_report)
@@ -0,0 +1,283 @@
+'''
+Streaming results for the smoke suite. Instead of waiting for unittest to print a summary at the end, every test start, every
+traced step (see timing.py) and every test outcome is written as one event while the run is going:
+
+    smoke_results.jsonl   one JSON object per event: event, test, url, site, page_type, seconds, outcome/ok, error/reason,
+                          and for tests the process that ran them and when they started/finished
+    smoke_results.xml     JUnit XML, one <testcase> appended per finished test
+
+so a deploy gate can tail the files and react to the first failure. Writes are buffered and flushed every couple of seconds,
+right away after a failure, and at the end of the run, so thousands of catalog entries don't mean thousands of disk writes.
+
+SMOKE_MAX_FAILURES=N aborts the run once N tests have failed (the remaining tests aren't started). SMOKE_RESULTS and SMOKE_JUNIT
+change the file names; set either one empty to turn that file off.
+
+Single process runs use StreamingResult (python SmokeTestProd.py does). parallel_runner.py streams the events of every worker
+back to the parent process, which writes the files and decides when to abort.
+'''
+import atexit
+import json
+import os
+import sys
+import time
+import unittest
+from xml.sax.saxutils import escape, quoteattr
+
+import sites
+import startup
+import timing
+from run_history import RunHistory
+
+RESULTS_FILE = os.environ.get('SMOKE_RESULTS', 'smoke_results.jsonl')
+JUNIT_FILE = os.environ.get('SMOKE_JUNIT', 'smoke_results.xml')
+MAX_FAILURES = int(os.environ.get('SMOKE_MAX_FAILURES', '0'))
+BUFFER_SIZE = 64 * 1024
+FLUSH_SECONDS = 2.0
+
+SITE_URLS = sorted([(sites.WSS, 'wss'), (sites.TRS, 'trs'), (sites.TRS_TEST, 'trs_test')], key=lambda item: -len(item[0]))
+
+
+def site_of(url):
+    for base, name in SITE_URLS:
+        if url and url.startswith(base):
+            return name
+    return None
+
+
+#Appends <testcase> elements as tests finish. The closing tag is written by close(), also when the run was aborted.
+class JUnitWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8', buffering=BUFFER_SIZE)
+        self.file.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuite name="smoke" timestamp=%s>\n'
+                        % quoteattr(time.strftime('%Y-%m-%dT%H:%M:%S')))
+
+    def add(self, event):
+        classname, _, name = event['test'].rpartition('.')
+        self.file.write('  <testcase classname=%s name=%s time="%.3f">' % (quoteattr(classname), quoteattr(name), event['seconds']))
+        if event['outcome'] in ('failure', 'error'):
+            self.file.write('<%s message=%s>%s</%s>' % (event['outcome'], quoteattr(event['reason'] or ''),
+                                                        escape(event['details'] or ''), event['outcome']))
+        elif event['outcome'] == 'skipped':
+            self.file.write('<skipped message=%s/>' % quoteattr(event['reason'] or ''))
+        self.file.write('</testcase>\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.write('</testsuite>\n')
+        self.file.close()
+
+
+class FileSink:
+    def __init__(self, results_file=RESULTS_FILE, junit_file=JUNIT_FILE, max_failures=MAX_FAILURES, progress=None):
+        self.jsonl = open(results_file, 'a', encoding='utf-8', buffering=BUFFER_SIZE) if results_file else None
+        self.junit = JUnitWriter(junit_file) if junit_file else None
+        self.max_failures = max_failures
+        self.progress = progress
+        self.counts = {}
+        self.last_step = {} #test id -> (url, page_type, site) of its latest step
+        self.last_flush = time.monotonic()
+        self.closed = False
+
+    def write(self, event):
+        if event['event'] == 'step':
+            self.last_step[event['test']] = (event['url'], event['page_type'], event['site'])
+        elif event['event'] == 'test':
+            url, page_type, site = self.last_step.pop(event['test'], (None, None, None))
+            event.setdefault('url', url)
+            event.setdefault('page_type', page_type)
+            event.setdefault('site', site)
+            self.counts[event['outcome']] = self.counts.get(event['outcome'], 0) + 1
+            if self.junit:
+                self.junit.add(event)
+            if self.progress:
+                self.progress.write('[%d] %-7s %s (%.1fs)%s\n' % (sum(self.counts.values()), event['outcome'], event['test'],
+                                                                event['seconds'], ': ' + event['reason'] if event['reason'] else ''))
+        if self.jsonl:
+            self.jsonl.write(json.dumps(event, sort_keys=True) + '\n')
+        if event.get('outcome') in ('failure', 'error') or time.monotonic() - self.last_flush >= FLUSH_SECONDS:
+            self.flush()
+
+    @property
+    def failures(self):
+        return self.counts.get('failure', 0) + self.counts.get('error', 0)
+
+    @property
+    def aborted(self):
+        return bool(self.max_failures) and self.failures >= self.max_failures
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        for output in (self.jsonl, self.junit):
+            if output:
+                output.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for output in (self.jsonl, self.junit):
+            if output:
+                output.close()
+
+
+#Worker side of a parallel run: events go to the parent over a queue, and the parent says when to abort.
+class QueueSink:
+    def __init__(self, queue, abort):
+        self.queue = queue
+        self.abort = abort
+
+    def write(self, event):
+        self.queue.put(event)
+
+    @property
+    def aborted(self):
+        return self.abort.is_set()
+
+    def close(self):
+        pass
+
+
+sink = None
+
+
+def current():
+    global sink
+    if sink is None:
+        sink = FileSink()
+        atexit.register(sink.close)
+    return sink
+
+
+#Used as the initializer of parallel_runner's worker processes.
+def connect(queue, abort):
+    global sink
+    sink = QueueSink(queue, abort)
+
+
+def aborted():
+    return current().aborted
+
+
+#timing.py listener: every traced step becomes a step event.
+def step(record):
+    current().write(dict(record, event='step', site=site_of(record['url'])))
+
+
+timing.listeners.append(step)
+
+
+#A test process is about to start running tests (its imports and test loading are done).
+def run_started():
+    startup.mark('tests_loaded')
+    current().write({'event': 'run', 'started': time.time(), 'pid': os.getpid()})
+
+
+def test_started(test_id):
+    startup.mark('first_test')
+    current().write({'event': 'start', 'test': test_id, 'started': time.time(), 'pid': os.getpid()})
+
+
+def last_line(details):
+    lines = [line.strip() for line in (details or '').strip().splitlines() if line.strip()]
+    return lines[-1] if lines else None
+
+
+def test_finished(test_id, outcome, seconds, details='', reason=None):
+    if reason is None:
+        reason = last_line(details) if outcome in ('failure', 'error') else (details if outcome == 'skipped' else None)
+    current().write({'event': 'test', 'test': test_id, 'outcome': outcome, 'seconds': round(seconds, 3), 'reason': reason,
+                     'details': details if outcome in ('failure', 'error') else None, 'finished': time.time(), 'pid': os.getpid()})
+
+
+#Collects the failing subTests of the running test, so the test still ends with a single outcome (one event, one record)
+#however many of its subtests failed. Also used by parallel_runner's RecordingResult.
+class SubTestFailures:
+    def startTest(self, test):
+        super().startTest(test)
+        self.subtest_failures = []
+
+    def addSubTest(self, test, subtest, err):
+        super().addSubTest(test, subtest, err)
+        if err is not None:
+            kind, failed = ('failure', self.failures) if issubclass(err[0], test.failureException) else ('error', self.errors)
+            self.subtest_failures.append((kind, str(subtest)[len(str(test)):].strip(), failed[-1][1]))
+
+    #(outcome, details, reason) of the test with its failing subtests folded in; the reason is None when there were none.
+    def fold_subtests(self, outcome, details=''):
+        failures, self.subtest_failures = getattr(self, 'subtest_failures', []), []
+        if not failures:
+            return outcome, details, None
+        own = outcome in ('failure', 'error')
+        kinds = [kind for kind, description, text in failures] + ([outcome] if own else [])
+        parts = ['%s\n%s' % (description, text) for kind, description, text in failures] + ([details] if own and details else [])
+        reason = '%d of its subtests failed, first %s: %s' % (len(failures), failures[0][1], last_line(failures[0][2]))
+        return 'error' if 'error' in kinds else 'failure', '\n'.join(parts), reason
+
+    @property
+    def subtests_failed(self):
+        return bool(getattr(self, 'subtest_failures', None))
+
+
+#TextTestResult that streams events as tests run and stops the run once SMOKE_MAX_FAILURES is reached. At the end the run's
+#durations and outcomes go into the run history (run_history.py), as parallel_runner.py does for its runs.
+class StreamingResult(SubTestFailures, unittest.TextTestResult):
+    def startTestRun(self):
+        super().startTestRun()
+        self.records = []
+        run_started()
+
+    def stopTestRun(self):
+        super().stopTestRun()
+        history = RunHistory().load()
+        history.update(self.records)
+        history.save()
+
+    def startTest(self, test):
+        super().startTest(test)
+        self._started_at = time.perf_counter()
+        test_started(test.id())
+
+    #A test whose only failures were in subtests gets no addFailure, so its event is written when it stops.
+    def stopTest(self, test):
+        if self.subtests_failed:
+            self.finished(test, 'failure')
+        super().stopTest(test)
+
+    def finished(self, test, outcome, details=''):
+        outcome, details, reason = self.fold_subtests(outcome, details)
+        seconds = time.perf_counter() - getattr(self, '_started_at', time.perf_counter())
+        test_finished(test.id(), outcome, seconds, details, reason)
+        getattr(self, 'records', []).append({'id': test.id(), 'outcome': outcome, 'duration': seconds})
+        if aborted():
+            self.stream.writeln('\nAborting: %d tests failed (SMOKE_MAX_FAILURES=%d)' % (current().failures, MAX_FAILURES))
+            self.stop()
+
+    def addSuccess(self, test):
+        super().addSuccess(test)
+        self.finished(test, 'success')
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self.finished(test, 'failure', self.failures[-1][1])
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self.finished(test, 'error', self.errors[-1][1])
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self.finished(test, 'skipped', reason)
+
+    def addExpectedFailure(self, test, err):
+        super().addExpectedFailure(test, err)
+        self.finished(test, 'success')
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self.finished(test, 'failure', 'Unexpected success')
+
+
+def runner(stream=sys.stderr, verbosity=1):
+    return unittest.TextTestRunner(stream=stream, verbosity=verbosity, resultclass=StreamingResult)
@@ -0,0 +1,152 @@
+'''
+Run history for the smoke suite: how long each test takes and how often it fails, kept in .smoke_history.json (SMOKE_HISTORY).
+It is used to
+
+    . run the tests most likely to fail per second of runtime first, so a broken build shows up in the first few tests instead
+      of somewhere in the full run
+    . balance parallel_runner.py's worker shards by expected duration
+    . with parallel_runner.py --budget SECONDS, pick the subset of tests worth the most within that much wall time ("fast smoke")
+
+Both ways of running the suite record it and run in fail-fast order: parallel_runner.py, and python SmokeTestProd.py (its
+load_tests reorders the module's tests, and results_sink.StreamingResult records the run). Naming single classes or tests on the
+command line runs them in the order given.
+
+Durations and failure rates are moving averages, so a test that was fixed stops being treated as flaky after a few green runs.
+Tests with no history are assumed to fail half the time, so new tests run early.
+
+File format, one entry per test id:  [runs, failure rate, average seconds, last outcome failed (0/1), last run (epoch seconds)]
+'''
+import json
+import os
+import sys
+import time
+import unittest
+
+HISTORY_FILE = os.environ.get('SMOKE_HISTORY', '.smoke_history.json')
+DURATION_SMOOTHING = 0.5 #Weight of the newest run when updating the average duration
+FAILURE_SMOOTHING = 0.3 #Weight of the newest run when updating the failure rate
+NEW_TEST_FAILURE_RATE = 0.5
+MIN_FAILURE_RATE = 0.01 #So tests that never failed are still ordered by how cheap they are
+DEFAULT_DURATION = 30.0
+
+
+#Ids of a module run as a script (python SmokeTestProd.py) start with __main__. The history keys them by the module's name,
+#so both ways of running the suite share its entries.
+def history_id(test_id):
+    script = getattr(sys.modules['__main__'], '__file__', None)
+    if test_id.startswith('__main__.') and script:
+        return os.path.splitext(os.path.basename(script))[0] + test_id[len('__main__'):]
+    return test_id
+
+
+#The test cases in a suite, nested suites included.
+def flatten(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from flatten(test)
+        else:
+            yield test
+
+
+#Test cases grouped by what has to run in one go: all tests of a class that has its own setUpClass, otherwise single tests.
+#Returns {group key: [test cases]} in the order given.
+def group_tests(tests):
+    groups = {}
+    for test in tests:
+        cls = type(test)
+        shared = getattr(cls.setUpClass, '__func__', None) is not unittest.TestCase.setUpClass.__func__
+        key = '%s.%s' % (cls.__module__, cls.__qualname__) if shared else test.id()
+        groups.setdefault(key, []).append(test)
+    return groups
+
+
+#The tests of `suite` in fail-fast order, as a new suite (for a module's load_tests).
+def fail_fast(suite, history_file=HISTORY_FILE):
+    groups = group_tests(flatten(suite))
+    ids = {key: [history_id(test.id()) for test in tests] for key, tests in groups.items()}
+    order = RunHistory(history_file).load().order(ids)
+    return unittest.TestSuite([test for key in order for test in groups[key]])
+
+
+class RunHistory:
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.tests = {}
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.tests = json.load(f)
+        except (OSError, ValueError):
+            self.tests = {}
+        return self
+
+    def save(self):
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.tests, f, separators=(',', ':'), sort_keys=True)
+        os.replace(self.path + '.tmp', self.path)
+
+    #Folds in the records of a run (dicts with id, outcome and duration, as parallel_runner and results_sink collect them).
+    #Skips don't count.
+    def update(self, records):
+        now = int(time.time())
+        for record in records:
+            if record['outcome'] == 'skipped':
+                continue
+            failed = 1 if record['outcome'] in ('failure', 'error') else 0
+            test_id = history_id(record['id'])
+            entry = self.tests.get(test_id)
+            if entry is None:
+                entry = [0, float(failed), record['duration'], failed, now]
+            else:
+                entry[1] = FAILURE_SMOOTHING * failed + (1 - FAILURE_SMOOTHING) * entry[1]
+                entry[2] = DURATION_SMOOTHING * record['duration'] + (1 - DURATION_SMOOTHING) * entry[2]
+            entry[0] += 1
+            entry[1] = round(entry[1], 4)
+            entry[2] = round(entry[2], 3)
+            entry[3] = failed
+            entry[4] = now
+            self.tests[test_id] = entry
+
+    #Expected seconds for each test. Tests without history get the median of the known ones.
+    def durations(self, ids):
+        known = sorted(self.tests[test_id][2] for test_id in ids if test_id in self.tests)
+        default = known[len(known) // 2] if known else DEFAULT_DURATION
+        return {test_id: self.tests[test_id][2] if test_id in self.tests else default for test_id in ids}
+
+    def failure_rate(self, test_id):
+        entry = self.tests.get(test_id)
+        if entry is None:
+            return NEW_TEST_FAILURE_RATE
+        return max(entry[1], MIN_FAILURE_RATE)
+
+    #Chance of failing per second of runtime for each group of tests. Groups are tests that have to run together (they share a
+    #setUpClass); `groups` maps a group key to its test ids.
+    def scores(self, groups):
+        durations = self.durations([test_id for ids in groups.values() for test_id in ids])
+        scores = {}
+        for key, ids in groups.items():
+            survive = 1.0
+            for test_id in ids:
+                survive *= 1 - self.failure_rate(test_id)
+            scores[key] = (1 - survive) / max(sum(durations[test_id] for test_id in ids), 0.1)
+        return scores
+
+    #Groups ordered fail-fast: most likely to fail per second first, ties broken by the cheaper group.
+    def order(self, groups):
+        scores = self.scores(groups)
+        durations = self.durations([test_id for ids in groups.values() for test_id in ids])
+        return sorted(groups, key=lambda key: (-scores[key], sum(durations[test_id] for test_id in groups[key])))
+
+    #Fast smoke: the groups worth the most that fit into `seconds` of test time, in fail-fast order. Greedy by score, which
+    #is close to the best packing when single tests are small next to the budget.
+    def select(self, groups, seconds):
+        durations = self.durations([test_id for ids in groups.values() for test_id in ids])
+        chosen = []
+        spent = 0.0
+        for key in self.order(groups):
+            cost = sum(durations[test_id] for test_id in groups[key])
+            if spent + cost <= seconds:
+                chosen.append(key)
+                spent += cost
+        return chosen, spent
@@ -0,0 +1,164 @@
+'''
+The smoke suite's user journeys as plain HTTP steps. Each journey is defined once here and used two ways: run once per catalog
+entry as a smoke check (HttpFastPath.test_scenarios, SMOKE_HTTP=1), and replayed by many virtual users at a time as a load test
+(load_test.py).
+
+    search_paginate        search for a catalog term, then walk pages 2..depth of the results
+    category_filter_sort   open a category, follow one of its filter links, then one of the sort options of the filtered listing
+    search_within          search (or open the listing), then search within the results for the entry's within= text
+
+Searches go through the search form's URL (/search.cfm?searchval=...), which redirects to the results page like the site does
+for a visitor. The later steps follow links on the page before them, the way a visitor clicks: where a page offers several
+(filters, sort options) one is picked with the scenario's random generator, so virtual users spread over the site's URLs the
+way real visitors do; the smoke check uses a fixed seed. A step whose page doesn't pass (status or markers) ends the journey.
+'''
+import asyncio
+import html
+import random
+import re
+import time
+from urllib.parse import quote_plus, urlencode, urljoin
+
+from catalog import catalog
+from http_checks import Check, CheckResult, evaluate, sort_urls
+from http_client import CONCURRENCY, AsyncHttpClient
+from pagination import count_pages, depth_for, page_url
+
+SEARCH_URLS = {'wss': '/search.cfm?searchval=', 'trs': '/search?search_values=', 'trs_test': '/search?search_values='}
+
+#What has to be on every page of a listing after the first, per site (as in Searching).
+PAGE_MARKERS = {'wss': ["productBox1", 'class="filter-list__content"'],
+                'trs': ['ag-details-block item', 'class="filters"'],
+                'trs_test': ['ag-details-block item', 'class="filters"']}
+
+FILTER_LINK = re.compile(r'<a href="([^"]*[?&](?:filter|vendor|price|category)=[^"]*)"')
+
+
+class Step:
+    def __init__(self, name, url, markers=(), required=True):
+        self.name = name
+        self.url = url #a URL, or a function (responses so far, rng) -> URL, or None when there's nothing to follow
+        self.markers = list(markers)
+        self.required = required #A step that isn't required is skipped when there is no URL for it, e.g. a page past the last one
+
+
+class Scenario:
+    def __init__(self, flow, entry, steps):
+        self.flow = flow
+        self.entry = entry
+        self.steps = steps
+
+    @property
+    def name(self):
+        return '%s %s' % (self.flow, self.entry.name)
+
+
+#Outcome of one walk through a scenario: (step, CheckResult) for every step that ran.
+class ScenarioRun:
+    def __init__(self, scenario):
+        self.scenario = scenario
+        self.results = []
+
+    @property
+    def problems(self):
+        return ['%s %s: %s' % (step.name, result.url, problem) for step, result in self.results for problem in result.problems]
+
+    @property
+    def passed(self):
+        return not self.problems
+
+    @property
+    def elapsed(self):
+        return sum(result.elapsed for step, result in self.results)
+
+
+def search_url(entry):
+    return entry.base + SEARCH_URLS[entry.site] + quote_plus(entry.target)
+
+
+#Step URL that follows one of the links `links(html, page url)` finds on the previous page.
+def follow(links):
+    def url(responses, rng):
+        found = links(responses[-1].text, responses[-1].url)
+        return rng.choice(found) if found else None
+    return url
+
+
+#Filter facet links on a listing. Pagination links keep the listing's filters, so links to a page number don't count.
+def filter_links(text, page):
+    return sorted(set(urljoin(page, html.unescape(href)) for href in FILTER_LINK.findall(text) if 'page=' not in href))
+
+
+def search_paginate(entry):
+    steps = [Step('search', search_url(entry), entry.markers)]
+    for page in range(2, depth_for(entry.depth) + 1):
+        steps.append(Step('paginate', lambda responses, rng, page=page:
+                          page_url(responses[0].url, page) if count_pages(responses[0].text) >= page else None,
+                          PAGE_MARKERS[entry.site], required=False))
+    return steps
+
+
+def category_filter_sort(entry):
+    return [Step('category', entry.url, entry.markers),
+            Step('filter', follow(filter_links), ["productBox1"]),
+            Step('sort', follow(sort_urls), ["productBox1"])]
+
+
+def search_within(entry):
+    within = urlencode({'withinval': entry.params['within']})
+    return [Step('search', search_url(entry) if entry.is_term else entry.url, entry.markers),
+            Step('search_within', lambda responses, rng: responses[-1].url + ('&' if '?' in responses[-1].url else '?') + within,
+                 ["productBox1"])]
+
+
+#flow -> (catalog selection, steps for an entry)
+FLOWS = {
+    'search_paginate': ((('top10',), {'page_type': 'search'}), search_paginate),
+    'category_filter_sort': (((), {'site': 'wss', 'page_type': 'category'}), category_filter_sort),
+    'search_within': ((('within',), {}), search_within),
+}
+
+
+#One Scenario per flow and catalog entry, for the flows named (default all). The run's SMOKE_TAGS apply.
+def build(flows=None):
+    scenarios = []
+    for flow in flows or FLOWS:
+        (tags, selection), steps = FLOWS[flow]
+        scenarios += [Scenario(flow, entry, steps(entry)) for entry in catalog.select(*tags, **selection)]
+    return scenarios
+
+
+#Walks `scenario` with `client`, a step at a time. `on_step(scenario, step, result)` is called as each step finishes.
+async def run_scenario(client, scenario, rng=None, on_step=None):
+    rng = rng or random.Random(0)
+    run = ScenarioRun(scenario)
+    responses = []
+    for step in scenario.steps:
+        url = step.url(responses, rng) if callable(step.url) else step.url
+        if url is None and not step.required:
+            continue
+        start = time.perf_counter()
+        if url is None:
+            result = CheckResult(Check(responses[-1].url), problems=['nothing to follow for %s' % step.name])
+        else:
+            try:
+                response = await client.get(url)
+            except Exception as exc:
+                response = exc
+            result = evaluate(Check(url, step.markers), response)
+        result.elapsed = time.perf_counter() - start
+        run.results.append((step, result))
+        if on_step:
+            on_step(scenario, step, result)
+        if not result.passed:
+            break
+        responses.append(response)
+    return run
+
+
+#Runs every scenario once, concurrently, with one pooled client. `cookies` is a CookieJar to start from (the TRS store).
+def run_scenarios(scenarios, concurrency=CONCURRENCY, cookies=None, seed=0):
+    async def run():
+        async with AsyncHttpClient(concurrency, cookies=cookies) as client:
+            return await asyncio.gather(*[run_scenario(client, scenario, random.Random(seed)) for scenario in scenarios])
+    return asyncio.run(run())
@@ -0,0 +1,14 @@
+'''
+Base URLs for the sites under test. They default to production, but can be pointed somewhere else (a local stand-in site,
+a staging box) through the environment, e.g. SMOKE_WSS_URL=http://127.0.0.1:8001.
+'''
+import os
+
+WSS = os.environ.get('SMOKE_WSS_URL', 'https://www.webstaurantstore.com').rstrip('/')
+TRS = os.environ.get('SMOKE_TRS_URL', 'https://www.therestaurantstore.com').rstrip('/')
+TRS_TEST = os.environ.get('SMOKE_TRS_TEST_URL', 'https://test.therestaurantstore.com').rstrip('/')
+
+ALL = [WSS, TRS, TRS_TEST]
+
+#Environment variable for each site, used when starting a run against somewhere other than production.
+ENV_VARS = {'wss': 'SMOKE_WSS_URL', 'trs': 'SMOKE_TRS_URL', 'trs_test': 'SMOKE_TRS_TEST_URL'}
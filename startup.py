@@ -0,0 +1,190 @@
+'''
+Harness startup. Before the first test could run, every process used to import the whole selenium stack (and
+webdriver_manager) and let webdriver.Chrome() look for a chromedriver on each start. Now:
+
+    . the Chrome binary and a chromedriver that matches it are resolved once and cached in .smoke_cache/chromedriver.json
+      (SMOKE_DRIVER_CACHE), keyed by the Chrome version. Later runs, parallel workers and offline runs take the pair from the
+      cache; a new Chrome version resolves again. The chromedriver comes from SMOKE_CHROMEDRIVER, the PATH, or is downloaded
+      with webdriver_manager (only imported for that).
+    . selenium.webdriver is only imported when a browser is actually started (driver_pool.new_driver), so HTTP-only runs
+      don't load it.
+    . time to first test is measured from process start: when the tests were loaded, when the first test started and when
+      the first browser was ready. It's printed at the end of a run and sent with the streamed results (results_sink.py).
+
+SMOKE_CHROME and SMOKE_CHROMEDRIVER point at the binaries directly.
+'''
+import atexit
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+CACHE_FILE = os.environ.get('SMOKE_DRIVER_CACHE', os.path.join('.smoke_cache', 'chromedriver.json'))
+CHROME = os.environ.get('SMOKE_CHROME')
+CHROMEDRIVER = os.environ.get('SMOKE_CHROMEDRIVER')
+CHROME_NAMES = ['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome']
+WINDOWS_CHROME = [r'%PROGRAMFILES%\Google\Chrome\Application\chrome.exe', r'%PROGRAMFILES(X86)%\Google\Chrome\Application\chrome.exe',
+                  r'%LOCALAPPDATA%\Google\Chrome\Application\chrome.exe']
+MAC_CHROME = ['/Applications/Google Chrome.app/Contents/MacOS/Google Chrome']
+
+VERSION = re.compile(r'(\d+)\.\d+\.\d+(?:\.\d+)?')
+
+
+class DriverSetupError(Exception):
+    pass
+
+
+#When this process started, in epoch seconds. From /proc where there is one, else when this module was imported.
+def process_started():
+    try:
+        with open('/proc/self/stat') as f:
+            ticks = int(f.read().rpartition(')')[2].split()[19])
+        with open('/proc/stat') as f:
+            boot = next(int(line.split()[1]) for line in f if line.startswith('btime'))
+        return boot + ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration, AttributeError):
+        return time.time()
+
+
+PROCESS_STARTED = process_started()
+marks = {} #name -> seconds after process start, first time only
+
+
+def mark(name):
+    if name not in marks:
+        marks[name] = round(time.time() - PROCESS_STARTED, 3)
+    return marks[name]
+
+
+def chrome_binary():
+    if CHROME:
+        return CHROME
+    for name in CHROME_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    for path in [os.path.expandvars(path) for path in WINDOWS_CHROME] + MAC_CHROME:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+#Version string a binary reports, e.g. '118.0.5993.70'. chrome.exe on Windows doesn't print one, so there it comes from the
+#registry.
+def binary_version(path):
+    try:
+        output = subprocess.run([path, '--version'], capture_output=True, text=True, timeout=30).stdout
+    except (OSError, subprocess.SubprocessError):
+        output = ''
+    match = VERSION.search(output)
+    if match:
+        return match.group(0)
+    if sys.platform == 'win32' and 'chromedriver' not in os.path.basename(path).lower():
+        import winreg
+        try:
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r'Software\Google\Chrome\BLBeacon') as key:
+                return winreg.QueryValueEx(key, 'version')[0]
+        except OSError:
+            pass
+    return None
+
+
+def major(version):
+    return version.split('.')[0] if version else None
+
+
+def load_cache():
+    try:
+        with open(CACHE_FILE, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cache.setdefault('binaries', {})
+    cache.setdefault('drivers', {})
+    return cache
+
+
+def save_cache(cache):
+    os.makedirs(os.path.dirname(CACHE_FILE) or '.', exist_ok=True)
+    with open(CACHE_FILE + '.%d.tmp' % os.getpid(), 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(CACHE_FILE + '.%d.tmp' % os.getpid(), CACHE_FILE)
+
+
+#Version of a binary, from the cache while the file is unchanged (same size and modification time), so Chrome isn't started
+#just to ask for its version.
+def cached_version(cache, path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    fingerprint = [int(stat.st_mtime), stat.st_size]
+    entry = cache['binaries'].get(path)
+    if entry and entry[:2] == fingerprint:
+        return entry[2]
+    version = binary_version(path)
+    if version:
+        cache['binaries'][path] = fingerprint + [version]
+    return version
+
+
+def find_chromedriver(cache, chrome_version):
+    candidates = [CHROMEDRIVER] if CHROMEDRIVER else [shutil.which('chromedriver')]
+    for path in filter(None, candidates):
+        if major(cached_version(cache, path)) == major(chrome_version):
+            return path
+    if CHROMEDRIVER:
+        raise DriverSetupError('SMOKE_CHROMEDRIVER=%s is not for Chrome %s' % (CHROMEDRIVER, chrome_version))
+    from webdriver_manager.chrome import ChromeDriverManager #Only needed when nothing local matches
+    return ChromeDriverManager().install()
+
+
+resolved = None
+
+
+#(Chrome binary, chromedriver) for this machine, or (None, None) when no Chrome is found and Selenium should look itself.
+def resolve():
+    global resolved
+    if resolved:
+        return resolved
+    start = time.perf_counter()
+    cache = load_cache()
+    chrome = chrome_binary()
+    version = cached_version(cache, chrome) if chrome else None
+    if not version:
+        resolved = (None, None)
+        return resolved
+    entry = cache['drivers'].get(version)
+    if entry and entry['chrome'] == chrome and os.path.isfile(entry['chromedriver']):
+        marks.setdefault('driver_source', 'cache')
+    else:
+        chromedriver = find_chromedriver(cache, version)
+        driver_version = cached_version(cache, chromedriver)
+        if major(driver_version) != major(version):
+            raise DriverSetupError('chromedriver %s (%s) does not match Chrome %s (%s)' % (driver_version, chromedriver, version, chrome))
+        entry = cache['drivers'][version] = {'chrome': chrome, 'chromedriver': chromedriver, 'driver_version': driver_version,
+                                             'resolved': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        marks.setdefault('driver_source', 'resolved')
+    save_cache(cache)
+    marks.setdefault('driver_seconds', round(time.perf_counter() - start, 3))
+    resolved = (entry['chrome'], entry['chromedriver'])
+    return resolved
+
+
+def report():
+    parts = ['tests loaded %.2fs' % marks['tests_loaded']] if 'tests_loaded' in marks else []
+    if 'first_browser' in marks:
+        parts.append('first browser %.2fs (chromedriver from %s, %.2fs)' % (marks['first_browser'], marks.get('driver_source', '?'),
+                                                                           marks.get('driver_seconds', 0.0)))
+    return 'Startup: first test after %.2fs%s' % (marks['first_test'], ' (%s)' % ', '.join(parts) if parts else '')
+
+
+def print_report():
+    if 'first_test' in marks:
+        print(report())
+
+
+atexit.register(print_report)
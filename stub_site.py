@@ -0,0 +1,369 @@
+'''
+Local stand-in for WSS and TRS so the smoke suite can run offline and be benchmarked. Every page is generated from the URL,
+with the same markers the smoke tests look for (productBox1, filter-list box, category-grid, ag-details-block item, sort options,
+pagination, filter facets, the autosuggest list, Food Service Resources results, ...). Each site gets its own port, so tests are pointed at it through the variables in sites.py:
+
+    python stub_site.py --latency 0.05
+    SMOKE_WSS_URL=http://127.0.0.1:8001 SMOKE_TRS_URL=http://127.0.0.1:8002 SMOKE_TRS_TEST_URL=http://127.0.0.1:8003 python SmokeTestProd.py
+
+Or from Python:  with StubSite() as stub: os.environ.update(stub.env())
+'''
+import argparse
+import hashlib
+import html
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import sites
+
+PAGE_COUNT = 8
+PRODUCTS_PER_PAGE = 12
+
+#Facets in the WSS filter sidebar: (id suffix of #collapse<name>, query parameter, [(label, value)]). The labels match the ones
+#the Filters tests click.
+FACETS = [('Shape', 'filter', [('Oval', 'shape:oval'), ('Round', 'shape:round'), ('Square', 'shape:square')]),
+          ('Type', 'filter', [('Dial', 'type:dial'), ('Digital', 'type:digital'),
+                              ('Refrigerator / Freezer Thermometers', 'type:refrigerator-freezer-thermometers')]),
+          ('Minimum_Temperature', 'filter', [('-40 Degrees F', 'minimum-temperature:-40-degrees-f'),
+                                             ('0 Degrees F', 'minimum-temperature:0-degrees-f')]),
+          ('Vendor', 'vendor', [('Dormont', 'Dormont'), ('Avantco', 'Avantco'), ('Regency', 'Regency'),
+                                ('T&S Brass and Bronze Works', 'T-S-Brass-and-Bronze-Works')]),
+          ('T___S_Accessories', 'filter', [('Hoses', 't-s-accessories:hoses'), ('Swivelink', 't-s-accessories:swivelink')]),
+          ('Price', 'price', [('Under $100', '0,100'), ('$100 - $200', '100,200'), ('Over $200', '200,')])]
+
+#Category filter sections on search results: #section<n>, [(label, category id)]
+CATEGORY_SECTIONS = [[('Dinner Plates', '3787'), ('Salad Plates', '3788')], [('Disposable Plates', '14177')]]
+
+#Filter parameters in the order the site writes them into URLs.
+PARAM_ORDER = ['filter', 'vendor', 'price', 'category']
+
+AUTOSUGGEST = {'ham': ['ham', 'hamburger press', 'hamburger patty paper', 'hamburger buns', 'hammer', 'hamper',
+                       'hamilton beach', 'hamilton beach blender', 'ham slicer', 'hamburger patty maker', 'hamburger mold',
+                       'Hamburger Presses', 'Hamburger Patty Paper', 'Hamilton Beach Blenders', 'Hammers', 'Hampers',
+                       'Ham Slicers', 'Hamburger Molds', 'Hamilton Beach Mixers', 'Arm & Hammer']}
+
+SORT_GROUPS = [('Price', ['price_asc', 'price_desc']),
+              ('Rating', ['rating_asc', 'rating_desc']),
+              ('Newest', ['date_desc', 'date_asc'])]
+
+
+def slug(text):
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+def with_params(path, params):
+    return path + ('?' + urlencode(params, safe=',:') if params else '')
+
+
+#`search` is the site's search form, which is in the header of every page like on the real sites.
+def layout(title, body, search=''):
+    return ('<!DOCTYPE html><html><head><meta charset="utf-8"><title>%s</title></head><body>'
+            '<div id="header">%s</div><div id="main">%s</div><div id="footer"></div></body></html>'
+            % (html.escape(title), search, body))
+
+
+#Pagination links always point at ?page=N on the current listing, the same way the real sites build them.
+def pagination(path, params, page):
+    params = [(k, v) for k, v in params if k != 'page']
+    items = []
+    for n in range(1, PAGE_COUNT + 1):
+        items.append('<li><a href="%s">%d</a></li>' % (html.escape(with_params(path, params + [('page', n)])), n))
+    if page < PAGE_COUNT:
+        items.append('<li><a href="%s" rel="next"><i class="icon-right-open"></i></a></li>'
+                     % html.escape(with_params(path, params + [('page', page + 1)])))
+    return '<div class="pagination"><ul>%s</ul></div>' % ''.join(items)
+
+
+#Link for a filter option: the current filters with this one switched on or off, without page and order.
+def toggled(path, params, key, value):
+    params = [(k, v) for k, v in params if k not in ('page', 'order')]
+    params = [(k, v) for k, v in params if (k, v) != (key, value)] if (key, value) in params else params + [(key, value)]
+    params.sort(key=lambda item: PARAM_ORDER.index(item[0]) if item[0] in PARAM_ORDER else len(PARAM_ORDER))
+    return html.escape(with_params(path, params))
+
+
+def facets(path, params):
+    boxes = []
+    for name, key, options in FACETS:
+        links = ''.join('<a href="%s"><label><label><div>%s</div></label></label></a>'
+                        % (toggled(path, params, key, value), html.escape(label)) for label, value in options)
+        boxes.append('<div id="collapse%s">%s</div>' % (name, links))
+    return ''.join(boxes)
+
+
+def category_sections(path, params):
+    return ''.join('<div id="section%d">%s</div>' % (n, ''.join('<a href="%s"><label><span>%s</span></label></a>'
+                                                                 % (toggled(path, params, 'category', category), html.escape(label))
+                                                                 for label, category in categories))
+                   for n, categories in enumerate(CATEGORY_SECTIONS, 1))
+
+
+def sort_options(path, params):
+    params = [(k, v) for k, v in params if k not in ('order', 'page')]
+    groups = []
+    for label, orders in SORT_GROUPS:
+        options = ''.join('<option value="%s">%s</option>' % (html.escape(with_params(path, params + [('order', order)])), order)
+                          for order in orders)
+        groups.append('<optgroup label="%s">%s</optgroup>' % (label, options))
+    return '<select id="sort_options" onchange="window.location.href=this.value">%s</select>' % ''.join(groups)
+
+
+#The search-within form keeps the listing's own query parameters (group_num, index, ...) as hidden fields.
+def search_within(path, params):
+    hidden = ''.join('<input type="hidden" name="%s" value="%s">' % (html.escape(k), html.escape(v))
+                     for k, v in params if k not in ('page', 'order', 'withinval'))
+    return ('<form id="searchWithin" action="%s" method="get">%s<input type="text" name="withinval">'
+            '<button type="submit">Go</button></form>' % (html.escape(path), hidden))
+
+
+def wss_plp(path, params, search=False):
+    query = dict(params)
+    page = int(query.get('page', 1))
+    products = ''.join('<div id="productBox%d" class="product-box"><a href="/item/%d">Product %d</a>'
+                       '<span class="price">$%d.99</span></div>' % (n, n, n, n)
+                       for n in range(1, PRODUCTS_PER_PAGE + 1))
+    tiles = '<div class="category-grid"><a href="/1/tile.html">Tile</a></div>' if search else ''
+    sections = category_sections(path, params) if search else ''
+    body = ('<div class="filter-list box"><div class="filter-list__content"><h3>Filters</h3>%s%s</div></div>'
+            '%s%s%s<div id="product_listing">%s</div>%s'
+            % (sections, facets(path, params), tiles, search_within(path, params), sort_options(path, params), products,
+               pagination(path, params, page)))
+    return layout('WebstaurantStore', body, wss_search())
+
+
+#Typing into the search box asks /autocomplete.cfm for suggestions (one XHR per keystroke, like the real site) and lists them as
+#<li><span>icon</span><span>suggestion</span></li>. Clicking one searches for it.
+AUTOSUGGEST_SCRIPT = """
+<script>
+(function() {
+    var box = document.getElementsByName('searchval')[0], list = document.querySelector('#searchForm ul');
+    box.addEventListener('keyup', function() {
+        var request = new XMLHttpRequest();
+        request.open('GET', '/autocomplete.cfm?q=' + encodeURIComponent(box.value));
+        request.onload = function() {
+            list.innerHTML = '';
+            JSON.parse(request.responseText).forEach(function(suggestion) {
+                var item = document.createElement('li'), icon = document.createElement('span'), text = document.createElement('span');
+                text.textContent = suggestion;
+                item.appendChild(icon);
+                item.appendChild(text);
+                item.addEventListener('click', function() {
+                    location.href = '/search/' + suggestion.toLowerCase().replace(/[^a-z0-9]+/g, '-').replace(/^-|-$/g, '') + '.html';
+                });
+                list.appendChild(item);
+            });
+        };
+        request.send();
+    });
+})();
+</script>
+"""
+
+
+def wss_search():
+    return ('<form id="searchForm" action="/search.cfm" method="get">'
+            '<input type="text" name="searchval" autocomplete="off"><div><ul></ul></div>'
+            '<button type="submit">Search</button></form>' + AUTOSUGGEST_SCRIPT)
+
+
+def wss_home():
+    return layout('WebstaurantStore', '', wss_search())
+
+
+def autosuggest(query):
+    query = query.strip().lower()
+    if not query:
+        return []
+    return AUTOSUGGEST.get(query) or ['%s %s' % (query, n) for n in range(1, 21)]
+
+
+#Food Service Resources: the search box (#term) is on every FSR page, results are under #page > div[1] > div[2], the
+#sidebar categories under #page > div[3].
+def fsr_page(term=None):
+    results = ''
+    if term:
+        results = ''.join('<a href="/food-service-resources/articles/%s-%d.html"><span><img src="/img/fsr.jpg" alt=""></span>'
+                          '<span><h2>%s article %d</h2></span></a>' % (slug(term), n, html.escape(term.title()), n)
+                          for n in range(1, 7))
+    sidebar = ''.join('<li><a href="/food-service-resources/%s.html">%s</a></li>' % (slug(name), name)
+                      for name in ['Articles', 'Guides', 'Videos', 'Infographics'])
+    body = ('<div id="page"><div><div><form action="/food-service-resources/search.html" method="get">'
+            '<input type="text" id="term" name="term"><button type="submit">Search</button></form></div>'
+            '<div><div>%s</div></div></div><div></div><div><ul>%s</ul></div></div>' % (results, sidebar))
+    return layout('Food Service Resources', body, wss_search())
+
+
+def trs_plp(path, params, search=False):
+    page = int(dict(params).get('page', 1))
+    items = ''.join('<div class="ag-details-block item"><a href="/items/%d">Item %d</a></div>' % (n, n)
+                    for n in range(1, PRODUCTS_PER_PAGE + 1))
+    listing = '<div class="category-listing-block"><a href="/categories/1/tile.html">Tile</a></div>' if search else ''
+    body = ('<div class="filters"><h3>Filters</h3></div>%s<div class="results">%s</div>%s'
+            % (listing, items, pagination(path, params, page)))
+    return layout('The Restaurant Store', body, trs_search())
+
+
+def trs_search():
+    return ('<form id="search" action="/search" method="get">'
+            '<input type="text" name="search_values"><button type="submit">Search</button></form>')
+
+
+def trs_home():
+    return layout('The Restaurant Store', '', trs_search())
+
+
+def trs_product(item):
+    return layout('The Restaurant Store', '<div class="large-visual"><img src="/img/%s.jpg" alt=""></div>'
+                  '<p class="price ">$19.99</p>' % html.escape(item), trs_search())
+
+
+def trs_store_interstitial(path):
+    return layout('The Restaurant Store', "<h2>Before we continue, let's get your store location!</h2>"
+                  '<div class="stores"><a href="/stores/set/2?return=%s">Store 2</a><a href="/stores/set/1?return=%s">Store 1</a></div>'
+                  % (html.escape(path), html.escape(path)), trs_search())
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    #Headers and body are written separately; with Nagle's algorithm the body of a keep-alive response would wait for the
+    #client's delayed ACK (~40ms) and show up in every timing taken against the stub.
+    disable_nagle_algorithm = True
+    site = 'wss'
+    latency = 0.0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlsplit(self.path)
+        params = parse_qsl(url.query, keep_blank_values=True)
+        if self.site == 'wss':
+            self.route_wss(url.path, params)
+        else:
+            self.route_trs(url.path, params)
+
+    def route_wss(self, path, params):
+        query = dict(params)
+        if path == '/':
+            self.send_page(wss_home())
+        elif path == '/autocomplete.cfm':
+            self.send_page(json.dumps(autosuggest(query.get('q', ''))), content_type='application/json')
+        elif path == '/food-service-resources.html':
+            self.send_page(fsr_page())
+        elif path == '/food-service-resources/search.html':
+            self.send_page(fsr_page(query.get('term', '')))
+        elif path == '/search.cfm':
+            self.redirect('/search/%s.html' % slug(query.get('searchval', '')))
+        elif path.startswith('/search/'):
+            self.send_page(wss_plp(path, params, search=True))
+        elif path in ('/specials.html', '/groupspecials.cfm', '/specializedpage.cfm') or re.match(r'^/\d+/[\w-]+\.html$', path):
+            self.send_page(wss_plp(path, params))
+        else:
+            self.not_found()
+
+    def route_trs(self, path, params):
+        query = dict(params)
+        match = re.match(r'^/stores/set/(\d+)$', path)
+        if match:
+            self.redirect(query.get('return', '/'), cookie='store_id=%s; Path=/' % match.group(1))
+        elif path == '/':
+            self.send_page(trs_home())
+        elif path == '/search':
+            self.send_page(trs_plp(path, params, search=True))
+        elif path.startswith('/categories/') or path.startswith('/items/'):
+            if 'store_id=' not in self.headers.get('Cookie', ''):
+                self.send_page(trs_store_interstitial(path))
+            elif path.startswith('/items/'):
+                self.send_page(trs_product(path.rsplit('/', 1)[-1]))
+            else:
+                self.send_page(trs_plp(path, params))
+        else:
+            self.not_found()
+
+    #Pages carry an ETag of their content, and a request that already has it gets a 304 (see fingerprints.py).
+    def send_page(self, body, status=200, headers=(), content_type='text/html; charset=utf-8'):
+        data = body.encode('utf-8')
+        etag = '"%s"' % hashlib.sha1(data).hexdigest()[:16]
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        if status == 200:
+            headers = list(headers) + [('ETag', etag)]
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def redirect(self, location, cookie=None):
+        headers = [('Location', location)]
+        if cookie:
+            headers.append(('Set-Cookie', cookie))
+        self.send_page('', status=302, headers=headers)
+
+    def not_found(self):
+        search = wss_search() if self.site == 'wss' else trs_search()
+        self.send_page(layout('Not Found', "<h1>Sorry, but this page doesn't exist</h1>", search), status=404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubSite:
+    def __init__(self, latency=0.0, host='127.0.0.1', port_base=0):
+        self.latency = latency
+        self.host = host
+        self.port_base = port_base
+        self.servers = {}
+
+    def start(self):
+        for offset, name in enumerate(['wss', 'trs', 'trs_test']):
+            handler = type('StubHandler_' + name, (StubHandler,), {'site': 'wss' if name == 'wss' else 'trs',
+                                                                   'latency': self.latency})
+            port = self.port_base + offset + 1 if self.port_base else 0
+            server = ThreadingHTTPServer((self.host, port), handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers[name] = server
+        return self
+
+    def url(self, name):
+        return 'http://%s:%d' % (self.host, self.servers[name].server_address[1])
+
+    #Environment that points the smoke suite (sites.py) at this stub.
+    def env(self):
+        return {sites.ENV_VARS[name]: self.url(name) for name in self.servers}
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+        self.servers = {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for WSS and TRS.')
+    parser.add_argument('--port-base', type=int, default=8000, help='WSS gets port-base+1, TRS +2, TRS test +3')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    args = parser.parse_args()
+    stub = StubSite(latency=args.latency, port_base=args.port_base).start()
+    for name, value in stub.env().items():
+        print('%s=%s' % (name, value))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
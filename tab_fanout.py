@@ -0,0 +1,74 @@
+'''
+Multi-tab fan-out for loops over catalog terms. The search tests used to type, submit, assert and paginate one term after the
+other in one tab. With SMOKE_SEARCH_TABS=N the term list is spread over N tabs of the same browser instead: the test's pooled
+Chrome is attached to over the DevTools protocol (cdp_backend.py), N extra tabs are opened next to the one WebDriver controls,
+and each tab runs the same per-term script on its own term. The tabs share the session's cookies and cache, so no extra browser
+processes are started and throughput is close to N times the one-tab loop.
+
+A script is a coroutine `script(page, item, client)`: page is a cdp_backend.Page, client an AsyncHttpClient (with the TRS store
+cookies) for crawling pagination, and it returns a list of problems, empty when the term passed. Exceptions count as a problem
+for that term only. Results come back per term, in the order of the items:
+
+    results = fan_out(driver, entries, search_term, on_result=print_result)
+    for result in results:
+        with self.subTest(term=result.item.target):
+            self.assertTrue(result.passed, '; '.join(result.problems))
+'''
+import asyncio
+import os
+import time
+
+import trs_session
+from cdp_backend import CdpBrowser, CdpError, TabPool, debugger_address
+from http_client import AsyncHttpClient
+
+TABS = int(os.environ.get('SMOKE_SEARCH_TABS', '0'))
+
+
+class TabResult:
+    def __init__(self, item, problems=(), elapsed=0.0, url=None):
+        self.item = item
+        self.problems = list(problems)
+        self.elapsed = elapsed
+        self.url = url
+
+    @property
+    def passed(self):
+        return not self.problems
+
+
+async def run_item(tabs, script, item, client):
+    page = await tabs.acquire()
+    start = time.perf_counter()
+    try:
+        problems = await script(page, item, client)
+    except (CdpError, AssertionError, asyncio.TimeoutError) as exc:
+        problems = ['%s: %s' % (type(exc).__name__, exc)]
+    finally:
+        tabs.release(page)
+    return TabResult(item, problems, time.perf_counter() - start, page.current_url)
+
+
+#Runs `script` once per item across `tabs` tabs of the driver's browser. Falls back to a headless Chrome of its own when the
+#driver doesn't expose a DevTools address (e.g. a remote grid). `on_result(result)` is called as each term finishes.
+def fan_out(driver, items, script, tabs=None, on_result=None):
+    cookies = trs_session.cookie_jar() #Before the event loop starts: picking the store may need a request of its own
+
+    async def run():
+        address = debugger_address(driver)
+        browser = await (CdpBrowser.connect(address) if address else CdpBrowser.launch())
+        pool = TabPool(browser, max(min(tabs or TABS, len(items)), 1), isolated=False)
+
+        async def one(item):
+            result = await run_item(pool, script, item, client)
+            if on_result:
+                on_result(result)
+            return result
+
+        try:
+            async with AsyncHttpClient(cookies=cookies) as client:
+                return await asyncio.gather(*[one(item) for item in items])
+        finally:
+            await pool.close()
+            await browser.close()
+    return asyncio.run(run())
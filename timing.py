@@ -0,0 +1,237 @@
+'''
+Per-step timing for the smoke suite. Tests get a traced driver: every driver.get/refresh, every click() and submit() on an element
+it returns, and every marker/URL assertion is timed as a step. After each navigation the browser's Navigation Timing and Resource
+Timing data is collected as well, so a slow run can be pinned on browser startup, server time to first byte, page rendering or the
+harness itself.
+
+Each step is handed to the functions in `listeners` as a dict. By default steps are appended as JSON lines to smoke_trace.jsonl
+(SMOKE_TRACE=path to change it, SMOKE_TRACE= to turn it off), and a per page type summary is printed at the end of the run.
+
+Latency budgets are declared per page type. A page that renders (DOMContentLoaded) slower than its budget fails the test, so a
+performance regression in Catalog fails the smoke run. Override the defaults with SMOKE_BUDGETS=search=2,category=3.5, or turn
+them off with SMOKE_BUDGETS=off.
+'''
+import atexit
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+
+TRACE_FILE = os.environ.get('SMOKE_TRACE', 'smoke_trace.jsonl')
+
+#Seconds until DOMContentLoaded, per page type.
+BUDGETS = {'home': 5.0, 'search': 5.0, 'category': 5.0, 'specials': 5.0, 'group_special': 5.0, 'specialized': 5.0,
+           'product': 5.0, 'fsr': 5.0}
+
+PAGE_TYPES = [('search', r'/search(/|\.cfm|\?|$)'), ('group_special', r'/groupspecials\.cfm'), ('specialized', r'/specializedpage\.cfm'),
+              ('specials', r'/specials\.html'), ('product', r'/items?/'), ('fsr', r'/food-service-resources'),
+              ('category', r'/categories/|/\d+/[^/]+\.html'), ('home', r'^https?://[^/]+/?$')]
+
+TIMING_SCRIPT = '''
+var nav = performance.getEntriesByType('navigation')[0];
+if (!nav) return null;
+var resources = performance.getEntriesByType('resource'), bytes = 0, slowest = null;
+for (var i = 0; i < resources.length; i++) {
+    bytes += resources[i].transferSize || 0;
+    if (!slowest || resources[i].duration > slowest.duration) slowest = resources[i];
+}
+return {ttfb: nav.responseStart - nav.requestStart, download: nav.responseEnd - nav.responseStart,
+        dom_interactive: nav.domInteractive, dom_content_loaded: nav.domContentLoadedEventEnd, load: nav.loadEventEnd,
+        transfer_size: nav.transferSize, resources: resources.length, resource_bytes: bytes,
+        slowest_resource: slowest ? slowest.name : null, slowest_resource_ms: slowest ? slowest.duration : null};
+'''
+
+
+def parse_budgets(value):
+    if value.strip().lower() == 'off':
+        return {}
+    budgets = dict(BUDGETS)
+    for item in value.split(','):
+        if '=' in item:
+            page_type, _, seconds = item.partition('=')
+            budgets[page_type.strip()] = float(seconds)
+    return budgets
+
+
+budgets = parse_budgets(os.environ.get('SMOKE_BUDGETS', ''))
+
+
+def page_type(url):
+    for name, pattern in PAGE_TYPES:
+        if re.search(pattern, url or ''):
+            return name
+    return 'other'
+
+
+#Appends steps to the trace file, opened on first use. Writes are buffered; the file is flushed when the run ends.
+class TraceFile:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __call__(self, step):
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8', buffering=64 * 1024)
+        self.file.write(json.dumps(step, sort_keys=True) + '\n')
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+listeners = [TraceFile(TRACE_FILE)] if TRACE_FILE else []
+
+#(kind, page type) -> [count, total seconds, total ttfb, ttfb samples]
+summary = {}
+
+
+def emit(step):
+    entry = summary.setdefault((step['kind'], step['page_type']), [0, 0.0, 0.0, 0])
+    entry[0] += 1
+    entry[1] += step['seconds']
+    if step.get('timing') and step['timing'].get('ttfb') is not None:
+        entry[2] += step['timing']['ttfb'] / 1000.0
+        entry[3] += 1
+    for listener in listeners:
+        listener(step)
+
+
+class Tracer:
+    def __init__(self, test_id):
+        self.test_id = test_id
+        self.number = 0
+
+    @contextmanager
+    def step(self, kind, target, url=None):
+        self.number += 1
+        record = {'test': self.test_id, 'step': self.number, 'kind': kind, 'target': target, 'url': url,
+                  'page_type': None, 'ok': True, 'error': None, 'timing': None, 'started': time.time()}
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as exc:
+            record['ok'] = False
+            record['error'] = '%s: %s' % (type(exc).__name__, str(exc).strip().split('\n')[0])
+            raise
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 4)
+            record['page_type'] = page_type(record['url'])
+            emit(record)
+
+    #Fails the test when a page took longer to render than its page type's budget. Without Navigation Timing data the wall time
+    #of a driver.get() is used; clicks without it (the next page hadn't loaded yet) aren't judged.
+    def enforce_budget(self, record):
+        budget = budgets.get(record['page_type'])
+        timing = record.get('timing') or {}
+        if timing.get('dom_content_loaded'):
+            rendered = timing['dom_content_loaded'] / 1000.0
+        elif record['kind'] == 'navigate':
+            rendered = record['seconds']
+        else:
+            return
+        if budget is not None and rendered > budget:
+            raise AssertionError('Performance budget exceeded: %s page rendered in %.2fs (budget %.2fs): %s'
+                                 % (record['page_type'], rendered, budget, record['url']))
+
+
+class TracedElement:
+    def __init__(self, element, driver):
+        self._element = element
+        self._driver = driver
+
+    def __getattr__(self, name):
+        return getattr(self._element, name)
+
+    def click(self):
+        self._driver.traced_action('click', self._element.click)
+
+    def submit(self):
+        self._driver.traced_action('submit', self._element.submit)
+
+
+#Wraps a WebDriver. Anything that isn't traced is passed straight through to the real driver. `after_load(driver)`, if given,
+#runs inside the navigate step after driver.get() returns, e.g. to wait for a page that was loaded eagerly to finish.
+#`sample(driver, url)`, if given, runs after every page load and what it returns is kept as the step's 'memory'.
+class TracedDriver:
+    def __init__(self, driver, tracer, after_load=None, sample=None):
+        self._driver = driver
+        self.tracer = tracer
+        self.after_load = after_load
+        self.sample = sample
+
+    def __getattr__(self, name):
+        attribute = getattr(self._driver, name)
+        if name.startswith('find_element'):
+            return self._wrap_finder(attribute)
+        return attribute
+
+    def _wrap_finder(self, finder):
+        def find(*args, **kwargs):
+            found = finder(*args, **kwargs)
+            if isinstance(found, list):
+                return [TracedElement(element, self) for element in found]
+            return TracedElement(found, self)
+        return find
+
+    def get(self, url):
+        with self.tracer.step('navigate', url, url) as record:
+            self._driver.get(url)
+            if self.after_load:
+                self.after_load(self._driver)
+            record['timing'] = self.navigation_timing()
+            self.sample_memory(record)
+        self.tracer.enforce_budget(record)
+
+    def refresh(self):
+        url = self._driver.current_url
+        with self.tracer.step('refresh', url, url) as record:
+            self._driver.refresh()
+            record['timing'] = self.navigation_timing()
+            self.sample_memory(record)
+
+    #A click or submit. If it led to another page, the step gets that page's URL and timing.
+    def traced_action(self, kind, action):
+        before = self._driver.current_url
+        with self.tracer.step(kind, before, before) as record:
+            action()
+            after = self._driver.current_url
+            if after != before:
+                record['url'] = after
+                record['timing'] = self.navigation_timing()
+                self.sample_memory(record)
+        if record['timing']:
+            self.tracer.enforce_budget(record)
+
+    def sample_memory(self, record):
+        if self.sample:
+            memory = self.sample(self._driver, record['url'])
+            if memory:
+                record['memory'] = memory
+
+    def navigation_timing(self):
+        try:
+            return self._driver.execute_script(TIMING_SCRIPT)
+        except Exception:
+            return None
+
+
+def report():
+    lines = ['Step timings:']
+    for (kind, kind_page_type), (count, total, ttfb, ttfb_count) in sorted(summary.items()):
+        line = '  %-8s %-14s %4dx  avg %.2fs  total %.1fs' % (kind, kind_page_type, count, total / count, total)
+        if ttfb_count:
+            line += '  ttfb avg %.2fs' % (ttfb / ttfb_count)
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def finish():
+    for listener in listeners:
+        if hasattr(listener, 'close'):
+            listener.close()
+    if summary:
+        print(report())
+
+
+atexit.register(finish)
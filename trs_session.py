@@ -0,0 +1,97 @@
+'''
+TRS store selection, done once. TRS won't show category or item pages until a store is picked ("Before we continue, let's get
+your store location!"), so every fresh session used to land on the interstitial, click through it and reload. Instead the store
+is set once per site through /stores/set/N, the cookies that sets are saved, and they are put into every browser session (when
+the pool starts or resets one) and every HTTP client jar before any TRS page is requested. If a TRS page still comes back as the
+interstitial, the test fails saying so rather than on the first missing marker.
+
+The cookies are kept in .smoke_trs_cookies.json (SMOKE_TRS_COOKIES) so parallel workers and later runs reuse them, until they
+are older than SMOKE_TRS_COOKIE_MAX_AGE seconds (default 6 hours). SMOKE_TRS_STORE picks the store (default 1).
+'''
+import asyncio
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import sites
+from http_client import AsyncHttpClient, CookieJar
+
+STORE = os.environ.get('SMOKE_TRS_STORE', '1')
+COOKIE_FILE = os.environ.get('SMOKE_TRS_COOKIES', '.smoke_trs_cookies.json')
+MAX_AGE = float(os.environ.get('SMOKE_TRS_COOKIE_MAX_AGE', str(6 * 3600)))
+
+TRS_SITES = [sites.TRS, sites.TRS_TEST]
+
+#What TRS shows instead of the page when no store is selected
+INTERSTITIAL_TEXT = "Before we continue, let's get your store location!"
+
+lock = threading.Lock()
+#site URL -> [{'name': ..., 'value': ...}], for this process
+cookies = {}
+
+
+def load_saved():
+    try:
+        with open(COOKIE_FILE, encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {site: entry['cookies'] for site, entry in saved.items()
+            if entry.get('store') == STORE and time.time() - entry.get('saved', 0) < MAX_AGE}
+
+
+def save(site, site_cookies):
+    try:
+        with open(COOKIE_FILE, encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        saved = {}
+    saved[site] = {'store': STORE, 'saved': time.time(), 'cookies': site_cookies}
+    with open(COOKIE_FILE + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(saved, f, indent=1, sort_keys=True)
+    os.replace(COOKIE_FILE + '.tmp', COOKIE_FILE)
+
+
+#Picks the store on `site` over HTTP and returns the cookies the site set for it.
+def select_store(site):
+    async def run():
+        jar = CookieJar()
+        async with AsyncHttpClient(cookies=jar) as client:
+            response = await client.get(site + '/stores/set/' + STORE)
+        if response.status >= 400:
+            raise RuntimeError('Setting the TRS store failed: HTTP %d from %s' % (response.status, response.url))
+        host = urlsplit(site).hostname
+        return [{'name': name, 'value': value} for domain, values in sorted(jar.domains.items())
+                if host == domain or host.endswith('.' + domain) for name, value in sorted(values.items())]
+    site_cookies = asyncio.run(run())
+    if not site_cookies:
+        raise RuntimeError('%s/stores/set/%s did not set any cookies' % (site, STORE))
+    return site_cookies
+
+
+#Cookies that select the store on `site`, from memory, the cookie file, or a fresh /stores/set request, in that order.
+def store_cookies(site):
+    with lock:
+        if not cookies:
+            cookies.update(load_saved())
+        if site not in cookies:
+            cookies[site] = select_store(site)
+            save(site, cookies[site])
+        return cookies[site]
+
+
+#Session hook for the driver pool: puts the store cookies for every TRS site into the browser without loading a page.
+def inject(driver, cdp):
+    for site in TRS_SITES:
+        cdp(driver, 'Network.setCookies', {'cookies': [dict(cookie, url=site + '/') for cookie in store_cookies(site)]})
+
+
+#A CookieJar for the HTTP client with the store already selected on every TRS site.
+def cookie_jar(jar=None):
+    jar = jar or CookieJar()
+    for site in TRS_SITES:
+        for cookie in store_cookies(site):
+            jar.set(urlsplit(site).hostname, cookie['name'], cookie['value'])
+    return jar
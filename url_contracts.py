@@ -0,0 +1,97 @@
+'''
+Sort and filter URL contracts. Clicking every sort option and every facet link costs a full page load per click, and all the
+click proves is that the option leads to the right URL and that URL shows products. With SMOKE_URL_CONTRACTS=1 the tests do
+that without the clicks:
+
+    1. the page is loaded once and every option/link the test would click is resolved in a single script call to the URL it
+       leads to (a link's href, an <option>'s value, or a data-href/data-url attribute),
+    2. those URLs are compared with the expected ones,
+    3. all of the expected URLs are fetched concurrently over HTTP (with the browser's cookies) to check they render products.
+
+A Contract is a start page and a list of steps, each a named locator (locators.py) plus the URL clicking it has to lead to.
+Sort options are all on the same page; filter steps are chained, each clicked on the page the previous one led to, so a chained
+contract loads one page per step instead of one per click and reload.
+
+SMOKE_CLICK_SAMPLE=N still really clicks N randomly chosen steps of every contract, as a check that the page's click handling
+works too. It's 0 by default.
+'''
+import os
+import random
+
+from http_checks import Check, run_checks
+from locators import LOCATE_FUNCTION, get as get_locator
+from pagination import cookies_from
+
+ENABLED = os.environ.get('SMOKE_URL_CONTRACTS') == '1'
+CLICK_SAMPLE = int(os.environ.get('SMOKE_CLICK_SAMPLE', '0'))
+
+#For each list of strategies: the URL the element found would navigate to, or null (no element) or '' (no URL on it).
+#Option values that are only an order name ("price_asc") become the URL the page's script builds from them.
+TARGET_SCRIPT = LOCATE_FUNCTION + '''
+function target(el) {
+    if (el.tagName === 'OPTION') {
+        var value = el.value;
+        if (!/[\\/?=]/.test(value)) return location.href + (location.href.indexOf('?') >= 0 ? '&' : '?') + 'order=' + value;
+        return new URL(value, location.href).href;
+    }
+    var link = el.closest('a[href], [data-href], [data-url]');
+    if (!link) return '';
+    return new URL(link.getAttribute('href') || link.getAttribute('data-href') || link.getAttribute('data-url'), location.href).href;
+}
+return arguments[0].map(function(strategies) {
+    for (var i = 0; i < strategies.length; i++) {
+        var found = locate(strategies[i][0], strategies[i][1]);
+        if (found) return target(found);
+    }
+    return null;
+});
+'''
+
+
+class Contract:
+    def __init__(self, start, steps, chained=False):
+        self.start = start
+        self.steps = [(tuple(locator), expected) for locator, expected in steps] #((locator name, *args), expected URL)
+        self.chained = chained
+
+    #(page the step is clicked on, locator, expected URL) for every step.
+    def clicks(self):
+        source = self.start
+        for locator, expected in self.steps:
+            yield source, locator, expected
+            if self.chained:
+                source = expected
+
+
+#URL each locator's element leads to on the page the driver is on, in one script call.
+def targets(driver, locators):
+    return driver.execute_script(TARGET_SCRIPT, [[list(strategy) for strategy in get_locator(*locator).strategies]
+                                                 for locator in locators])
+
+
+#Checks a contract. Returns a list of problems, empty when every step leads where it should and every target page has the
+#markers.
+def verify(driver, contract, markers):
+    problems = []
+    by_source = {}
+    for source, locator, expected in contract.clicks():
+        by_source.setdefault(source, []).append((locator, expected))
+    for source, steps in by_source.items():
+        if driver.current_url != source:
+            driver.get(source)
+        for (locator, expected), actual in zip(steps, targets(driver, [locator for locator, expected in steps])):
+            label = get_locator(*locator).name
+            if actual is None:
+                problems.append('%s not found on %s' % (label, source))
+            elif actual != expected:
+                problems.append('%s on %s leads to %r, expected %r' % (label, source, actual or None, expected))
+    expected = list(dict.fromkeys(expected for source, locator, expected in contract.clicks()))
+    results = run_checks({'targets': [Check(url, markers) for url in expected]}, cookies=cookies_from(driver))['targets']
+    problems += ['%s: %s' % (result.url, problem) for result in results for problem in result.problems]
+    return problems
+
+
+#Steps to also click for real: `count` of them (SMOKE_CLICK_SAMPLE), picked at random.
+def sample(contract, count=CLICK_SAMPLE):
+    clicks = list(contract.clicks())
+    return random.sample(clicks, min(count, len(clicks)))
@@ -0,0 +1,196 @@
+'''
+Explicit waits for the smoke suite, in place of implicit waits, fixed sleeps and refresh loops.
+
+AdaptiveWait works like a WebDriverWait but polls fast at first and backs off while the condition stays false, so quick
+conditions are noticed within a few tens of milliseconds and slow ones don't hammer chromedriver. Every wait records how long it
+actually took under the condition's name, and a summary is printed at the end of the run.
+
+The conditions below are plain callables taking the driver, like the ones in expected_conditions, so they can also be passed to
+a regular WebDriverWait.
+'''
+import asyncio
+import atexit
+import os
+import time
+
+TIMEOUT = float(os.environ.get('SMOKE_WAIT_TIMEOUT', '20'))
+FIRST_POLL = 0.05
+MAX_POLL = 1.0
+BACKOFF = 1.5
+
+NOT_FOUND_TEXT = "Sorry, but this page doesn't exist"
+
+#Seconds spent in each kind of wait this run: name -> [count, total, longest, timeouts]
+timings = {}
+
+
+def record(name, seconds, timed_out=False):
+    entry = timings.setdefault(name, [0, 0.0, 0.0, 0])
+    entry[0] += 1
+    entry[1] += seconds
+    entry[2] = max(entry[2], seconds)
+    entry[3] += 1 if timed_out else 0
+
+
+def named(name, condition):
+    condition.__name__ = name
+    return condition
+
+
+#Not a WebDriverWait subclass: importing selenium.webdriver.support loads all of selenium.webdriver (see startup.py). The
+#selenium exceptions are imported where they are needed, so HTTP-only runs don't need selenium at all.
+class AdaptiveWait:
+    def __init__(self, driver, timeout=TIMEOUT, first_poll=FIRST_POLL, max_poll=MAX_POLL, backoff=BACKOFF,
+                 ignored_exceptions=None):
+        if ignored_exceptions is None:
+            from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+            ignored_exceptions = (NoSuchElementException, StaleElementReferenceException)
+        self.driver = driver
+        self.timeout = timeout
+        self.first_poll = first_poll
+        self.max_poll = max_poll
+        self.backoff = backoff
+        self.ignored = tuple(ignored_exceptions)
+
+    def until(self, method, message=''):
+        name = getattr(method, '__name__', type(method).__name__)
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        interval = self.first_poll
+        while True:
+            try:
+                value = method(self.driver)
+                if value:
+                    record(name, time.perf_counter() - start)
+                    return value
+            except self.ignored:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            time.sleep(min(interval, remaining))
+            interval = min(interval * self.backoff, self.max_poll)
+        record(name, time.perf_counter() - start, timed_out=True)
+        from selenium.common.exceptions import TimeoutException
+        raise TimeoutException(message or 'Waited %.1fs for %s on %s' % (self.timeout, name, self.driver.current_url))
+
+
+#Like AdaptiveWait(...).until() but returns None on timeout, for callers that want to make their own assertion afterwards.
+def wait_for(driver, condition, timeout=TIMEOUT):
+    from selenium.common.exceptions import TimeoutException
+    try:
+        return AdaptiveWait(driver, timeout).until(condition)
+    except TimeoutException:
+        return None
+
+
+def url_is(url):
+    return named('url_is', lambda driver: driver.current_url == url)
+
+
+def url_changed_from(url):
+    return named('url_changed', lambda driver: driver.current_url != url)
+
+
+def document_ready(driver):
+    return driver.execute_script('return document.readyState') == 'complete'
+
+
+#The document is parsed (DOMContentLoaded), images and other subresources may still be loading. What an eager page load waits for.
+def document_interactive(driver):
+    return driver.execute_script('return document.readyState') != 'loading'
+
+
+#True once the document is parsed and every marker is on the page. Markers are ids, class names (several classes separated by
+#spaces must all be on one element) or name attributes, or a class attribute written as 'class="..."', as in page_snapshot.
+def plp_ready(*markers):
+    markers = [marker[7:-1] if marker.startswith('class="') and marker.endswith('"') else marker
+               for marker in markers or ['productBox1']]
+
+    def condition(driver):
+        return driver.execute_script('''
+            if (document.readyState === 'loading') return false;
+            return arguments[0].every(function(m) {
+                return document.getElementById(m) || document.getElementsByClassName(m).length || document.getElementsByName(m).length;
+            });''', markers)
+    return named('plp_ready', condition)
+
+
+#Text of each visible suggestion under the search box, in list order. Read in the page, so it is one round trip instead of
+#one per item.
+def autosuggest_texts(driver, selector='#searchForm ul li'):
+    return driver.execute_script('''
+        return Array.prototype.filter.call(document.querySelectorAll(arguments[0]), function(item) {
+            return item.getClientRects().length && window.getComputedStyle(item).visibility !== 'hidden';
+        }).map(function(item) { return (item.innerText || item.textContent).trim(); });''', selector)
+
+
+#Returns the visible suggestions once the autosuggest list under the search box has at least `count` of them.
+def autosuggest_populated(count=1, selector='#searchForm ul li'):
+    def condition(driver):
+        suggestions = autosuggest_texts(driver, selector)
+        return suggestions if len(suggestions) >= count else False
+    return named('autosuggest_populated', condition)
+
+
+#Returns the visible suggestions once each of `texts` is contained in one of them, wherever it is in the list. For assertions
+#that shouldn't break when the site reorders its suggestions.
+def autosuggest_contains(*texts, selector='#searchForm ul li'):
+    def condition(driver):
+        suggestions = autosuggest_texts(driver, selector)
+        return suggestions if all(any(text in suggestion for suggestion in suggestions) for text in texts) else False
+    return named('autosuggest_contains', condition)
+
+
+def text_on_page(text):
+    return named('text_on_page', lambda driver: driver.execute_script(
+        'return document.documentElement.outerHTML.indexOf(arguments[0]) >= 0', text))
+
+
+#Some servers behind the site intermittently answer with the 404 page. Refresh with exponential backoff until the real page
+#comes back, giving up after `attempts` tries. Returns True if the page recovered.
+def retry_not_found(driver, attempts=5, first_delay=0.5, backoff=2.0, error_text=NOT_FOUND_TEXT):
+    start = time.perf_counter()
+    delay = first_delay
+    for attempt in range(attempts):
+        if not text_on_page(error_text)(driver):
+            record('retry_not_found', time.perf_counter() - start)
+            return True
+        if attempt < attempts - 1:
+            time.sleep(delay)
+            delay *= backoff
+            driver.refresh()
+    record('retry_not_found', time.perf_counter() - start, timed_out=True)
+    return False
+
+
+#retry_not_found for a cdp_backend.Page (tab_fanout.py).
+async def retry_not_found_async(page, attempts=5, first_delay=0.5, backoff=2.0, error_text=NOT_FOUND_TEXT):
+    start = time.perf_counter()
+    delay = first_delay
+    for attempt in range(attempts):
+        if not await page.execute_script('return document.documentElement.outerHTML.indexOf(arguments[0]) >= 0', error_text):
+            record('retry_not_found', time.perf_counter() - start)
+            return True
+        if attempt < attempts - 1:
+            await asyncio.sleep(delay)
+            delay *= backoff
+            await page.get(page.current_url)
+    record('retry_not_found', time.perf_counter() - start, timed_out=True)
+    return False
+
+
+def report():
+    lines = ['Waits:']
+    for name, (count, total, longest, timeouts) in sorted(timings.items(), key=lambda item: -item[1][1]):
+        lines.append('  %-22s %4dx  avg %.2fs  max %.2fs  total %.1fs%s'
+                     % (name, count, total / count, longest, total, '  (%d timed out)' % timeouts if timeouts else ''))
+    return '\n'.join(lines)
+
+
+def print_report():
+    if timings:
+        print(report())
+
+
+atexit.register(print_report)